@@ -0,0 +1,53 @@
+"""
+Cache de coordination entre workers : compteurs de limitation du débit (GPP/throttling.py) et
+places du délestage (GPP/middleware.py). Ces deux mécanismes reposent sur add() et incr()
+atomiques et visibles de tous les workers, ce que garantissent Redis et Memcached
+(CACHE_COORDINATION_URL) ; le cache fichier les exécute en lecture puis écriture et efface des
+clés au hasard au-delà de MAX_ENTRIES, les limites ne seraient plus tenues.
+
+Le contrôle `coordination_atomique` refuse ces backends au démarrage ; le cache mémoire (défaut)
+reste accepté pour un seul processus (serveur de développement, tests) et signalé par check --deploy.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+from django.utils.connection import ConnectionProxy
+
+ALIAS = 'coordination'
+
+# Backends dont add() et incr() sont atomiques entre processus
+BACKENDS_ATOMIQUES = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+BACKEND_LOCAL = 'django.core.cache.backends.locmem.LocMemCache'
+
+coordination = ConnectionProxy(caches, ALIAS)
+
+
+def backend():
+    return settings.CACHES.get(ALIAS, {}).get('BACKEND')
+
+
+@register(Tags.caches)
+def coordination_atomique(app_configs, **kwargs):
+    if backend() in BACKENDS_ATOMIQUES + (BACKEND_LOCAL,):
+        return []
+    return [Error(
+        f"Le cache '{ALIAS}' ({backend()}) n'a pas d'add()/incr() atomiques : limitation du débit et délestage non fiables.",
+        hint="Définissez CACHE_COORDINATION_URL=redis://... ou pymemcache://...",
+        id='GPP.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def coordination_partagee(app_configs, **kwargs):
+    if backend() != BACKEND_LOCAL:
+        return []
+    return [Warning(
+        f"Le cache '{ALIAS}' est propre à chaque processus : limites et plafonds comptés par worker.",
+        hint="En production avec plusieurs workers, définissez CACHE_COORDINATION_URL=redis://... ou pymemcache://...",
+        id='GPP.W001',
+    )]
@@ -0,0 +1,80 @@
+"""
+Délestage des vues coûteuses : au plus N exécutions simultanées par classe de coût (rapport,
+export, defaut), tous workers confondus. Une requête en surnombre attend brièvement qu'une
+place se libère, puis reçoit un 503 immédiat avec Retry-After : les rapports et exports ne peuvent
+plus occuper tous les workers et les requêtes interactives gardent leur latence.
+
+Les places sont des clés du cache de coordination (add() atomique, voir GPP/coordination.py),
+prises par add() et libérées en fin de requête ; leur durée de vie (`duree_max`) rend la place
+d'un worker arrêté en pleine requête.
+"""
+import time
+import uuid
+
+from django.conf import settings
+
+from .coordination import coordination
+from .renderers import JsonResponse
+
+INTERVALLE_ATTENTE = 0.1  # secondes entre deux tentatives pendant l'attente
+DUREE_MAX_PAR_DEFAUT = 300
+
+
+class DelestageMiddleware:
+    """Classe de coût d'après le nom de l'URL (settings.DELESTAGE[classe]['vues']), 'defaut' sinon."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.classes = getattr(settings, 'DELESTAGE', {})
+        self.classe_par_vue = {
+            vue: classe for classe, reglage in self.classes.items() for vue in reglage.get('vues', ())
+        }
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            place = getattr(request, '_place_delestage', None)
+            if place:
+                liberer(*place)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        vue = request.resolver_match.view_name if request.resolver_match else None
+        classe = self.classe_par_vue.get(vue, 'defaut')
+        reglage = self.classes.get(classe, {})
+        if not reglage.get('concurrence'):
+            return None
+        place = prendre_place(classe, reglage['concurrence'], reglage.get('attente', 0), reglage.get('duree_max', DUREE_MAX_PAR_DEFAUT))
+        if place is None:
+            return surcharge(classe, reglage)
+        request._place_delestage = place
+        return None
+
+
+def prendre_place(classe, concurrence, attente, duree_max):
+    """Une des `concurrence` places de `classe`, en attendant au plus `attente` secondes : (clé, jeton) ou None."""
+    jeton = uuid.uuid4().hex
+    limite = time.monotonic() + attente
+    while True:
+        for numero in range(concurrence):
+            cle = f'delestage:{classe}:{numero}'
+            if coordination.add(cle, jeton, timeout=duree_max):
+                return cle, jeton
+        if time.monotonic() + INTERVALLE_ATTENTE > limite:
+            return None
+        time.sleep(INTERVALLE_ATTENTE)
+
+
+def liberer(cle, jeton):
+    # Une place expirée puis reprise par une autre requête n'est pas libérée à sa place
+    if coordination.get(cle) == jeton:
+        coordination.delete(cle)
+
+
+def surcharge(classe, reglage):
+    secondes = reglage.get('retry_after', 5)
+    reponse = JsonResponse(
+        {'detail': f'Serveur occupé ({classe}). Réessayez dans {secondes} s.'}, status=503
+    )
+    reponse['Retry-After'] = str(secondes)
+    return reponse
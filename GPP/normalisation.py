@@ -0,0 +1,40 @@
+"""
+Noms normalisés partagés par les applications (caisse, personnel) : forme canonique d'un libellé
+et tenue à jour du champ `nom_normalise` indexé, utilisé pour la recherche par préfixe.
+"""
+import re
+import unicodedata
+
+
+def normaliser_texte(texte):
+    """
+    Forme canonique d'un libellé : minuscules, sans accents ni ponctuation, espaces réduits.
+    """
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    texte = re.sub(r'[^\w\s]', ' ', texte)
+    return ' '.join(texte.split())
+
+
+class NomNormaliseMixin:
+    """
+    Tient à jour le champ `nom_normalise` (nom sans accents ni majuscules, indexé) à chaque
+    save(). Chaque modèle concret doit définir `nom_a_normaliser()` : son absence est signalée
+    dès la définition de la classe (abc ne s'applique pas, la métaclasse est celle des modèles).
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = cls.__dict__.get('Meta')
+        if cls.nom_a_normaliser is NomNormaliseMixin.nom_a_normaliser and not getattr(meta, 'abstract', False):
+            raise TypeError(f"{cls.__name__} doit définir nom_a_normaliser().")
+
+    def nom_a_normaliser(self):
+        """Texte dont `nom_normalise` est la forme canonique (ex. nom et prénom)."""
+        raise NotImplementedError
+
+    def save(self, *args, **kwargs):
+        self.nom_normalise = normaliser_texte(self.nom_a_normaliser())[:self._meta.get_field('nom_normalise').max_length]
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'nom_normalise'}
+        super().save(*args, **kwargs)
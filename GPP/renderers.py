@@ -0,0 +1,96 @@
+"""
+JSON rapide pour l'API (DRF) et les vues Django : orjson encode en C les dictionnaires, listes,
+dates et datetimes ; les autres types (Decimal, chaînes traduites, durées...) passent par la
+méthode `default` de l'encodeur habituel et sont rendus comme par json.dumps (seuls les
+datetimes gardent leurs microsecondes). Sans orjson installé, tout retombe sur json.dumps.
+"""
+import json
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:  # orjson est facultatif
+    orjson = None
+
+# Clés non textuelles acceptées (comme json.dumps), datetimes UTC notés « Z » comme l'encodeur de DRF
+OPTIONS_ORJSON = (orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z) if orjson else 0
+
+
+@lru_cache
+def _defaut(encodeur):
+    """
+    Méthode `default` de l'encodeur, les Decimal (montants, quantités : le type non natif le plus
+    fréquent) convertis d'emblée comme l'encodeur le fait (float pour DRF, str pour Django).
+    """
+    defaut = encodeur().default
+    conversion = type(defaut(Decimal('1')))
+
+    def convertir(objet):
+        if type(objet) is Decimal:
+            return conversion(objet)
+        return defaut(objet)
+    return convertir
+
+
+def dumps(donnees, encodeur=DjangoJSONEncoder):
+    """
+    Encode `donnees` en JSON compact UTF-8 (bytes). Les Decimal et autres types non natifs
+    sont rendus par `encodeur` (DjangoJSONEncoder : Decimal en chaîne, comme JsonResponse).
+    """
+    if orjson is None:
+        return json.dumps(donnees, cls=encodeur, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(donnees, default=_defaut(encodeur), option=OPTIONS_ORJSON)
+
+
+class JsonResponse(HttpResponse):
+    """
+    Remplace django.http.JsonResponse (mêmes arguments) avec l'encodage rapide ; seuls les
+    dictionnaires sont acceptés sauf `safe=False`.
+    """
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        if json_dumps_params:
+            # Options propres à json.dumps (indent, sort_keys...) : encodage habituel
+            contenu = json.dumps(data, cls=encoder, **json_dumps_params)
+        else:
+            contenu = dumps(data, encoder)
+        super().__init__(content=contenu, **kwargs)
+
+
+class JSONRapideRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer de DRF encodé par orjson quand la réponse est compacte (cas de l'API) ;
+    l'affichage indenté de l'API navigable garde l'encodage de DRF.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.compact or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        contenu = orjson.dumps(data, default=_defaut(self.encoder_class), option=OPTIONS_ORJSON)
+        # Comme DRF : U+2028 et U+2029 échappés, le JSON reste valide dans un <script>
+        # (recherche d'un seul octet d'abord : bien plus rapide sur une grande réponse)
+        if b'\xe2' in contenu and (b'\xe2\x80\xa8' in contenu or b'\xe2\x80\xa9' in contenu):
+            contenu = contenu.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return contenu
+
+
+class JSONRapideParser(parsers.JSONParser):
+    """JSONParser de DRF décodé par orjson pour les corps UTF-8 (les autres encodages gardent json.loads)."""
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encodage = parser_context.get('encoding', 'utf-8').lower().replace('_', '-')
+        if orjson is None or encodage not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -12,12 +12,15 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 
 import os
+from datetime import timedelta
 from pathlib import Path
 # from getenv import env
 import environ
 
 env = environ.Env(
-    SECRET_KEY=(str, "django-insecure-xx3-u&#hmg3ylrp5a05gyh+31p&#@!h@-mf8_dbr*$7gc)3oek")
+    SECRET_KEY=(str, "django-insecure-xx3-u&#hmg3ylrp5a05gyh+31p&#@!h@-mf8_dbr*$7gc)3oek"),
+    CAISSE_DECOUVERT_AUTORISE=(bool, True),
+    CAISSE_CHAINE_CLE=(str, ''),
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +55,8 @@ INSTALLED_APPS = [
     'caisse',
     'simple_history',
     'django.contrib.humanize',
+    'rest_framework',
+    'django_filters',
 ]
 
 MIDDLEWARE = [
@@ -62,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'GPP.middleware.DelestageMiddleware',
     "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
 
@@ -106,7 +112,85 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Les écritures concurrentes attendent le verrou au lieu d'échouer (SQLite ignore select_for_update).
+        # Chaque atomic(), même en lecture seule, prend alors le verrou d'écriture de la base : les
+        # lectures hors transaction (autocommit) n'attendent pas, les blocs atomic() passent un par un.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+}
+
+
+# Cache partagé par les workers gunicorn (référentiel des listes déroulantes de la caisse).
+# Par défaut un cache fichier local ; en production CACHE_URL=redis://... ou memcache://...
+CACHES = {
+    'default': env.cache('CACHE_URL', default=f"filecache://{BASE_DIR / '.cache'}"),
+    # Places du délestage (et compteurs de limitation) : add()/incr() atomiques et partagés, voir GPP/coordination.py.
+    # Cache mémoire par défaut (un seul processus) ; en production CACHE_COORDINATION_URL=redis://... ou pymemcache://...
+    'coordination': env.cache('CACHE_COORDINATION_URL', default='locmemcache://coordination'),
+}
+
+
+# API (Django REST framework) : JSON encodé et décodé par orjson quand il est installé (voir GPP/renderers.py)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'GPP.renderers.JSONRapideRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'GPP.renderers.JSONRapideParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Débit par utilisateur et par point d'accès selon la classe de coût de la vue (voir GPP/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': ['GPP.throttling.LimitationParPortee'],
+    'DEFAULT_THROTTLE_RATES': {
+        'lecture': env.str('LIMITE_LECTURE', default='600/min'),
+        'ecriture': env.str('LIMITE_ECRITURE', default='120/min'),
+        'lourd': env.str('LIMITE_LOURD', default='20/min'),
+        'export': env.str('LIMITE_EXPORT', default='5/hour'),
+        # Obtention d'un jeton JWT (mot de passe) : par adresse IP, contre les essais de mots de passe
+        'connexion': env.str('LIMITE_CONNEXION', default='10/min'),
     },
+    # Clients machines : jeton JWT (en-tête Authorization: Bearer), vérifié sans lire la table des sessions
+    # ni contrôler le CSRF ; les pages de l'application gardent la session. Pas d'authentification Basic :
+    # le mot de passe ne circule qu'à l'obtention du jeton (api/token/, débit limité).
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
+
+# Délestage (GPP/middleware.py) : exécutions simultanées au plus par classe de coût, tous workers
+# confondus ; attente en secondes avant le 503. Concurrence 0 : pas de limite.
+DELESTAGE = {
+    'rapport': {
+        'concurrence': env.int('DELESTAGE_RAPPORT', default=4),
+        'attente': 2,
+        'vues': [
+            'caisse:index', 'caisse:details_entrees', 'caisse:details_sorties', 'caisse:details_solde',
+            'tableau-bord-resume', 'personnel:dashboard',
+        ],
+    },
+    'export': {
+        'concurrence': env.int('DELESTAGE_EXPORT', default=2),
+        'attente': 1,
+        'vues': [
+            'caisse:generer_excel_operations', 'caisse:generer_excel_operations_entrees',
+            'caisse:generer_excel_operations_sorties', 'personnel:export_database',
+        ],
+    },
+    'defaut': {'concurrence': env.int('DELESTAGE_DEFAUT', default=0), 'attente': 0},
+}
+
+# Jetons de l'API (api/token/) : accès court, renouvelé par le jeton de rafraîchissement
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=env.int('JWT_ACCES_MINUTES', default=15)),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=env.int('JWT_RAFRAICHISSEMENT_JOURS', default=1)),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'UPDATE_LAST_LOGIN': False,
 }
 
 
@@ -166,4 +250,16 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 NPM_BIN_PATH = "C:/Program Files/nodejs/npm.cmd"
 
-AUTH_USER_MODEL = "accounts.user"
\ No newline at end of file
+AUTH_USER_MODEL = "accounts.user"
+
+# Caisse : autoriser un solde négatif (False = une sortie supérieure au solde est refusée)
+CAISSE_DECOUVERT_AUTORISE = env('CAISSE_DECOUVERT_AUTORISE')
+
+# Clé HMAC de la chaîne d'intégrité des opérations (par défaut SECRET_KEY).
+# La changer invalide les maillons existants : il faut alors resceller la chaîne.
+CAISSE_CHAINE_CLE = env('CAISSE_CHAINE_CLE') or SECRET_KEY
+
+# Flux des changements (api/caisse/changes/) : âge minimal, en secondes, d'une modification livrée.
+# Doit dépasser la plus longue transaction (import, comptabilisation en masse...) : une modification
+# validée plus tard que ce délai après son écriture ne serait jamais livrée.
+CAISSE_DELAI_STABILITE = env.int('CAISSE_DELAI_STABILITE', default=30)
@@ -0,0 +1,106 @@
+"""
+Limitation du débit par utilisateur (ou adresse IP) et par point d'accès. Le débit dépend de la
+classe de coût de la vue (`throttle_scope` : 'lecture', 'ecriture', 'lourd', 'export', 'connexion'),
+fixé dans REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']. Au-delà : réponse 429 avec l'en-tête Retry-After.
+
+Les compteurs sont à fenêtre fixe dans le cache de coordination (GPP/coordination.py, add() et
+incr() atomiques exigés au démarrage) : un incr() par requête au lieu de la liste d'horodatages
+relue et réécrite par les limitations de DRF.
+"""
+import math
+import time
+from functools import wraps
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .coordination import coordination
+from .renderers import JsonResponse
+
+DUREES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def portee_par_defaut(request):
+    """Classe de coût d'une vue qui n'en déclare pas : lecture ou écriture selon la méthode."""
+    return 'lecture' if request.method in SAFE_METHODS else 'ecriture'
+
+
+def debit(portee):
+    """(nombre de requêtes, durée en secondes) autorisés pour `portee` (ex. '30/min'), ou (None, None) sans limite."""
+    taux = api_settings.DEFAULT_THROTTLE_RATES.get(portee)
+    if taux is None:
+        return None, None
+    nombre, periode = taux.split('/')
+    return int(nombre), DUREES[periode[0]]
+
+
+def consommer(cle, nombre, duree):
+    """
+    Compte une requête dans la fenêtre courante de `cle` : (autorisée, secondes avant la fenêtre suivante).
+    add() crée le compteur sans écraser celui d'un autre worker, incr() le compte sans perte entre workers.
+    """
+    maintenant = time.time()
+    fenetre = int(maintenant // duree)
+    cle = f'limitation:{cle}:{fenetre}'
+    coordination.add(cle, 0, timeout=duree + 1)
+    try:
+        compte = coordination.incr(cle)
+    except ValueError:
+        # Compteur expiré entre add() et incr()
+        coordination.set(cle, 1, timeout=duree + 1)
+        compte = 1
+    return compte <= nombre, (fenetre + 1) * duree - maintenant
+
+
+def identifiant(request):
+    """Utilisateur connecté, sinon adresse du client (X-Forwarded-For selon NUM_PROXIES, comme DRF)."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user-{user.pk}'
+    return f'ip-{BaseThrottle().get_ident(request)}'
+
+
+class LimitationParPortee(BaseThrottle):
+    """Limitation DRF : portée `throttle_scope` de la vue (par défaut lecture/écriture), compteur par vue et par client."""
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        self.attente = None
+
+    def allow_request(self, request, view):
+        portee = getattr(view, self.scope_attr, None) or portee_par_defaut(request)
+        nombre, duree = debit(portee)
+        if nombre is None:
+            return True
+        autorisee, attente = consommer(f'{portee}:{type(view).__name__}:{identifiant(request)}', nombre, duree)
+        self.attente = None if autorisee else attente
+        return autorisee
+
+    def wait(self):
+        return self.attente
+
+
+def limiter(portee):
+    """
+    Décorateur des vues Django (fonctions ou, par method_decorator, méthodes de classe) :
+    même limitation que LimitationParPortee pour la classe de coût `portee`.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def vue_limitee(request, *args, **kwargs):
+            nombre, duree = debit(portee)
+            if nombre is not None:
+                autorisee, attente = consommer(f'{portee}:{vue.__qualname__}:{identifiant(request)}', nombre, duree)
+                if not autorisee:
+                    return trop_de_requetes(attente)
+            return vue(request, *args, **kwargs)
+        return vue_limitee
+    return decorateur
+
+
+def trop_de_requetes(attente):
+    secondes = max(1, math.ceil(attente))
+    reponse = JsonResponse({'detail': f'Trop de requêtes. Réessayez dans {secondes} s.'}, status=429)
+    reponse['Retry-After'] = str(secondes)
+    return reponse
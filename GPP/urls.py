@@ -20,17 +20,28 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from django.contrib.auth import views as auth_views
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
 from theme.views import change_theme
 from caisse.views import index
 
 
+class ObtentionJeton(TokenObtainPairView):
+    # Vérifie un mot de passe : débit 'connexion' par adresse IP (voir GPP/throttling.py)
+    throttle_scope = 'connexion'
+
+
 urlpatterns = [
     path("", include("accounts.urls", namespace='accounts')),
     path('admin/', admin.site.urls),
     path('switch-theme/', change_theme, name='change_theme'),
     path('caisse/', include("caisse.urls", namespace='caisse')),
     path("personnel/", include("personnel.urls", namespace='personnel')),
+    path('api/caisse/', include('caisse.api_urls')),  # API REST de la caisse (paginée, filtrable)
+    # Jetons JWT des clients de l'API (caisse et personnel)
+    path('api/token/', ObtentionJeton.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path("__reload__/", include("django_browser_reload.urls")),
 ]
 
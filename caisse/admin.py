@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Beneficiaire, Personnel, Fournisseur, OperationSortir, Categorie
+from .models import Beneficiaire, Personnel, Fournisseur, OperationSortir, Categorie, Tag, ReleveBancaire, LigneReleve, Caisse, TransfertCaisse, PointControleChaine, OperationRecurrente, Justificatif
+from .services import generer_operations_recurrentes, supprimer_operations_en_masse
 
 # Register your models here.
 
@@ -7,5 +8,69 @@ from .models import Beneficiaire, Personnel, Fournisseur, OperationSortir, Categ
 admin.site.register(Personnel)
 admin.site.register(Fournisseur)
 admin.site.register(Beneficiaire)
-admin.site.register(OperationSortir)
-admin.site.register(Categorie)
\ No newline at end of file
+
+class OperationSortirAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # Suppression groupée : historique et solde de la caisse mis à jour en une fois
+        supprimer_operations_en_masse(OperationSortir, list(queryset.values_list('pk', flat=True)), request.user)
+
+
+admin.site.register(OperationSortir, OperationSortirAdmin)
+admin.site.register(Categorie)
+admin.site.register(Tag)
+admin.site.register(ReleveBancaire)
+admin.site.register(LigneReleve)
+
+
+class CaisseAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'montant')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Une fois créée, le solde est tenu par les opérations et les transferts
+        return ('montant',) if obj else ()
+
+
+admin.site.register(Caisse, CaisseAdmin)
+admin.site.register(TransfertCaisse)
+
+
+class PointControleChaineAdmin(admin.ModelAdmin):
+    list_display = ('modele', 'dernier_id', 'nombre_verifiees', 'date')
+    list_filter = ('modele',)
+
+    # Les points de contrôle sont écrits par la commande verifier_chaine
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(PointControleChaine, PointControleChaineAdmin)
+
+
+class OperationRecurrenteAdmin(admin.ModelAdmin):
+    list_display = ('description', 'type', 'montant', 'frequence', 'date_debut', 'date_fin', 'derniere_echeance', 'active')
+    list_filter = ('type', 'frequence', 'active')
+    actions = ['generer']
+
+    @admin.action(description="Générer les opérations échues")
+    def generer(self, request, queryset):
+        crees = generer_operations_recurrentes(recurrences=list(queryset.values_list('pk', flat=True)), utilisateur=request.user)
+        total = sum(len(operations) for operations in crees.values())
+        self.message_user(request, f"{total} opération(s) créée(s).")
+
+
+admin.site.register(OperationRecurrente, OperationRecurrenteAdmin)
+
+
+class JustificatifAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'type_mime', 'taille', 'date')
+    readonly_fields = ('empreinte', 'fichier', 'miniature', 'type_mime', 'taille')
+
+    # Les justificatifs sont envoyés depuis la fiche d'une sortie (stockage par empreinte)
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(Justificatif, JustificatifAdmin)
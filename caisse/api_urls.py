@@ -1,12 +1,12 @@
 from django.urls import path
 from .api_views import (
     CategorieListCreate, CategorieRetrieveUpdateDestroy, CategorieDetailView,
-    OperationEntrerListCreate, OperationEntrerRetrieveUpdateDestroy,
-    OperationSortirListCreate, OperationSortirRetrieveUpdateDestroy,
+    OperationEntrerListCreate, OperationEntrerRetrieveUpdateDestroy, OperationEntrerLot,
+    OperationSortirListCreate, OperationSortirRetrieveUpdateDestroy, OperationSortirLot,
     PersonnelListCreate, PersonnelRetrieveUpdateDestroy,
     FournisseurListCreate, FournisseurRetrieveUpdateDestroy,
     BeneficiaireListCreate, BeneficiaireRetrieveUpdateDestroy,
-    TableauBordResume
+    TableauBordResume, Changements,
 )
 
 urlpatterns = [
@@ -18,10 +18,12 @@ urlpatterns = [
     # URLs pour les opérations d'entrée
     path('operations-entrer/', OperationEntrerListCreate.as_view(), name='operation-entrer-list-create'),
     path('operations-entrer/<int:pk>/', OperationEntrerRetrieveUpdateDestroy.as_view(), name='operation-entrer-retrieve-update-destroy'),
+    path('operations-entrer/lot/', OperationEntrerLot.as_view(), name='operation-entrer-lot'),
 
     # URLs pour les opérations de sortie
     path('operations-sortir/', OperationSortirListCreate.as_view(), name='operation-sortir-list-create'),
     path('operations-sortir/<int:pk>/', OperationSortirRetrieveUpdateDestroy.as_view(), name='operation-sortir-retrieve-update-destroy'),
+    path('operations-sortir/lot/', OperationSortirLot.as_view(), name='operation-sortir-lot'),
 
     # URLs pour le personnel
     path('personnel/', PersonnelListCreate.as_view(), name='personnel-list-create'),
@@ -36,4 +38,7 @@ urlpatterns = [
     path('beneficiaires/<int:pk>/', BeneficiaireRetrieveUpdateDestroy.as_view(), name='beneficiaire-retrieve-update-destroy'),
 
     path('tableau-bord/resume/', TableauBordResume.as_view(), name='tableau-bord-resume'),
+
+    # Flux des changements (synchronisation incrémentale)
+    path('changes/', Changements.as_view(), name='changements'),
 ]
\ No newline at end of file
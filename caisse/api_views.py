@@ -1,5 +1,14 @@
-from rest_framework import generics
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.decorators import method_decorator
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, generics, serializers, status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from . import changements as flux
+from .filters import (
+    BeneficiaireFilter, CategorieFilter, FournisseurFilter, OperationEntrerFilter, OperationSortirFilter,
+    PersonnelFilter,
+)
 from .models import Categorie, OperationEntrer, OperationSortir, Personnel, Fournisseur, Beneficiaire
 from .serializers import (
     CategorieSerializer, CategorieDetailSerializer,
@@ -8,7 +17,12 @@ from .serializers import (
     PersonnelSerializer, PersonnelDetailSerializer,
     FournisseurSerializer, FournisseurDetailSerializer,
     BeneficiaireSerializer, BeneficiaireDetailSerializer,
+    demande_totaux, entrees_jointes, precharger_references, sorties_jointes,
+)
+from .services import (
+    annoter_totaux_operations, creer_operations_en_masse, modifier_operations_par_ligne, supprimer_operations_en_masse,
 )
+from .versions import conditionnel, debut_du_jour
 from django.db.models import Sum, Count, Avg
 from django.db.models.functions import TruncMonth
 from rest_framework.views import APIView
@@ -17,81 +31,333 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 
 
+class PaginationCaisse(PageNumberPagination):
+    page_size = 50  # Nombre d'éléments par page
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+# Les listes et le tableau de bord ne dépendent que des opérations et des données de référence :
+# un client qui a déjà la version courante reçoit 304 sans que la vue ne soit exécutée
+LECTURE_CONDITIONNELLE = method_decorator(conditionnel('operations', 'referentiel'), name='get')
+
+
+class ChampsOptimisesMixin:
+    """
+    Le queryset suit les champs réellement rendus (`?fields=`/`?expand=`, voir ChampsDynamiquesMixin) :
+    les totaux, rendus par défaut, ne sont plus annotés (chemins `chemins_totaux` d'annoter_totaux_operations)
+    quand la requête les écarte, et `optimiser()` n'ajoute que les jointures utiles.
+    """
+    chemins_totaux = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in ('GET', 'HEAD'):
+            queryset = self.optimiser(queryset, self.get_serializer().fields)
+        return queryset
+
+    def optimiser(self, queryset, champs):
+        if self.chemins_totaux and demande_totaux(champs):
+            queryset = annoter_totaux_operations(queryset, **self.chemins_totaux)
+        return queryset
+
+
+class ListeCaisseMixin(ChampsOptimisesMixin):
+    """
+    Configuration commune des listes de l'API caisse : authentification, pagination,
+    filtres (django-filter), recherche et tri limités aux colonnes indexées.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = PaginationCaisse
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+
+
 # Vues pour le modèle Categorie
-class CategorieListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class CategorieListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = Categorie.objects.all()
     serializer_class = CategorieSerializer
+    chemins_totaux = {'entrees': 'categorie', 'sorties': 'categorie'}
+    filterset_class = CategorieFilter
+    ordering_fields = ['id', 'nom_normalise', 'niveau']
+    ordering = ['nom_normalise', 'id']
 
 
-
-class CategorieRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class CategorieRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = Categorie.objects.all()
     serializer_class = CategorieSerializer
+    chemins_totaux = {'entrees': 'categorie', 'sorties': 'categorie'}
 
-class CategorieDetailView(generics.RetrieveAPIView):
+class CategorieDetailView(ChampsOptimisesMixin, generics.RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = Categorie.objects.all()
     serializer_class = CategorieDetailSerializer
+    chemins_totaux = {'entrees': 'categorie', 'sorties': 'categorie'}
 
 # Vues pour le modèle OperationEntrer
-class OperationEntrerListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class OperationEntrerListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = OperationEntrer.objects.all()
 
-    filterset_fields = ['categorie', 'date_transaction']
+    filterset_class = OperationEntrerFilter
     search_fields = ['description']
+    ordering_fields = ['id', 'date_transaction', 'montant']
+    ordering = ['-date_transaction', '-id']
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return OperationEntrerCreateSerializer
         return OperationEntrerSerializer
 
-class OperationEntrerRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+    def optimiser(self, queryset, champs):
+        return entrees_jointes(queryset, champs)
+
+class OperationEntrerRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = OperationEntrer.objects.all()
     serializer_class = OperationEntrerSerializer
+
+    def optimiser(self, queryset, champs):
+        return entrees_jointes(queryset, champs)
     
 # Vues pour le modèle OperationSortir
-class OperationSortirListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class OperationSortirListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = OperationSortir.objects.all()
 
-    filterset_fields = ['categorie', 'date_de_sortie', 'fournisseur', 'beneficiaire']
+    filterset_class = OperationSortirFilter
     search_fields = ['description']
+    ordering_fields = ['id', 'date_de_sortie', 'montant']
+    ordering = ['-date_de_sortie', '-id']
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return OperationSortirCreateSerializer
         return OperationSortirSerializer
 
-class OperationSortirRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+    def optimiser(self, queryset, champs):
+        return sorties_jointes(queryset, champs)
+
+class OperationSortirRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = OperationSortir.objects.all()
     serializer_class = OperationSortirSerializer
 
+    def optimiser(self, queryset, champs):
+        return sorties_jointes(queryset, champs)
+
+# Lots d'opérations : création, modification et suppression de milliers de lignes par appel
+LOT_MAXIMUM = 5000
+
+
+def est_identifiant(valeur):
+    """Identifiant d'opération recevable dans un lot : un entier JSON (ni booléen, ni liste, ni objet)."""
+    return isinstance(valeur, int) and not isinstance(valeur, bool)
+
+
+class OperationsEnLotView(APIView):
+    """
+    POST (liste d'opérations), PATCH (liste de modifications portant chacune son `id`) et
+    DELETE (liste d'identifiants). Les catégories, bénéficiaires, fournisseurs et caisses de tout
+    le lot sont chargés en une requête par modèle, puis chaque ligne est validée par le serializer
+    de création ; les écritures passent par les services en masse dans une seule transaction.
+
+    Réponse : une entrée par ligne (`index`, `id`, `statut` ou `erreurs`). Si une ligne est
+    invalide, rien n'est écrit (400), sauf avec `?partiel=1` où seules les lignes valides le sont.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'lourd'
+    modele = None
+    serializer_class = None
+
+    def lignes(self, request):
+        lignes = request.data
+        if not isinstance(lignes, list):
+            raise serializers.ValidationError({'detail': 'Une liste est attendue.'})
+        if len(lignes) > LOT_MAXIMUM:
+            raise serializers.ValidationError({'detail': f'{LOT_MAXIMUM} lignes au plus par lot.'})
+        return lignes
+
+    def valider(self, request, lignes, partiel=False):
+        """Valide chaque ligne avec un seul serializer : [(index, donnees validées ou None, erreurs)]."""
+        validateur = self.serializer_class(context={'request': request}, partial=partiel)
+        validateur.context['references'] = precharger_references(validateur, lignes)
+        resultats = []
+        for index, ligne in enumerate(lignes):
+            try:
+                resultats.append((index, validateur.run_validation(ligne), None))
+            except serializers.ValidationError as erreur:
+                resultats.append((index, None, erreur.detail))
+        return resultats
+
+    def repondre(self, request, resultats, ecrire, statut_ok):
+        """Écrit les lignes valides (toutes ou aucune, sauf ?partiel=1) et rend le résultat par ligne."""
+        valide = all(erreurs is None for _, _, erreurs in resultats)
+        if not valide and request.query_params.get('partiel') != '1':
+            return Response({'valide': False, 'nombre': 0, 'resultats': [
+                {'index': index, 'erreurs': erreurs} for index, _, erreurs in resultats if erreurs is not None
+            ]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = ecrire([(index, donnees) for index, donnees, erreurs in resultats if erreurs is None])
+        except DjangoValidationError as erreur:
+            # Ex. solde insuffisant : la transaction est annulée, rien n'est écrit
+            return Response({'valide': False, 'nombre': 0, 'detail': erreur.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'valide': valide,
+            'nombre': len(ids),
+            'resultats': [
+                {'index': index, 'id': ids[index], 'statut': 'ok'} if erreurs is None else {'index': index, 'erreurs': erreurs}
+                for index, _, erreurs in resultats
+            ],
+        }, status=statut_ok)
+
+    def post(self, request):
+        lignes = self.lignes(request)
+
+        def ecrire(valides):
+            operations = creer_operations_en_masse(
+                self.modele, [self.modele(**donnees) for _, donnees in valides], request.user, raison='Lot API'
+            )
+            return {index: operation.pk for (index, _), operation in zip(valides, operations)}
+        return self.repondre(request, self.valider(request, lignes), ecrire, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        lignes = self.lignes(request)
+        resultats = self.valider(request, lignes, partiel=True)
+        # Chaque modification désigne une opération existante, une seule fois par lot
+        pks = [ligne.get('id') if isinstance(ligne, dict) else None for ligne in lignes]
+        existants = set(self.modele.objects.filter(
+            pk__in=[pk for pk in pks if est_identifiant(pk)]
+        ).values_list('pk', flat=True))
+        vus = set()
+        for position, (index, donnees, erreurs) in enumerate(resultats):
+            pk = pks[index]
+            if not est_identifiant(pk):
+                message = 'Identifiant invalide.'
+            elif pk not in existants:
+                message = 'Opération introuvable.'
+            elif pk in vus:
+                message = 'Opération déjà modifiée dans ce lot.'
+            else:
+                vus.add(pk)
+                continue
+            resultats[position] = (index, None, {**(erreurs or {}), 'id': [message]})
+
+        def ecrire(valides):
+            modifier_operations_par_ligne(
+                self.modele, {pks[index]: donnees for index, donnees in valides}, request.user, raison='Lot API'
+            )
+            return {index: pks[index] for index, _ in valides}
+        return self.repondre(request, resultats, ecrire, status.HTTP_200_OK)
+
+    def delete(self, request):
+        lignes = self.lignes(request)
+        existants = set(self.modele.objects.filter(
+            pk__in=[pk for pk in lignes if est_identifiant(pk)]
+        ).values_list('pk', flat=True))
+        resultats = [
+            (index, None, {'id': ['Identifiant invalide.']}) if not est_identifiant(pk)
+            else (index, None, None) if pk in existants
+            else (index, None, {'id': ['Opération introuvable.']})
+            for index, pk in enumerate(lignes)
+        ]
+
+        def ecrire(valides):
+            ids = {index: lignes[index] for index, _ in valides}
+            supprimer_operations_en_masse(self.modele, set(ids.values()), request.user)
+            return ids
+        return self.repondre(request, resultats, ecrire, status.HTTP_200_OK)
+
+
+class OperationEntrerLot(OperationsEnLotView):
+    modele = OperationEntrer
+    serializer_class = OperationEntrerCreateSerializer
+
+
+class OperationSortirLot(OperationsEnLotView):
+    modele = OperationSortir
+    serializer_class = OperationSortirCreateSerializer
+
+
 # Vues pour le modèle Personnel
-class PersonnelListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class PersonnelListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = Personnel.objects.all()
     serializer_class = PersonnelSerializer
+    chemins_totaux = {'sorties': 'beneficiaire__personnel'}
+    filterset_class = PersonnelFilter
+    ordering_fields = ['id', 'nom_normalise']
+    ordering = ['nom_normalise', 'id']
 
-class PersonnelRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class PersonnelRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = Personnel.objects.all()
     serializer_class = PersonnelDetailSerializer
+    chemins_totaux = {'sorties': 'beneficiaire__personnel'}
 
 # Vues pour le modèle Fournisseur
-class FournisseurListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class FournisseurListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = Fournisseur.objects.all()
     serializer_class = FournisseurSerializer
+    chemins_totaux = {'sorties': 'fournisseur'}
+    filterset_class = FournisseurFilter
+    ordering_fields = ['id', 'nom_normalise']
+    ordering = ['nom_normalise', 'id']
 
-class FournisseurRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class FournisseurRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = Fournisseur.objects.all()
     serializer_class = FournisseurDetailSerializer
+    chemins_totaux = {'sorties': 'fournisseur'}
 
 # Vues pour le modèle Beneficiaire
-class BeneficiaireListCreate(generics.ListCreateAPIView):
+@LECTURE_CONDITIONNELLE
+class BeneficiaireListCreate(ListeCaisseMixin, generics.ListCreateAPIView):
     queryset = Beneficiaire.objects.all()
     serializer_class = BeneficiaireSerializer
+    chemins_totaux = {'sorties': 'beneficiaire'}
+    filterset_class = BeneficiaireFilter
+    ordering_fields = ['id', 'nom_normalise']
+    ordering = ['nom_normalise', 'id']
 
-class BeneficiaireRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class BeneficiaireRetrieveUpdateDestroy(ChampsOptimisesMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
     queryset = Beneficiaire.objects.all()
     serializer_class = BeneficiaireDetailSerializer
+    chemins_totaux = {'sorties': 'beneficiaire'}
+
+class Changements(APIView):
+    """
+    Flux de synchronisation des clients hors ligne : GET ?since=<curseur>[&limite=N] rend les
+    créations, modifications et suppressions (catégories, fournisseurs, bénéficiaires, personnels,
+    entrées, sorties) postérieures au curseur, le curseur suivant et `suite` s'il en reste.
+    Sans curseur, l'historique est rejoué depuis le début ; `since=courant` rend seulement le
+    curseur actuel (à prendre avant de télécharger les listes complètes).
+    """
+    permission_classes = [IsAuthenticated]
 
+    def get(self, request):
+        curseur = request.query_params.get('since', '')
+        if curseur == 'courant':
+            return Response({'changements': [], 'curseur': flux.curseur_courant(), 'suite': False})
+        try:
+            limite = min(int(request.query_params.get('limite', flux.LIMITE_PAR_DEFAUT)), flux.LIMITE_MAXIMALE)
+        except ValueError:
+            limite = flux.LIMITE_PAR_DEFAUT
+        try:
+            changements, curseur, suite = flux.changements(curseur, max(limite, 1))
+        except flux.CurseurInvalide:
+            raise serializers.ValidationError({'since': 'Curseur invalide.'})
+        return Response({'changements': changements, 'curseur': curseur, 'suite': suite})
+
+# Fenêtre des 12 derniers mois : la réponse change aussi d'un jour à l'autre, sans écriture
+@method_decorator(conditionnel('operations', 'referentiel', periode=debut_du_jour), name='get')
 class TableauBordResume(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'lourd'
+
     def get(self, request):
         # Calculer la date il y a 12 mois
         date_debut = timezone.now() - timedelta(days=365)
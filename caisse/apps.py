@@ -9,4 +9,5 @@ class CaisseConfig(AppConfig):
     name = 'caisse'
 
     def ready(self):
-        import caisse.signals
\ No newline at end of file
+        import caisse.signals
+        import GPP.coordination  # contrôle du cache de coordination (limitation, délestage)
\ No newline at end of file
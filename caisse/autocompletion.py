@@ -0,0 +1,47 @@
+from GPP.normalisation import normaliser_texte
+from personnel.models import Employee
+
+from .models import Beneficiaire, Categorie, Fournisseur, Personnel
+from .utils import bornes_prefixe
+
+LIMITE_PAR_DEFAUT = 10
+LIMITE_MAXIMALE = 50
+
+# Sources de l'autocomplétion : modèle et colonnes qui composent le libellé proposé
+SOURCES = {
+    'categories': (Categorie, ('name',)),
+    'fournisseurs': (Fournisseur, ('name',)),
+    'beneficiaires': (Beneficiaire, ('nom_affiche',)),
+    'personnels': (Personnel, ('last_name', 'first_name')),
+    'employes': (Employee, ('nom', 'prenom')),
+}
+
+
+def rechercher(ressource, texte, limite=LIMITE_PAR_DEFAUT, **filtres):
+    """
+    Les `limite` premiers noms de `ressource` commençant par `texte` (sans tenir compte des
+    accents ni des majuscules), par ordre alphabétique : [{'id', 'label'}].
+
+    Le préfixe devient un intervalle sur `nom_normalise` : la base parcourt l'index sur
+    quelques lignes au lieu de lire toute la table, quel que soit le nombre de noms.
+    """
+    modele, champs = SOURCES[ressource]
+    prefixe = normaliser_texte(texte)
+    queryset = modele.objects.filter(**filtres)
+    if prefixe:
+        debut, fin = bornes_prefixe(prefixe)
+        queryset = queryset.filter(nom_normalise__gte=debut, nom_normalise__lt=fin)
+    lignes = queryset.order_by('nom_normalise', 'pk').values_list('pk', *champs)[:limite]
+    return [
+        {'id': pk, 'label': ' '.join(valeur for valeur in valeurs if valeur)}
+        for pk, *valeurs in lignes
+    ]
+
+
+def libelle(ressource, pk):
+    """Libellé de l'objet `pk` de `ressource` (valeur initiale d'un champ d'autocomplétion), ou ''."""
+    if not str(pk or '').isdigit():
+        return ''
+    modele, champs = SOURCES[ressource]
+    valeurs = modele.objects.filter(pk=pk).values_list(*champs).first() or ()
+    return ' '.join(valeur for valeur in valeurs if valeur)
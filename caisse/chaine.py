@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.models.functions import Trunc
+
+from .models import ChaineOperations, OperationEntrer, OperationSortir, PointControleChaine
+from .utils import hash_chaine
+
+MODELES = {
+    'entree': OperationEntrer,
+    'sortie': OperationSortir,
+}
+
+
+def verifier_segment(cle, debut, fin=None):
+    """
+    Vérifie les maillons des opérations de clé `debut` à `fin` (incluses, `None` = fin de chaîne).
+    Chaque segment se vérifie seul : il suffit du maillon de l'opération qui le précède.
+
+    Retourne un dict : anomalies [(clé, pk, motif)], nombre de lignes, dernier pk et dernier maillon.
+    """
+    modele = MODELES[cle]
+    precedentes = modele.objects.filter(pk__lt=debut).order_by('-pk').values_list('pk', 'hash_chaine')
+    dernier_id, precedent = precedentes.first() or (None, '')
+    lignes = modele.objects.filter(pk__gte=debut).order_by('pk')
+    if fin is not None:
+        lignes = lignes.filter(pk__lte=fin)
+
+    anomalies = []
+    nombre = 0
+    for ligne in lignes.values_list(*modele.CHAMPS_CHAINE, 'hash_precedent', 'hash_chaine').iterator(chunk_size=5000):
+        *valeurs, hash_precedent, hash_ligne = ligne
+        pk = valeurs[0]
+        nombre += 1
+        if not hash_ligne:
+            anomalies.append((cle, pk, "opération non scellée (insérée hors de l'application)"))
+        elif hash_chaine(hash_precedent, valeurs) != hash_ligne:
+            anomalies.append((cle, pk, "contenu modifié hors de l'application"))
+        if hash_precedent != precedent:
+            anomalies.append((cle, pk, f"chaînage rompu après l'opération {dernier_id} (ligne supprimée ou insérée)"))
+        dernier_id, precedent = pk, hash_ligne
+    return {'anomalies': anomalies, 'nombre': nombre, 'dernier_id': dernier_id, 'dernier_hash': precedent}
+
+
+def verifier_tete(cle, resultat):
+    """Compare la fin de la chaîne vérifiée à la tête enregistrée (détecte la suppression des dernières lignes)."""
+    tete = ChaineOperations.objects.filter(modele=cle).first()
+    if tete and (tete.dernier_id, tete.dernier_hash) != (resultat['dernier_id'] or 0, resultat['dernier_hash']):
+        return [(cle, tete.dernier_id, "fin de chaîne différente de la tête enregistrée (lignes supprimées ?)")]
+    return []
+
+
+def enregistrer_point_controle(cle, resultat):
+    if resultat['anomalies'] or not resultat['nombre']:
+        return None
+    return PointControleChaine.objects.create(
+        modele=cle, dernier_id=resultat['dernier_id'], hash_chaine=resultat['dernier_hash'],
+        nombre_verifiees=resultat['nombre'],
+    )
+
+
+def verifier_incrementale(cle):
+    """
+    Vérifie uniquement les opérations postérieures au dernier point de contrôle encore valide
+    (une modification par l'application supprime les points de contrôle qui la suivent),
+    puis enregistre un nouveau point de contrôle si la chaîne est intacte.
+    """
+    modele = MODELES[cle]
+    point = PointControleChaine.objects.filter(modele=cle).order_by('-dernier_id', '-pk').first()
+    anomalies = []
+    if point and not modele.objects.filter(pk=point.dernier_id, hash_chaine=point.hash_chaine).exists():
+        anomalies.append((cle, point.dernier_id, "opération du point de contrôle modifiée ou supprimée hors de l'application"))
+        point = None
+    resultat = verifier_segment(cle, point.dernier_id + 1 if point else 0)
+    resultat['anomalies'] = anomalies + resultat['anomalies'] + verifier_tete(cle, resultat)
+    resultat['depuis'] = point.dernier_id if point else None
+    enregistrer_point_controle(cle, resultat)
+    return resultat
+
+
+def segments_par_periode(cle, periode='month'):
+    """
+    Découpe la chaîne en segments de clés contiguës, un par période de saisie (`month` ou `year`),
+    à partir de la première clé de chaque période (une requête groupée).
+    """
+    bornes = sorted(
+        MODELES[cle].objects.annotate(periode=Trunc('date', periode)).order_by()
+        .values('periode').annotate(debut=Min('pk')).values_list('periode', 'debut'),
+        key=lambda borne: borne[1]
+    )
+    return [
+        (periode_debut, debut, bornes[i + 1][1] - 1 if i + 1 < len(bornes) else None)
+        for i, (periode_debut, debut) in enumerate(bornes)
+    ]
+
+
+def _initialiser_processus():
+    # Chaque processus ouvre ses propres connexions à la base
+    django.setup()
+    connections.close_all()
+
+
+def _verifier_segment(arguments):
+    return verifier_segment(*arguments)
+
+
+def verifier_complete(cle, periode='month', processus=1):
+    """
+    Revérifie toute la chaîne, segment par segment. Avec `processus` > 1, les segments
+    sont répartis entre plusieurs processus (lecture seule, sans verrou).
+    """
+    segments = segments_par_periode(cle, periode)
+    arguments = [(cle, debut, fin) for _, debut, fin in segments]
+    if processus > 1 and len(arguments) > 1:
+        # Les connexions ouvertes ne doivent pas être partagées avec les processus enfants
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus) as executeur:
+            resultats = list(executeur.map(_verifier_segment, arguments))
+    else:
+        resultats = [verifier_segment(*argument) for argument in arguments]
+
+    resultat = {
+        'anomalies': [anomalie for r in resultats for anomalie in r['anomalies']],
+        'nombre': sum(r['nombre'] for r in resultats),
+        'dernier_id': resultats[-1]['dernier_id'] if resultats else None,
+        'dernier_hash': resultats[-1]['dernier_hash'] if resultats else '',
+        'segments': len(segments),
+    }
+    resultat['anomalies'] += verifier_tete(cle, resultat)
+    enregistrer_point_controle(cle, resultat)
+    return resultat
+
+
+def resceller(cle):
+    """
+    Recalcule toute la chaîne (après un changement de clé HMAC). Valide l'état actuel
+    de la base : à n'utiliser qu'après une vérification complète.
+    """
+    bornes = MODELES[cle].objects.aggregate(premier=Min('pk'), dernier=Max('pk'))
+    return MODELES[cle].sceller([bornes['premier'], bornes['dernier']], controler=False)
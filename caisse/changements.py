@@ -0,0 +1,110 @@
+import base64
+import binascii
+import heapq
+import itertools
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Beneficiaire, Categorie, Fournisseur, OperationEntrer, OperationSortir, Personnel
+
+LIMITE_PAR_DEFAUT = 500
+LIMITE_MAXIMALE = 5000
+
+
+def delai_stabilite():
+    """
+    Âge minimal d'une ligne d'historique pour être livrée (settings.CAISSE_DELAI_STABILITE, en secondes).
+    history_date est fixée à l'écriture, pas à la validation : une transaction encore ouverte peut
+    valider plus tard une ligne de numéro inférieur, que le curseur aurait déjà dépassée. Le délai
+    doit donc dépasser la plus longue transaction qui écrit dans l'historique.
+    """
+    return timedelta(seconds=getattr(settings, 'CAISSE_DELAI_STABILITE', 30))
+
+# Sources du flux : tables d'historique (simple_history) lues par leur clé history_id
+SOURCES = {
+    'categories': Categorie,
+    'fournisseurs': Fournisseur,
+    'beneficiaires': Beneficiaire,
+    'personnels': Personnel,
+    'entrees': OperationEntrer,
+    'sorties': OperationSortir,
+}
+
+TYPES = {'+': 'creation', '~': 'modification', '-': 'suppression'}
+
+
+class CurseurInvalide(ValueError):
+    pass
+
+
+def lire_curseur(texte):
+    """{source: dernier history_id livré} depuis le curseur opaque d'un client ('' : depuis le début)."""
+    if not texte:
+        return {source: 0 for source in SOURCES}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(texte.encode('ascii') + b'=' * (-len(texte) % 4)))
+    except (UnicodeEncodeError, binascii.Error, ValueError):
+        raise CurseurInvalide(texte)
+    if not isinstance(positions, dict) or not all(isinstance(valeur, int) for valeur in positions.values()):
+        raise CurseurInvalide(texte)
+    return {source: positions.get(source, 0) for source in SOURCES}
+
+
+def ecrire_curseur(positions):
+    texte = json.dumps(positions, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(texte.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def curseur_courant():
+    """Curseur de la fin actuelle de chaque historique : point de départ d'un client qui vient de tout télécharger."""
+    return ecrire_curseur({
+        source: modele.history.order_by('-history_id').values_list('history_id', flat=True).first() or 0
+        for source, modele in SOURCES.items()
+    })
+
+
+def changements(curseur='', limite=LIMITE_PAR_DEFAUT):
+    """
+    Créations, modifications et suppressions enregistrées après `curseur`, au plus `limite`,
+    dans l'ordre chronologique : (changements, nouveau curseur, reste-t-il des changements).
+
+    Chaque historique est lu par sa clé (history_id > position) : une requête par source,
+    dont le coût suit le nombre de changements et non la taille des tables.
+    """
+    positions = lire_curseur(curseur)
+    borne = timezone.now() - delai_stabilite()
+    pages = []
+    suite = False
+    for source, modele in SOURCES.items():
+        Historique = modele.history.model
+        champs = [champ.attname for champ in Historique.tracked_fields]
+        page = list(
+            Historique.objects.filter(history_id__gt=positions[source])
+            .order_by('history_id')
+            .values('history_id', 'history_date', 'history_type', *champs)[:limite + 1]
+        )
+        # Arrêt à la première ligne trop récente : tant qu'aucune transaction ne dure plus que le délai
+        # de stabilité, le curseur ne dépasse pas une ligne qui serait validée après son passage
+        stables = list(itertools.takewhile(lambda ligne: ligne['history_date'] <= borne, page[:limite]))
+        suite = suite or len(stables) == limite < len(page)
+        pages.append([(ligne['history_date'], source, ligne) for ligne in stables])
+
+    # Fusion chronologique des sources : chaque source est consommée dans l'ordre de ses clés,
+    # les lignes livrées en forment donc toujours un début et le curseur n'en saute aucune
+    lignes = list(heapq.merge(*pages, key=lambda element: element[0]))
+    suite = suite or len(lignes) > limite
+    resultat = []
+    for date, source, ligne in lignes[:limite]:
+        positions[source] = ligne.pop('history_id')
+        ligne.pop('history_date')
+        resultat.append({
+            'ressource': source,
+            'id': ligne['id'],
+            'type': TYPES[ligne.pop('history_type')],
+            'date': date,
+            'donnees': ligne,
+        })
+    return resultat, ecrire_curseur(positions), suite
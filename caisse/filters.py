@@ -0,0 +1,64 @@
+import django_filters
+
+from GPP.normalisation import normaliser_texte
+
+from .models import Beneficiaire, Categorie, Fournisseur, OperationEntrer, OperationSortir, Personnel
+from .utils import bornes_prefixe
+
+
+class NomFilterSet(django_filters.FilterSet):
+    """
+    Filtre `nom` commun aux listes de référence : noms commençant par la valeur donnée,
+    sans tenir compte des accents ni des majuscules (intervalle sur l'index `nom_normalise`).
+    """
+    nom = django_filters.CharFilter(method='filtrer_nom')
+
+    def filtrer_nom(self, queryset, name, value):
+        prefixe = normaliser_texte(value)
+        if not prefixe:
+            return queryset
+        debut, fin = bornes_prefixe(prefixe)
+        return queryset.filter(nom_normalise__gte=debut, nom_normalise__lt=fin)
+
+
+class CategorieFilter(NomFilterSet):
+    class Meta:
+        model = Categorie
+        fields = ['type', 'parent', 'niveau']
+
+
+class PersonnelFilter(NomFilterSet):
+    class Meta:
+        model = Personnel
+        fields = ['type_personnel']
+
+
+class FournisseurFilter(NomFilterSet):
+    class Meta:
+        model = Fournisseur
+        fields = []
+
+
+class BeneficiaireFilter(NomFilterSet):
+    class Meta:
+        model = Beneficiaire
+        fields = ['personnel', 'employee']
+
+
+# Opérations : clés étrangères (indexées) et intervalle de dates, lu par l'index (caisse, date) quand la caisse est donnée
+class OperationEntrerFilter(django_filters.FilterSet):
+    date_min = django_filters.DateFilter(field_name='date_transaction', lookup_expr='gte')
+    date_max = django_filters.DateFilter(field_name='date_transaction', lookup_expr='lte')
+
+    class Meta:
+        model = OperationEntrer
+        fields = ['categorie', 'caisse', 'date_transaction']
+
+
+class OperationSortirFilter(django_filters.FilterSet):
+    date_min = django_filters.DateFilter(field_name='date_de_sortie', lookup_expr='gte')
+    date_max = django_filters.DateFilter(field_name='date_de_sortie', lookup_expr='lte')
+
+    class Meta:
+        model = OperationSortir
+        fields = ['categorie', 'caisse', 'date_de_sortie', 'fournisseur', 'beneficiaire']
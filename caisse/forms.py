@@ -9,7 +9,7 @@ class FournisseurForm(forms.ModelForm):
 class CategorieForm(forms.ModelForm):
     class Meta:
         model = Categorie
-        fields = ['name', 'description']
+        fields = ['name', 'description', 'parent']
 
 class PersonnelForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,50 @@
+from django.http import StreamingHttpResponse
+
+from GPP.renderers import dumps
+
+from .models import Beneficiaire, Categorie, Fournisseur, Personnel
+
+LIMITE_PAR_DEFAUT = 100
+LIMITE_MAXIMALE = 500
+
+# Listes chargées par les pages acteurs, catégories et bénéficiaires : uniquement les colonnes affichées
+LISTES = {
+    'personnels': (Personnel, ('id', 'last_name', 'first_name', 'tel', 'email', 'photo', 'type_personnel')),
+    'fournisseurs': (Fournisseur, ('id', 'name', 'contact')),
+    'categories': (Categorie, ('id', 'name', 'description', 'type', 'parent', 'niveau')),
+    'beneficiaires': (Beneficiaire, ('id', 'name', 'personnel_id', 'nom_affiche')),
+}
+
+
+def page_json(queryset, champs, apres=None, limite=LIMITE_PAR_DEFAUT):
+    """
+    Encode une page de `queryset.values(*champs)` ligne par ligne, sans instances de modèles
+    ni liste intermédiaire. La page est prise par clé (`apres` = dernier id reçu) plutôt que
+    par OFFSET : son coût ne dépend pas de sa position. Produit {"resultats": [...], "suivant": id | null}.
+    """
+    queryset = queryset.order_by('pk')
+    if apres is not None:
+        queryset = queryset.filter(pk__gt=apres)
+    yield b'{"resultats":['
+    # Une ligne de plus que demandé indique s'il reste une page suivante
+    suivant = dernier = None
+    for i, ligne in enumerate(queryset.values(*champs)[:limite + 1].iterator()):
+        if i == limite:
+            suivant = dernier
+            break
+        yield (b',' if i else b'') + dumps(ligne)
+        dernier = ligne['id']
+    yield b'],"suivant":' + dumps(suivant) + b'}'
+
+
+def reponse_page_json(request, ressource, queryset=None):
+    """Réponse en flux d'une page de la liste `ressource` (paramètres GET `apres` et `limite`)."""
+    modele, champs = LISTES[ressource]
+    queryset = modele.objects.all() if queryset is None else queryset
+    apres = request.GET.get('apres')
+    limite = request.GET.get('limite', '')
+    limite = min(int(limite), LIMITE_MAXIMALE) if limite.isdigit() and int(limite) > 0 else LIMITE_PAR_DEFAUT
+    return StreamingHttpResponse(
+        page_json(queryset, champs, int(apres) if apres and apres.isdigit() else None, limite),
+        content_type='application/json',
+    )
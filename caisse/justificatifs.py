@@ -0,0 +1,168 @@
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Justificatif
+
+logger = logging.getLogger(__name__)
+
+# Types acceptés et extension du fichier stocké
+TYPES_ACCEPTES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'application/pdf': '.pdf',
+}
+TAILLE_MAXIMALE = 10 * 1024 * 1024  # 10 Mo
+TAILLE_MINIATURE = (160, 160)
+
+
+def type_fichier(fichier):
+    """
+    Type MIME d'un fichier envoyé, d'après le navigateur ou à défaut son extension, vérifié
+    sur le contenu : en-tête %PDF- pour un PDF, image lisible par Pillow (dont le format
+    détecté fait foi) pour une image.
+    """
+    type_mime = getattr(fichier, 'content_type', None) or mimetypes.guess_type(fichier.name)[0]
+    if type_mime not in TYPES_ACCEPTES:
+        raise ValueError(f"{fichier.name} : seuls les images (JPEG, PNG, WebP) et les PDF sont acceptés.")
+    try:
+        if type_mime == 'application/pdf':
+            valide = fichier.read(5) == b'%PDF-'
+        else:
+            with Image.open(fichier) as image:
+                image.verify()
+                type_mime = Image.MIME.get(image.format)
+            valide = type_mime in TYPES_ACCEPTES
+    except (OSError, SyntaxError, ValueError):
+        valide = False
+    finally:
+        fichier.seek(0)
+    if not valide:
+        raise ValueError(f"{fichier.name} : le contenu ne correspond pas à une image ou un PDF valide.")
+    return type_mime
+
+
+def empreinte_fichier(fichier):
+    """SHA-256 du contenu, lu par morceaux (le fichier n'est jamais chargé entier en mémoire)."""
+    sha = hashlib.sha256()
+    for morceau in fichier.chunks():
+        sha.update(morceau)
+    fichier.seek(0)
+    return sha.hexdigest()
+
+
+def chemin_justificatif(empreinte, extension):
+    # Sous-dossiers par préfixe : évite des dizaines de milliers de fichiers dans un seul dossier
+    return f"justificatifs/{empreinte[:2]}/{empreinte}{extension}"
+
+
+def chemin_miniature(empreinte):
+    return f"justificatifs/miniatures/{empreinte[:2]}/{empreinte}.jpg"
+
+
+def enregistrer_justificatif(fichier):
+    """
+    Stocke un fichier envoyé sous le nom de son empreinte et retourne son Justificatif.
+    Un contenu déjà connu n'est ni réécrit ni dupliqué : le Justificatif existant est retourné.
+    """
+    if fichier.size > TAILLE_MAXIMALE:
+        raise ValueError(f"{fichier.name} : le fichier dépasse {TAILLE_MAXIMALE // (1024 * 1024)} Mo.")
+    type_mime = type_fichier(fichier)
+    empreinte = empreinte_fichier(fichier)
+    existant = Justificatif.objects.filter(empreinte=empreinte).first()
+    if existant:
+        return existant
+
+    chemin = chemin_justificatif(empreinte, TYPES_ACCEPTES[type_mime])
+    ecrit = not default_storage.exists(chemin)
+    if ecrit:
+        chemin = default_storage.save(chemin, fichier)
+    try:
+        with transaction.atomic():
+            justificatif = Justificatif.objects.create(
+                empreinte=empreinte, fichier=chemin, nom=os.path.basename(fichier.name)[:255],
+                type_mime=type_mime, taille=fichier.size,
+            )
+    except IntegrityError:
+        # Même contenu envoyé au même moment par un autre utilisateur : sa copie fait foi,
+        # la nôtre (renommée par le stockage si le fichier existait déjà) ne serait plus référencée
+        existant = Justificatif.objects.get(empreinte=empreinte)
+        if ecrit and chemin != existant.fichier.name:
+            default_storage.delete(chemin)
+        return existant
+    if justificatif.est_image:
+        transaction.on_commit(lambda: lancer_miniature(justificatif.pk))
+    return justificatif
+
+
+def generer_miniature(pk):
+    """Crée la miniature JPEG d'un justificatif image (sans effet si elle existe déjà)."""
+    justificatif = Justificatif.objects.filter(pk=pk, miniature='').first()
+    if not justificatif or not justificatif.est_image:
+        return None
+    try:
+        with justificatif.fichier.open('rb') as fichier, Image.open(fichier) as image:
+            image.draft('RGB', TAILLE_MINIATURE)  # Décodage JPEG réduit : évite de décompresser l'image entière
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail(TAILLE_MINIATURE)
+            contenu = io.BytesIO()
+            image.save(contenu, 'JPEG', quality=80, optimize=True)
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Miniature impossible pour le justificatif %s", pk, exc_info=True)
+        return None
+    chemin = default_storage.save(chemin_miniature(justificatif.empreinte), ContentFile(contenu.getvalue()))
+    Justificatif.objects.filter(pk=pk).update(miniature=chemin)
+    return chemin
+
+
+def _generer_miniature(pk):
+    try:
+        generer_miniature(pk)
+    finally:
+        # Le thread a ouvert sa propre connexion : la fermer pour ne pas la laisser pendante
+        connection.close()
+
+
+def lancer_miniature(pk):
+    """Génère la miniature dans un thread : l'envoi du fichier n'attend pas Pillow."""
+    thread = threading.Thread(target=_generer_miniature, args=(pk,), name=f'miniature-{pk}', daemon=True)
+    thread.start()
+    return thread
+
+
+def generer_miniatures_manquantes():
+    """Rattrape les miniatures non générées (serveur arrêté pendant la génération par exemple)."""
+    pks = Justificatif.objects.filter(miniature='', type_mime__startswith='image/').values_list('pk', flat=True)
+    return sum(1 for pk in pks if generer_miniature(pk))
+
+
+def joindre_justificatifs(operation, fichiers):
+    """Enregistre les fichiers envoyés et les rattache à la sortie. Retourne les justificatifs."""
+    justificatifs = [enregistrer_justificatif(fichier) for fichier in fichiers]
+    operation.justificatifs.add(*justificatifs)
+    return justificatifs
+
+
+def detacher_justificatif(operation, justificatif):
+    """
+    Retire un justificatif d'une sortie ; il est supprimé, fichier et miniature compris,
+    lorsque plus aucune sortie ne l'utilise.
+    """
+    operation.justificatifs.remove(justificatif)
+    Justificatif.liberer([justificatif.pk])
+
+
+def supprimer_fichiers(chemins):
+    """Efface du stockage le fichier et la miniature d'un justificatif supprimé."""
+    for chemin in chemins:
+        if chemin:
+            default_storage.delete(chemin)
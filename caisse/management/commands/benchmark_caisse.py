@@ -0,0 +1,117 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.runner import DiscoverRunner
+
+from caisse.chaine import MODELES, verifier_complete
+from caisse.models import Beneficiaire, Caisse, Categorie, Fournisseur, OperationEntrer, OperationSortir, TransfertCaisse
+from caisse.services import soldes_par_caisse
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de saisie concurrente sur une base de test jetable : plusieurs threads enregistrent, "
+        "modifient, suppriment des opérations et transfèrent entre deux caisses, puis chaque solde tenu "
+        "est comparé au solde recalculé."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Nombre de threads de saisie.")
+        parser.add_argument('--operations', type=int, default=50, help="Nombre d'opérations par thread.")
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        fichier_test = None
+        if connection.vendor == 'sqlite':
+            # Une base de test sur disque : la base en mémoire partagée ne supporte pas l'attente de verrou
+            descripteur, fichier_test = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(descripteur)
+            connection.settings_dict['TEST']['NAME'] = fichier_test
+        anciennes_bases = runner.setup_databases()
+        try:
+            self.executer(options['threads'], options['operations'])
+        finally:
+            runner.teardown_databases(anciennes_bases)
+            if fichier_test and os.path.exists(fichier_test):
+                os.remove(fichier_test)
+
+    def executer(self, nombre_threads, nombre_operations):
+        categorie_entree = Categorie.objects.create(name='Benchmark entrées', type='entree')
+        categorie_sortie = Categorie.objects.create(name='Benchmark sorties', type='sortie')
+        fournisseur = Fournisseur.objects.create(name='Benchmark', contact='0000000000')
+        beneficiaire = Beneficiaire.objects.create(name='Benchmark')
+        caisses = [Caisse.principale(), Caisse.objects.create(nom='Caisse benchmark', montant=0)]
+        connection.close()
+
+        erreurs = []
+        ecritures = [0] * nombre_threads
+        attendu = {caisse.pk: [Decimal('0')] * nombre_threads for caisse in caisses}
+
+        def saisir(numero):
+            # Chaque thread écrit surtout dans « sa » caisse et transfère vers l'autre
+            caisse, autre = caisses[numero % 2], caisses[(numero + 1) % 2]
+            try:
+                for i in range(nombre_operations):
+                    montant = Decimal(100 + (numero * nombre_operations + i) % 900)
+                    if i % 3 == 2:
+                        sortie = OperationSortir.objects.create(
+                            description=f'Sortie {numero}-{i}', montant=montant, categorie=categorie_sortie,
+                            beneficiaire=beneficiaire, fournisseur=fournisseur, caisse=caisse
+                        )
+                        attendu[caisse.pk][numero] -= montant
+                        ecritures[numero] += 1
+                        if i % 6 == 5:
+                            # Modification, changement de caisse puis suppression : le solde doit revenir en arrière
+                            sortie.montant = montant * 2
+                            sortie.caisse = autre
+                            sortie.save()
+                            sortie.delete()
+                            attendu[caisse.pk][numero] += montant
+                            ecritures[numero] += 2
+                    elif i % 5 == 4:
+                        TransfertCaisse.objects.create(caisse_source=caisse, caisse_destination=autre, montant=montant)
+                        attendu[caisse.pk][numero] -= montant
+                        attendu[autre.pk][numero] += montant
+                        ecritures[numero] += 1
+                    else:
+                        OperationEntrer.objects.create(
+                            description=f'Entrée {numero}-{i}', montant=montant, categorie=categorie_entree, caisse=caisse
+                        )
+                        attendu[caisse.pk][numero] += montant
+                        ecritures[numero] += 1
+            except Exception as e:
+                erreurs.append(f"Thread {numero} : {e}")
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=saisir, args=(numero,)) for numero in range(nombre_threads)]
+        debut = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duree = time.perf_counter() - debut
+
+        self.stdout.write(f"{nombre_threads} threads x {nombre_operations} opérations en {duree:.2f} s "
+                          f"({sum(ecritures) / duree:.0f} écritures/s)")
+        ecart = bool(erreurs)
+        for ligne in soldes_par_caisse():
+            total_attendu = sum(attendu[ligne['caisse'].pk])
+            self.stdout.write(f"{ligne['caisse']} : solde tenu {ligne['solde']} / recalculé {ligne['solde_calcule']} / attendu {total_attendu}")
+            ecart = ecart or ligne['solde'] != ligne['solde_calcule'] or ligne['solde_calcule'] != total_attendu
+        # Les maillons ajoutés en concurrence doivent former une chaîne intacte
+        for cle in sorted(MODELES):
+            anomalies = verifier_complete(cle)['anomalies']
+            self.stdout.write(f"Chaîne {cle} : {len(anomalies)} anomalie(s)")
+            ecart = ecart or bool(anomalies)
+        for erreur in erreurs:
+            self.stdout.write(self.style.ERROR(erreur))
+        if ecart:
+            self.stdout.write(self.style.ERROR("Mise à jour perdue ou erreur de saisie détectée."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Aucune mise à jour perdue."))
@@ -0,0 +1,92 @@
+import io
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory
+from django.test.runner import DiscoverRunner
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from caisse.models import Beneficiaire, Caisse, Categorie, Fournisseur, OperationEntrer, OperationSortir
+from caisse.serializers import CategorieSerializer, OperationEntrerSerializer, OperationSortirSerializer, sorties_jointes
+from caisse.services import annoter_totaux_operations, creer_operations_en_masse
+from GPP.renderers import JSONRapideParser, JSONRapideRenderer, dumps, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, sur une base de test jetable, l'encodage JSON habituel (JSONRenderer de DRF, "
+        "json.dumps + DjangoJSONEncoder) à l'encodage rapide de GPP/renderers.py, sur la sortie "
+        "des serializers de la caisse (opérations, catégories avec totaux)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000, help="Nombre d'opérations de chaque type.")
+        parser.add_argument('--repetitions', type=int, default=20, help="Nombre d'encodages mesurés par cas.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson n'est pas installé : l'encodage rapide retombe sur json.dumps."))
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        anciennes_bases = runner.setup_databases()
+        try:
+            self.executer(options['operations'], options['repetitions'])
+        finally:
+            runner.teardown_databases(anciennes_bases)
+
+    def mesurer(self, fonction, repetitions):
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            fonction()
+        return (time.perf_counter() - debut) / repetitions * 1000
+
+    def executer(self, nombre, repetitions):
+        categorie_entree = Categorie.objects.create(name='Benchmark entrées', type='entree')
+        categorie_sortie = Categorie.objects.create(name='Benchmark sorties', type='sortie')
+        fournisseur = Fournisseur.objects.create(name='Benchmark', contact='0000000000')
+        beneficiaire = Beneficiaire.objects.create(name='Benchmark')
+        caisse = Caisse.principale()
+        creer_operations_en_masse(OperationEntrer, [
+            OperationEntrer(description=f'Entrée {i}', montant=Decimal(1000 + i), categorie=categorie_entree, caisse=caisse)
+            for i in range(nombre)
+        ])
+        creer_operations_en_masse(OperationSortir, [
+            OperationSortir(description=f'Sortie {i}', montant=Decimal(100 + i % 900), categorie=categorie_sortie,
+                            beneficiaire=beneficiaire, fournisseur=fournisseur, caisse=caisse)
+            for i in range(nombre)
+        ])
+
+        # Données des listes de l'API et équivalent values() des vues JsonResponse (dates et Decimal bruts)
+        cas = {
+            'entrées (serializer)': OperationEntrerSerializer(OperationEntrer.objects.select_related('categorie'), many=True).data,
+            'sorties (serializer)': OperationSortirSerializer(sorties_jointes(OperationSortir.objects.all()), many=True).data,
+            'catégories + totaux': CategorieSerializer(
+                annoter_totaux_operations(Categorie.objects.all(), entrees='categorie', sorties='categorie'),
+                many=True, context={'request': RequestFactory().get('/', {'expand': 'totaux'})},
+            ).data,
+            'sorties (values)': list(OperationSortir.objects.values(
+                'id', 'description', 'montant', 'date_de_sortie', 'quantite', 'categorie_id', 'fournisseur_id'
+            )),
+        }
+        self.stdout.write(f"{nombre} opérations de chaque type, moyenne de {repetitions} encodages (ms)")
+        self.stdout.write(f"{'cas':<24}{'DRF':>10}{'rapide':>10}{'gain':>8}{'json.dumps':>12}{'rapide':>10}{'gain':>8}")
+        for nom, donnees in cas.items():
+            drf = self.mesurer(lambda: JSONRenderer().render(donnees), repetitions)
+            rapide_api = self.mesurer(lambda: JSONRapideRenderer().render(donnees), repetitions)
+            django = self.mesurer(lambda: json.dumps(donnees, cls=DjangoJSONEncoder), repetitions)
+            rapide = self.mesurer(lambda: dumps(donnees), repetitions)
+            # Même contenu une fois décodé : seule la vitesse change
+            if json.loads(JSONRenderer().render(donnees)) != json.loads(JSONRapideRenderer().render(donnees)):
+                self.stdout.write(self.style.ERROR(f"{nom} : rendus différents"))
+            self.stdout.write(f"{nom:<24}{drf:>10.2f}{rapide_api:>10.2f}{drf / rapide_api:>7.1f}x"
+                              f"{django:>12.2f}{rapide:>10.2f}{django / rapide:>7.1f}x")
+
+        # Décodage d'un lot d'opérations reçu par l'API
+        corps = JSONRenderer().render(cas['sorties (values)'])
+        lire = lambda parser: parser.parse(io.BytesIO(corps), 'application/json', {'encoding': 'utf-8'})
+        drf = self.mesurer(lambda: lire(JSONParser()), repetitions)
+        rapide = self.mesurer(lambda: lire(JSONRapideParser()), repetitions)
+        self.stdout.write(f"{'décodage (parser)':<24}{drf:>10.2f}{rapide:>10.2f}{drf / rapide:>7.1f}x")
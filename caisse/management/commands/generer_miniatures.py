@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from caisse.justificatifs import generer_miniatures_manquantes
+
+
+class Command(BaseCommand):
+    help = "Génère les miniatures des justificatifs qui n'en ont pas encore (génération en arrière-plan interrompue)."
+
+    def handle(self, *args, **options):
+        nombre = generer_miniatures_manquantes()
+        self.stdout.write(self.style.SUCCESS(f"{nombre} miniature(s) générée(s)."))
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from caisse.services import generer_operations_recurrentes
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée en masse les opérations des modèles récurrents dont l'échéance est atteinte "
+        "(les échéances déjà générées sont ignorées)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jusqu-au', dest='jusqu_au', help="Date limite des échéances (AAAA-MM-JJ, aujourd'hui par défaut).")
+        parser.add_argument('--simulation', action='store_true', help="Affiche les opérations à créer sans les enregistrer.")
+
+    def handle(self, *args, **options):
+        try:
+            jusqu_au = date.fromisoformat(options['jusqu_au']) if options['jusqu_au'] else timezone.localdate()
+        except ValueError:
+            raise CommandError("Date invalide : utilisez le format AAAA-MM-JJ.")
+
+        crees = generer_operations_recurrentes(jusqu_au, simulation=options['simulation'])
+        for cle, operations in crees.items():
+            for operation in operations:
+                self.stdout.write(f"  {cle} {operation.echeance} : {operation.description} ({operation.montant})")
+        total = sum(len(operations) for operations in crees.values())
+        verbe = "à créer" if options['simulation'] else "créée(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} opération(s) {verbe} jusqu'au {jusqu_au:%d/%m/%Y} "
+            f"({len(crees['entree'])} entrée(s), {len(crees['sortie'])} sortie(s))."
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from caisse.models import Caisse
+from caisse.services import soldes_par_caisse
+
+
+class Command(BaseCommand):
+    help = "Compare le solde tenu par chaque caisse au solde recalculé depuis les opérations (et le corrige avec --corriger)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corriger', action='store_true', help="Réécrit le solde des caisses avec le solde recalculé.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Caisse.verrouiller_plusieurs(Caisse.objects.values_list('pk', flat=True))
+            ecarts = 0
+            for ligne in soldes_par_caisse():
+                caisse, ecart = ligne['caisse'], ligne['solde'] - ligne['solde_calcule']
+                self.stdout.write(f"{caisse} : solde tenu {ligne['solde']} / recalculé {ligne['solde_calcule']} / écart {ecart}")
+                if ecart:
+                    ecarts += 1
+                    if options['corriger']:
+                        Caisse.objects.filter(pk=caisse.pk).update(montant=ligne['solde_calcule'])
+
+            if not ecarts:
+                self.stdout.write(self.style.SUCCESS("Les soldes des caisses sont à jour."))
+            elif options['corriger']:
+                self.stdout.write(self.style.SUCCESS(f"{ecarts} solde(s) corrigé(s)."))
+            else:
+                self.stdout.write(self.style.WARNING("Écart détecté : relancez avec --corriger pour le corriger."))
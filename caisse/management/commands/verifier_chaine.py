@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from caisse.chaine import MODELES, resceller, verifier_complete, verifier_incrementale
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie la chaîne d'intégrité des opérations : par défaut depuis le dernier point de contrôle, "
+        "ou entièrement avec --complet (segments par période répartis sur --processus processus)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true', help="Revérifie toute la chaîne au lieu du seul dernier segment.")
+        parser.add_argument('--periode', choices=('month', 'year'), default='month', help="Découpage des segments en vérification complète.")
+        parser.add_argument('--processus', type=int, default=1, help="Nombre de processus de vérification (vérification complète).")
+        parser.add_argument('--modele', choices=sorted(MODELES), help="Ne vérifier que les entrées ou que les sorties.")
+        parser.add_argument('--resceller', action='store_true', help="Recalcule toute la chaîne (après un changement de CAISSE_CHAINE_CLE).")
+
+    def handle(self, *args, **options):
+        cles = [options['modele']] if options['modele'] else sorted(MODELES)
+
+        if options['resceller']:
+            for cle in cles:
+                self.stdout.write(f"{cle} : {resceller(cle)} maillon(s) recalculé(s).")
+            return
+
+        anomalies = []
+        for cle in cles:
+            debut = time.perf_counter()
+            if options['complet']:
+                resultat = verifier_complete(cle, options['periode'], max(options['processus'], 1))
+                portee = f"{resultat['segments']} segment(s)"
+            else:
+                resultat = verifier_incrementale(cle)
+                portee = f"depuis l'opération {resultat['depuis']}" if resultat['depuis'] else "depuis le début"
+            self.stdout.write(
+                f"{cle} : {resultat['nombre']} opération(s) vérifiée(s) ({portee}) en {time.perf_counter() - debut:.2f} s"
+            )
+            anomalies += resultat['anomalies']
+
+        for cle, pk, motif in anomalies:
+            self.stdout.write(self.style.ERROR(f"  {cle} {pk} : {motif}"))
+        if anomalies:
+            raise CommandError(f"Chaîne d'intégrité compromise : {len(anomalies)} anomalie(s).")
+        self.stdout.write(self.style.SUCCESS("La chaîne d'intégrité est intacte."))
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def initialiser_closure(apps, schema_editor):
+    # Les catégories existantes sont toutes des racines : un seul lien vers elles-mêmes
+    Categorie = apps.get_model('caisse', 'Categorie')
+    CategorieClosure = apps.get_model('caisse', 'CategorieClosure')
+    CategorieClosure.objects.bulk_create([
+        CategorieClosure(ancetre_id=pk, descendant_id=pk, profondeur=0)
+        for pk in Categorie.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0011_alter_historicaloperationsortir_quantite_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='niveau',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='enfants', to='caisse.categorie'),
+        ),
+        migrations.AddField(
+            model_name='historicalcategorie',
+            name='niveau',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='historicalcategorie',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.categorie'),
+        ),
+        migrations.CreateModel(
+            name='CategorieClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profondeur', models.PositiveIntegerField(default=0)),
+                ('ancetre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_descendants', to='caisse.categorie')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_ancetres', to='caisse.categorie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancetre', 'profondeur'], name='closure_ancetre_idx'), models.Index(fields=['descendant', 'profondeur'], name='closure_descendant_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancetre', 'descendant'), name='unique_categorie_closure')],
+            },
+        ),
+        migrations.RunPython(initialiser_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0012_categorie_arborescence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('type', models.CharField(choices=[('projet', 'Projet'), ('donateur', 'Donateur'), ('evenement', 'Événement'), ('autre', 'Autre')], default='autre', max_length=10)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='entrees', to='caisse.tag'),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='sorties', to='caisse.tag'),
+        ),
+    ]
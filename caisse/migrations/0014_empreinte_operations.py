@@ -0,0 +1,75 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:20
+
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# Copies figées de normaliser_texte (GPP/normalisation.py) et caisse.utils.empreinte_operation à la date de la migration :
+# la migration ne dépend pas du code de l'application, qui peut évoluer
+def normaliser_texte(texte):
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    texte = re.sub(r'[^\w\s]', ' ', texte)
+    return ' '.join(texte.split())
+
+
+def empreinte_operation(date, montant, description, fournisseur_id=None):
+    try:
+        montant = Decimal(str(montant)).quantize(Decimal('1'))
+    except (InvalidOperation, ValueError):
+        montant = montant or ''
+    valeur = '|'.join([str(date)[:10], str(montant), str(fournisseur_id or ''), normaliser_texte(description)])
+    return hashlib.sha1(valeur.encode('utf-8')).hexdigest()
+
+
+def calculer_empreintes(apps, schema_editor):
+    # Empreintes des opérations déjà saisies, écrites par lots
+    OperationEntrer = apps.get_model('caisse', 'OperationEntrer')
+    OperationSortir = apps.get_model('caisse', 'OperationSortir')
+
+    entrees = list(OperationEntrer.objects.only('date_transaction', 'montant', 'description'))
+    for operation in entrees:
+        operation.empreinte = empreinte_operation(operation.date_transaction, operation.montant, operation.description)
+    OperationEntrer.objects.bulk_update(entrees, ['empreinte'], batch_size=500)
+
+    sorties = list(OperationSortir.objects.only('date_de_sortie', 'montant', 'description', 'fournisseur_id'))
+    for operation in sorties:
+        operation.empreinte = empreinte_operation(
+            operation.date_de_sortie, operation.montant, operation.description, operation.fournisseur_id
+        )
+    OperationSortir.objects.bulk_update(sorties, ['empreinte'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0013_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaloperationentrer',
+            name='empreinte',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationsortir',
+            name='empreinte',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='empreinte',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='empreinte',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(calculer_empreintes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0014_empreinte_operations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleveBancaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('date_import', models.DateTimeField(auto_now_add=True)),
+                ('tolerance_jours', models.PositiveSmallIntegerField(default=3)),
+                ('importe_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date_import'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LigneReleve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('libelle', models.CharField(blank=True, max_length=255)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('entree', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lignes_releve', to='caisse.operationentrer')),
+                ('sortie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lignes_releve', to='caisse.operationsortir')),
+                ('releve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='caisse.relevebancaire')),
+            ],
+            options={
+                'ordering': ['date', 'pk'],
+                'indexes': [models.Index(fields=['releve', 'date'], name='ligne_releve_date_idx')],
+            },
+        ),
+    ]
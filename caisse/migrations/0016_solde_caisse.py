@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:25
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def initialiser_solde(apps, schema_editor):
+    # La caisse principale (la plus ancienne) reprend le solde de toutes les opérations existantes
+    Caisse = apps.get_model('caisse', 'Caisse')
+    OperationEntrer = apps.get_model('caisse', 'OperationEntrer')
+    OperationSortir = apps.get_model('caisse', 'OperationSortir')
+    solde = (
+        (OperationEntrer.objects.aggregate(total=Sum('montant'))['total'] or Decimal('0'))
+        - (OperationSortir.objects.aggregate(total=Sum('montant'))['total'] or Decimal('0'))
+    )
+    caisse = Caisse.objects.order_by('pk').first()
+    if caisse is None:
+        Caisse.objects.create(montant=solde)
+    else:
+        Caisse.objects.filter(pk=caisse.pk).update(montant=solde)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0015_rapprochement_bancaire'),
+    ]
+
+    operations = [
+        migrations.RunPython(initialiser_solde, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:28
+
+import django.db.models.deletion
+import django.utils.timezone
+import simple_history.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+
+def rattacher_caisse_principale(apps, schema_editor):
+    # Les opérations existantes appartiennent à la caisse principale (la plus ancienne)
+    Caisse = apps.get_model('caisse', 'Caisse')
+    OperationEntrer = apps.get_model('caisse', 'OperationEntrer')
+    OperationSortir = apps.get_model('caisse', 'OperationSortir')
+    caisse = Caisse.objects.order_by('pk').first()
+    if caisse is None:
+        caisse = Caisse.objects.create(nom='Caisse principale', montant=0)
+    OperationEntrer.objects.filter(caisse__isnull=True).update(caisse=caisse)
+    OperationSortir.objects.filter(caisse__isnull=True).update(caisse=caisse)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0016_solde_caisse'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricalTransfertCaisse',
+            fields=[
+                ('id', models.BigIntegerField(auto_created=True, blank=True, db_index=True, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('history_id', models.AutoField(primary_key=True, serialize=False)),
+                ('history_date', models.DateTimeField(db_index=True)),
+                ('history_change_reason', models.CharField(max_length=100, null=True)),
+                ('history_type', models.CharField(choices=[('+', 'Created'), ('~', 'Changed'), ('-', 'Deleted')], max_length=1)),
+            ],
+            options={
+                'verbose_name': 'historical transfert caisse',
+                'verbose_name_plural': 'historical transfert caisses',
+                'ordering': ('-history_date', '-history_id'),
+                'get_latest_by': ('history_date', 'history_id'),
+            },
+            bases=(simple_history.models.HistoricalChanges, models.Model),
+        ),
+        migrations.CreateModel(
+            name='TransfertCaisse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('description', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='caisse',
+            name='nom',
+            field=models.CharField(default='Caisse principale', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='historicalcaisse',
+            name='nom',
+            field=models.CharField(default='Caisse principale', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationentrer',
+            name='caisse',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationsortir',
+            name='caisse',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='caisse',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entrees', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='caisse',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sorties', to='caisse.caisse'),
+        ),
+        migrations.AddIndex(
+            model_name='operationentrer',
+            index=models.Index(fields=['caisse', 'date_transaction'], name='entree_caisse_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operationsortir',
+            index=models.Index(fields=['caisse', 'date_de_sortie'], name='sortie_caisse_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='historicaltransfertcaisse',
+            name='caisse_destination',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='historicaltransfertcaisse',
+            name='caisse_source',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='historicaltransfertcaisse',
+            name='history_user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='historicaltransfertcaisse',
+            name='utilisateur',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transfertcaisse',
+            name='caisse_destination',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transferts_recus', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='transfertcaisse',
+            name='caisse_source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transferts_emis', to='caisse.caisse'),
+        ),
+        migrations.AddField(
+            model_name='transfertcaisse',
+            name='utilisateur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transfertcaisse',
+            index=models.Index(fields=['caisse_source', 'date'], name='transfert_source_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfertcaisse',
+            index=models.Index(fields=['caisse_destination', 'date'], name='transfert_dest_date_idx'),
+        ),
+        migrations.RunPython(rattacher_caisse_principale, migrations.RunPython.noop),
+    ]
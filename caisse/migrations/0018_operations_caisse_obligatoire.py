@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0017_multi_caisse'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='operationentrer',
+            name='caisse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entrees', to='caisse.caisse'),
+        ),
+        migrations.AlterField(
+            model_name='operationsortir',
+            name='caisse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sorties', to='caisse.caisse'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:38
+
+from django.db import migrations, models
+
+from caisse.utils import hash_chaine
+
+# Champs scellés à la date de cette migration (voir CHAMPS_CHAINE des modèles)
+CHAMPS_CHAINE = {
+    'OperationEntrer': ('entree', ('id', 'date', 'date_transaction', 'montant', 'description', 'categorie_id', 'caisse_id')),
+    'OperationSortir': ('sortie', (
+        'id', 'date', 'date_de_sortie', 'montant', 'quantite', 'description',
+        'categorie_id', 'beneficiaire_id', 'fournisseur_id', 'caisse_id',
+    )),
+}
+
+
+def sceller_operations(apps, schema_editor):
+    # Chaîne initiale des opérations déjà saisies, dans l'ordre des clés, écrite par lots
+    ChaineOperations = apps.get_model('caisse', 'ChaineOperations')
+    for nom_modele, (cle, champs) in CHAMPS_CHAINE.items():
+        modele = apps.get_model('caisse', nom_modele)
+        precedent, dernier_id, maillons = '', 0, []
+        for valeurs in modele.objects.order_by('pk').values_list(*champs).iterator(chunk_size=2000):
+            maillon = hash_chaine(precedent, valeurs)
+            maillons.append((precedent, maillon, valeurs[0]))
+            precedent, dernier_id = maillon, valeurs[0]
+        nom = schema_editor.quote_name
+        with schema_editor.connection.cursor() as curseur:
+            curseur.executemany(
+                f"UPDATE {nom(modele._meta.db_table)} SET {nom('hash_precedent')} = %s, {nom('hash_chaine')} = %s WHERE {nom('id')} = %s",
+                maillons
+            )
+        ChaineOperations.objects.create(modele=cle, dernier_id=dernier_id, dernier_hash=precedent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0018_operations_caisse_obligatoire'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaineOperations',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(choices=[('entree', 'Entrées'), ('sortie', 'Sorties')], max_length=10, unique=True)),
+                ('dernier_id', models.PositiveIntegerField(default=0)),
+                ('dernier_hash', models.CharField(blank=True, default='', max_length=64)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='hash_chaine',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='hash_precedent',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='hash_chaine',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='hash_precedent',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='PointControleChaine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(choices=[('entree', 'Entrées'), ('sortie', 'Sorties')], max_length=10)),
+                ('dernier_id', models.PositiveIntegerField()),
+                ('hash_chaine', models.CharField(max_length=64)),
+                ('nombre_verifiees', models.PositiveIntegerField(default=0)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modele', 'dernier_id'], name='point_controle_modele_idx')],
+            },
+        ),
+        migrations.RunPython(sceller_operations, migrations.RunPython.noop),
+    ]
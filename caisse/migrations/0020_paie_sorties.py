@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0019_chaine_integrite'),
+        ('personnel', '0011_alter_employee_salaire_base_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiaire',
+            name='employee',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='beneficiaires', to='personnel.employee'),
+        ),
+        migrations.AddField(
+            model_name='historicalbeneficiaire',
+            name='employee',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='personnel.employee'),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationsortir',
+            name='paie',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='personnel.paie'),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='paie',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operation_sortie', to='personnel.paie'),
+        ),
+    ]
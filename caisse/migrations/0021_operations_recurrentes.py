@@ -0,0 +1,121 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:47
+
+import django.db.models.deletion
+import django.utils.timezone
+import simple_history.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0020_paie_sorties'),
+        ('personnel', '0011_alter_employee_salaire_base_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaloperationentrer',
+            name='echeance',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationsortir',
+            name='echeance',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='echeance',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='echeance',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='HistoricalOperationRecurrente',
+            fields=[
+                ('id', models.BigIntegerField(auto_created=True, blank=True, db_index=True, verbose_name='ID')),
+                ('type', models.CharField(choices=[('entree', 'Entrée'), ('sortie', 'Sortie')], max_length=10)),
+                ('description', models.CharField(max_length=255)),
+                ('montant', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('quantite', models.DecimalField(decimal_places=0, default=1, max_digits=10)),
+                ('frequence', models.CharField(choices=[('hebdomadaire', 'Hebdomadaire'), ('mensuelle', 'Mensuelle'), ('trimestrielle', 'Trimestrielle'), ('semestrielle', 'Semestrielle'), ('annuelle', 'Annuelle')], default='mensuelle', max_length=15)),
+                ('date_debut', models.DateField(default=django.utils.timezone.localdate)),
+                ('date_fin', models.DateField(blank=True, null=True)),
+                ('derniere_echeance', models.DateField(blank=True, editable=False, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('history_id', models.AutoField(primary_key=True, serialize=False)),
+                ('history_date', models.DateTimeField(db_index=True)),
+                ('history_change_reason', models.CharField(max_length=100, null=True)),
+                ('history_type', models.CharField(choices=[('+', 'Created'), ('~', 'Changed'), ('-', 'Deleted')], max_length=1)),
+                ('beneficiaire', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.beneficiaire')),
+                ('caisse', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.caisse')),
+                ('categorie', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.categorie')),
+                ('fournisseur', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.fournisseur')),
+                ('history_user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'historical operation recurrente',
+                'verbose_name_plural': 'historical operation recurrentes',
+                'ordering': ('-history_date', '-history_id'),
+                'get_latest_by': ('history_date', 'history_id'),
+            },
+            bases=(simple_history.models.HistoricalChanges, models.Model),
+        ),
+        migrations.CreateModel(
+            name='OperationRecurrente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('entree', 'Entrée'), ('sortie', 'Sortie')], max_length=10)),
+                ('description', models.CharField(max_length=255)),
+                ('montant', models.DecimalField(decimal_places=0, max_digits=10)),
+                ('quantite', models.DecimalField(decimal_places=0, default=1, max_digits=10)),
+                ('frequence', models.CharField(choices=[('hebdomadaire', 'Hebdomadaire'), ('mensuelle', 'Mensuelle'), ('trimestrielle', 'Trimestrielle'), ('semestrielle', 'Semestrielle'), ('annuelle', 'Annuelle')], default='mensuelle', max_length=15)),
+                ('date_debut', models.DateField(default=django.utils.timezone.localdate)),
+                ('date_fin', models.DateField(blank=True, null=True)),
+                ('derniere_echeance', models.DateField(blank=True, editable=False, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('beneficiaire', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='caisse.beneficiaire')),
+                ('caisse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='caisse.caisse')),
+                ('categorie', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='caisse.categorie')),
+                ('fournisseur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='caisse.fournisseur')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='historicaloperationentrer',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.operationrecurrente'),
+        ),
+        migrations.AddField(
+            model_name='historicaloperationsortir',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='caisse.operationrecurrente'),
+        ),
+        migrations.AddField(
+            model_name='operationentrer',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entrees', to='caisse.operationrecurrente'),
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sorties', to='caisse.operationrecurrente'),
+        ),
+        migrations.AddConstraint(
+            model_name='operationentrer',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'echeance'), name='entree_recurrence_echeance_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='operationsortir',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'echeance'), name='sortie_recurrence_echeance_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='operationrecurrente',
+            index=models.Index(fields=['active', 'derniere_echeance'], name='recurrente_active_idx'),
+        ),
+    ]
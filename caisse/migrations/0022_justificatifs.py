@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0021_operations_recurrentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Justificatif',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('empreinte', models.CharField(editable=False, max_length=64, unique=True)),
+                ('fichier', models.FileField(max_length=255, upload_to='')),
+                ('miniature', models.ImageField(blank=True, max_length=255, upload_to='')),
+                ('nom', models.CharField(max_length=255)),
+                ('type_mime', models.CharField(max_length=100)),
+                ('taille', models.PositiveIntegerField()),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='operationsortir',
+            name='justificatifs',
+            field=models.ManyToManyField(blank=True, related_name='sorties', to='caisse.justificatif'),
+        ),
+    ]
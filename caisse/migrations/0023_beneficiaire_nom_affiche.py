@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:50
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+
+def remplir_nom_affiche(apps, schema_editor):
+    # Deux UPDATE : bénéficiaires liés à un personnel (« nom prénom ») et bénéficiaires externes
+    Beneficiaire = apps.get_model('caisse', 'Beneficiaire')
+    Personnel = apps.get_model('caisse', 'Personnel')
+    noms = Personnel.objects.filter(pk=OuterRef('personnel_id')).annotate(
+        nom_complet=Concat('last_name', Value(' '), 'first_name', output_field=models.CharField())
+    ).values('nom_complet')[:1]
+    Beneficiaire.objects.filter(personnel__isnull=False).update(nom_affiche=Subquery(noms))
+    Beneficiaire.objects.filter(personnel__isnull=True).update(nom_affiche=Coalesce('name', Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0022_justificatifs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiaire',
+            name='nom_affiche',
+            field=models.CharField(blank=True, editable=False, max_length=101),
+        ),
+        migrations.RunPython(remplir_nom_affiche, migrations.RunPython.noop),
+    ]
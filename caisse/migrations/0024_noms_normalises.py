@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:56
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copie figée de normaliser_texte (GPP/normalisation.py) à la date de la migration :
+# la migration ne dépend pas du code des applications, qui peut évoluer
+def normaliser_texte(texte):
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    texte = re.sub(r'[^\w\s]', ' ', texte)
+    return ' '.join(texte.split())
+
+# Nom source de chaque modèle (voir nom_a_normaliser)
+NOMS = {
+    'Categorie': lambda objet: objet.name,
+    'Fournisseur': lambda objet: objet.name,
+    'Beneficiaire': lambda objet: objet.nom_affiche,
+    'Personnel': lambda objet: f"{objet.last_name} {objet.first_name}",
+}
+
+
+def remplir_noms_normalises(apps, schema_editor):
+    for nom_modele, nom in NOMS.items():
+        modele = apps.get_model('caisse', nom_modele)
+        longueur = modele._meta.get_field('nom_normalise').max_length
+        objets = list(modele.objects.all())
+        for objet in objets:
+            objet.nom_normalise = normaliser_texte(nom(objet))[:longueur]
+        modele.objects.bulk_update(objets, ['nom_normalise'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0023_beneficiaire_nom_affiche'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiaire',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='fournisseur',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='personnel',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.RunPython(remplir_noms_normalises, migrations.RunPython.noop),
+    ]
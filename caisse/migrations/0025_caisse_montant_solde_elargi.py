@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caisse', '0024_noms_normalises'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='caisse',
+            name='montant',
+            field=models.DecimalField(decimal_places=2, max_digits=18),
+        ),
+        migrations.AlterField(
+            model_name='historicalcaisse',
+            name='montant',
+            field=models.DecimalField(decimal_places=2, max_digits=18),
+        ),
+    ]
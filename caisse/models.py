@@ -1,18 +1,56 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F
 import re
 from django.forms import ValidationError
 from django.utils import timezone
-from django.db import models
 import json
+from decimal import Decimal
 from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.conf import settings
 from simple_history.models import HistoricalRecords
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+import threading
+from datetime import timedelta
+
+from GPP.normalisation import NomNormaliseMixin
+
+from .utils import ajouter_mois, empreinte_operation, hash_chaine
 
 # Create your models here.
 
+class HistoriqueSuspendable(HistoricalRecords):
+    """
+    Historique simple_history dont l'écriture ligne par ligne peut être suspendue
+    le temps d'une opération en masse, qui écrit alors son historique en une fois.
+    """
+    _etat = threading.local()
+
+    @classmethod
+    @contextmanager
+    def suspendre(cls):
+        precedent = cls.est_suspendu()
+        cls._etat.suspendu = True
+        try:
+            yield
+        finally:
+            cls._etat.suspendu = precedent
+
+    @classmethod
+    def est_suspendu(cls):
+        return getattr(cls._etat, 'suspendu', False)
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        if not self.est_suspendu():
+            super().post_save(instance, created, using=using, **kwargs)
+
+    def post_delete(self, instance, using=None, **kwargs):
+        if not self.est_suspendu():
+            super().post_delete(instance, using=using, **kwargs)
+
 # Modèle Category - Catégorie des transactions
-class Categorie(models.Model):
+class Categorie(NomNormaliseMixin, models.Model):
     TYPE_CHOICES = [
         ('entree', 'Entrée'),
         ('sortie', 'Sortie'),
@@ -20,21 +58,114 @@ class Categorie(models.Model):
     name = models.CharField(max_length=50, unique=True)
     description = models.TextField(null=True, blank=True)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='entree')
-    history = HistoricalRecords()
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='enfants')  # Catégorie parente
+    niveau = models.PositiveIntegerField(default=0, db_index=True, editable=False)  # Profondeur dans l'arborescence (0 = racine)
+    nom_normalise = models.CharField(max_length=50, db_index=True, editable=False, default='')  # Recherche par préfixe (autocomplétion)
+    history = HistoricalRecords(excluded_fields=['nom_normalise'])
 
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
 
+    def nom_a_normaliser(self):
+        return self.name
+
+    def verifier_parent(self):
+        # Empêche les cycles : le parent ne peut pas être la catégorie elle-même ni l'une de ses sous-catégories
+        if self.parent_id and self.pk and CategorieClosure.objects.filter(ancetre_id=self.pk, descendant_id=self.parent_id).exists():
+            raise ValidationError("Une catégorie ne peut pas être rattachée à l'une de ses sous-catégories.")
+
+    def clean(self):
+        if self.parent_id and self.parent.type != self.type:
+            raise ValidationError("La catégorie parente doit être du même type.")
+        if self.pk and self.sous_categories().exclude(pk=self.pk).exclude(type=self.type).exists():
+            raise ValidationError("Les sous-catégories doivent être du même type : changez d'abord leur type.")
+        self.verifier_parent()
+
+    def save(self, *args, **kwargs):
+        creation = self._state.adding
+        ancien = None
+        if not creation:
+            ancien = Categorie.objects.filter(pk=self.pk).values('parent_id', 'niveau').first()
+        self.verifier_parent()
+        self.niveau = self.parent.niveau + 1 if self.parent_id else 0
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creation or ancien is None:
+                CategorieClosure.rattacher(self)
+            elif ancien['parent_id'] != self.parent_id:
+                CategorieClosure.deplacer(self, self.niveau - ancien['niveau'])
+
+    def sous_categories(self):
+        """Retourne la catégorie et toutes ses sous-catégories (une seule jointure sur la table de fermeture)."""
+        return Categorie.objects.filter(liens_ancetres__ancetre=self)
+
     def to_json(self):
         return json.dumps({
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'type': self.type
+            'type': self.type,
+            'parent': self.parent_id,
+            'niveau': self.niveau,
         }, cls=DjangoJSONEncoder)
 
+
+# Table de fermeture (closure table) de l'arborescence des catégories :
+# une ligne par couple (ancêtre, descendant), y compris le couple (catégorie, elle-même).
+class CategorieClosure(models.Model):
+    ancetre = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name='liens_descendants')
+    descendant = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name='liens_ancetres')
+    profondeur = models.PositiveIntegerField(default=0)  # Distance entre l'ancêtre et le descendant
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancetre', 'descendant'], name='unique_categorie_closure'),
+        ]
+        indexes = [
+            models.Index(fields=['ancetre', 'profondeur'], name='closure_ancetre_idx'),
+            models.Index(fields=['descendant', 'profondeur'], name='closure_descendant_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancetre_id} -> {self.descendant_id} ({self.profondeur})"
+
+    @classmethod
+    def rattacher(cls, categorie):
+        """Crée les liens d'une nouvelle catégorie vers elle-même et vers tous les ancêtres de son parent."""
+        liens = [cls(ancetre=categorie, descendant=categorie, profondeur=0)]
+        if categorie.parent_id:
+            liens += [
+                cls(ancetre_id=ancetre_id, descendant=categorie, profondeur=profondeur + 1)
+                for ancetre_id, profondeur in cls.objects.filter(
+                    descendant_id=categorie.parent_id
+                ).values_list('ancetre_id', 'profondeur')
+            ]
+        cls.objects.bulk_create(liens)
+
+    @classmethod
+    def deplacer(cls, categorie, delta_niveau):
+        """Déplace le sous-arbre d'une catégorie sous son nouveau parent."""
+        sous_arbre = dict(cls.objects.filter(ancetre=categorie).values_list('descendant_id', 'profondeur'))
+
+        # Supprimer les liens entre les anciens ancêtres et le sous-arbre
+        cls.objects.filter(descendant_id__in=sous_arbre).exclude(ancetre_id__in=sous_arbre).delete()
+
+        # Relier le sous-arbre aux ancêtres du nouveau parent
+        if categorie.parent_id:
+            ancetres = cls.objects.filter(descendant_id=categorie.parent_id).values_list('ancetre_id', 'profondeur')
+            cls.objects.bulk_create([
+                cls(ancetre_id=ancetre_id, descendant_id=descendant_id, profondeur=p_ancetre + p_descendant + 1)
+                for ancetre_id, p_ancetre in ancetres
+                for descendant_id, p_descendant in sous_arbre.items()
+            ])
+
+        # Mettre à jour le niveau des sous-catégories (la catégorie elle-même est déjà à jour)
+        if delta_niveau:
+            Categorie.objects.filter(pk__in=sous_arbre).exclude(pk=categorie.pk).update(niveau=F('niveau') + delta_niveau)
+
 # Modèle Personnel
-class Personnel(models.Model):
+class Personnel(NomNormaliseMixin, models.Model):
     # Sexe
     HOMME = 'Homme'
     FEMME = 'Femme'
@@ -64,7 +195,8 @@ class Personnel(models.Model):
     photo = models.ImageField(upload_to='photos/', blank=True , default="photos/pdp_defaut.png")
     adresse = models.CharField(max_length=100, null=True)
     type_personnel = models.CharField(max_length=10, choices=TYPE_CHOICES, null=False, default='Salarié')
-    history = HistoricalRecords()
+    nom_normalise = models.CharField(max_length=101, db_index=True, editable=False, default='')  # Recherche par préfixe (autocomplétion)
+    history = HistoricalRecords(excluded_fields=['nom_normalise'])
 
     def clean(self):
 
@@ -79,6 +211,9 @@ class Personnel(models.Model):
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
 
+    def nom_a_normaliser(self):
+        return str(self)
+
     def to_json(self):
         return json.dumps({
             'id': self.id,
@@ -94,14 +229,18 @@ class Personnel(models.Model):
         }, cls=DjangoJSONEncoder)
 
 # Modèle Fournisseur
-class Fournisseur(models.Model):
+class Fournisseur(NomNormaliseMixin, models.Model):
     name = models.CharField(max_length=50)
     contact = models.CharField(max_length=15)  # Contact comme numéro de téléphone
-    history = HistoricalRecords()
+    nom_normalise = models.CharField(max_length=50, db_index=True, editable=False, default='')  # Recherche par préfixe (autocomplétion)
+    history = HistoricalRecords(excluded_fields=['nom_normalise'])
 
     def __str__(self):
         return self.name
 
+    def nom_a_normaliser(self):
+        return self.name
+
     def to_json(self):
         return json.dumps({
             'id': self.id,
@@ -110,40 +249,291 @@ class Fournisseur(models.Model):
         }, cls=DjangoJSONEncoder)
 
 # Modèle Beneficiaire
-class Beneficiaire(models.Model):
+class Beneficiaire(NomNormaliseMixin, models.Model):
     personnel = models.ForeignKey(Personnel, on_delete=models.PROTECT, blank=True, null=True)
     name = models.CharField(max_length=50, blank=True, null=True, help_text="Nom du bénéficiaire (facultatif, utilisé si personnel n'est pas spécifié)")
-    history = HistoricalRecords()
+    employee = models.ForeignKey('personnel.Employee', on_delete=models.SET_NULL, blank=True, null=True, related_name='beneficiaires')  # Employé payé par la paie
+    nom_affiche = models.CharField(max_length=101, blank=True, editable=False)  # Nom affiché, tenu à jour (évite de charger le personnel)
+    nom_normalise = models.CharField(max_length=101, db_index=True, editable=False, default='')  # Recherche par préfixe (autocomplétion)
+    history = HistoricalRecords(excluded_fields=['nom_affiche', 'nom_normalise'])
 
     def __str__(self):
-        if self.personnel:
+        return self.nom_affiche or self.calculer_nom_affiche() or "Beneficiaire sans nom ni personnel"
+
+    def calculer_nom_affiche(self):
+        if self.personnel_id:
             return str(self.personnel)
-        elif self.name:
-            return self.name
-        else:
-            return "Beneficiaire sans nom ni personnel"
+        if self.employee_id:
+            return self.nom_employe(self.employee)
+        return self.name or ''
+
+    @classmethod
+    def nom_employe(cls, employee):
+        """Nom affiché d'un bénéficiaire créé depuis un employé (comptabilisation de la paie)."""
+        return f"{employee.nom} {employee.prenom or ''}".strip()[:cls._meta.get_field('nom_affiche').max_length]
+
+    def nom_a_normaliser(self):
+        return self.nom_affiche
+
+    def save(self, *args, **kwargs):
+        self.nom_affiche = self.calculer_nom_affiche()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'nom_affiche'}
+        super().save(*args, **kwargs)
 
     def clean(self):
         if not self.personnel and not self.name:
             raise ValidationError("Au moins l'un des champs 'personnel' ou 'name' doit être rempli.")
 
+# Modèle Tag - Étiquettes libres des opérations (projet, donateur, événement...)
+class Tag(models.Model):
+    TYPE_CHOICES = [
+        ('projet', 'Projet'),
+        ('donateur', 'Donateur'),
+        ('evenement', 'Événement'),
+        ('autre', 'Autre'),
+    ]
+    name = models.CharField(max_length=50, unique=True)
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='autre')
+
+    def __str__(self):
+        return self.name
+
+# Tête de la chaîne d'intégrité d'un type d'opération ; sa ligne sert aussi de verrou
+# pour que les maillons soient ajoutés dans l'ordre des clés primaires.
+class ChaineOperations(models.Model):
+    MODELE_CHOICES = [
+        ('entree', 'Entrées'),
+        ('sortie', 'Sorties'),
+    ]
+    modele = models.CharField(max_length=10, choices=MODELE_CHOICES, unique=True)
+    dernier_id = models.PositiveIntegerField(default=0)  # Dernière opération scellée
+    dernier_hash = models.CharField(max_length=64, blank=True, default='')
+
+    def __str__(self):
+        return f"Chaîne {self.get_modele_display()} ({self.dernier_id})"
+
+    @classmethod
+    def verrouiller(cls, modele):
+        """Verrouille (select_for_update) la tête de chaîne, créée au besoin. À appeler dans une transaction."""
+        cls.objects.get_or_create(modele=modele)
+        return cls.objects.select_for_update().get(modele=modele)
+
+# Point de contrôle : la chaîne a été vérifiée intacte jusqu'à `dernier_id`.
+# La vérification incrémentale repart du dernier point encore valide.
+class PointControleChaine(models.Model):
+    modele = models.CharField(max_length=10, choices=ChaineOperations.MODELE_CHOICES)
+    dernier_id = models.PositiveIntegerField()
+    hash_chaine = models.CharField(max_length=64)
+    nombre_verifiees = models.PositiveIntegerField(default=0)  # Opérations vérifiées depuis le point précédent
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['modele', 'dernier_id'], name='point_controle_modele_idx')]
+
+    def __str__(self):
+        return f"{self.get_modele_display()} vérifiées jusqu'à {self.dernier_id} le {self.date:%d/%m/%Y %H:%M}"
+
+class SoldeInsuffisant(ValidationError):
+    """Levée quand une sortie rendrait le solde de la caisse négatif (découvert interdit)."""
+
+
+class ChaineRompue(ValidationError):
+    """Levée quand le rescellement rencontre une opération modifiée hors de l'application."""
+
+
+class MouvementCaisseMixin:
+    """
+    Répercute chaque création, modification ou suppression d'opération sur le solde
+    de sa caisse, dans la même transaction. `SENS_SOLDE` vaut 1 (entrée) ou -1 (sortie).
+    Sans caisse précisée, l'opération est rattachée à la caisse principale.
+    """
+    SENS_SOLDE = 1
+    CLE_CHAINE = 'entree'
+    CHAMPS_CHAINE = ()
+
+    @staticmethod
+    def arrondir(montant):
+        # Même arrondi que la colonne montant (decimal_places=0)
+        return Decimal(str(montant or 0)).quantize(Decimal('1'))
+
+    def save(self, *args, **kwargs):
+        self.empreinte = self.calculer_empreinte()
+        with transaction.atomic():
+            if self.caisse_id is None:
+                self.caisse = Caisse.principale()
+            ancienne = type(self).objects.filter(pk=self.pk).values('caisse_id').first() if self.pk else None
+            ancienne_caisse = ancienne['caisse_id'] if ancienne else self.caisse_id
+            caisses = Caisse.verrouiller_plusieurs({self.caisse_id, ancienne_caisse})
+            # La tête de chaîne est verrouillée avant l'insertion : les maillons suivent l'ordre des clés
+            ChaineOperations.verrouiller(self.CLE_CHAINE)
+            ancien_montant = Decimal('0')
+            if ancienne:
+                # Maillons relus sous le verrou : save() réécrit les maillons enregistrés, pas ceux de l'instance
+                ancien_montant, self.hash_precedent, self.hash_chaine = type(self).objects.filter(pk=self.pk).values_list(
+                    'montant', 'hash_precedent', 'hash_chaine'
+                ).first()
+            nouveau_montant = self.arrondir(self.montant)
+            if ancienne_caisse == self.caisse_id:
+                caisses[self.caisse_id].mouvementer(self.SENS_SOLDE * (nouveau_montant - ancien_montant))
+            else:
+                # Opération déplacée vers une autre caisse
+                caisses[ancienne_caisse].mouvementer(-self.SENS_SOLDE * ancien_montant)
+                caisses[self.caisse_id].mouvementer(self.SENS_SOLDE * nouveau_montant)
+            super().save(*args, **kwargs)
+            type(self).sceller([self.pk])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            lignes = type(self).objects.filter(pk=pk)
+            caisse_id = lignes.values_list('caisse_id', flat=True).first() or self.caisse_id
+            caisse = Caisse.verrouiller(caisse_id)
+            ChaineOperations.verrouiller(self.CLE_CHAINE)
+            # Montant et caisse relus sous les verrous : l'instance peut dater d'avant une autre modification
+            ligne = lignes.values_list('montant', 'caisse_id', 'hash_precedent', 'hash_chaine').first()
+            if ligne is None:
+                return super().delete(*args, **kwargs)
+            montant, caisse_id, *maillons = ligne
+            if caisse_id != caisse.pk:
+                caisse = Caisse.verrouiller(caisse_id)
+            caisse.mouvementer(-self.SENS_SOLDE * self.arrondir(montant))
+            resultat = super().delete(*args, **kwargs)
+            type(self).sceller([pk], supprimees={pk: tuple(maillons)})
+            return resultat
+
+    @classmethod
+    def ecrire_maillons(cls, maillons):
+        """
+        Écrit les maillons [(hash_precedent, hash_chaine, pk)] avec une seule requête UPDATE
+        paramétrée exécutée en lot : bulk_update() génère des CASE WHEN dont le coût croît
+        avec la taille du lot, trop lent pour resceller une chaîne de plusieurs années.
+        """
+        if not maillons:
+            return
+        nom = connection.ops.quote_name
+        requete = 'UPDATE {} SET {} = %s, {} = %s WHERE {} = %s'.format(
+            nom(cls._meta.db_table), nom('hash_precedent'), nom('hash_chaine'), nom(cls._meta.pk.column)
+        )
+        with connection.cursor() as curseur:
+            curseur.executemany(requete, maillons)
+
+    @classmethod
+    def sceller(cls, pks, controler=True, supprimees=None):
+        """
+        Recalcule les maillons de la chaîne à partir de la plus petite clé de `pks`
+        (opérations créées, modifiées ou supprimées par l'application). Le recalcul
+        s'arrête dès qu'un maillon au-delà de la plus grande clé est déjà cohérent :
+        une insertion ne touche qu'une ligne, une modification ancienne se propage
+        jusqu'en fin de chaîne (coût proportionnel aux lignes suivantes, sous le verrou
+        de la chaîne : les autres écritures du même type attendent). Les points de
+        contrôle postérieurs sont invalidés.
+
+        Avec `controler`, les maillons enregistrés sont contrôlés avant d'être remplacés : chaque
+        ligne déjà scellée doit suivre la précédente (ou les lignes `supprimees`, {pk: (hash_precedent,
+        hash_chaine)} lus avant leur suppression) et chaque ligne hors de `pks` correspondre à son
+        propre maillon. Une ligne modifiée, insérée ou supprimée hors de l'application lève
+        ChaineRompue (transaction annulée) au lieu d'être rescellée. Seul le rescellement complet
+        après un changement de clé (chaine.resceller) s'en passe.
+        """
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return 0
+        debut, fin = min(pks), max(pks)
+        with transaction.atomic():
+            tete = ChaineOperations.verrouiller(cls.CLE_CHAINE)
+            precedent = cls.objects.filter(pk__lt=debut).order_by('-pk').values_list('hash_chaine', flat=True).first() or ''
+            lignes = cls.objects.filter(pk__gte=debut).order_by('pk').values_list(
+                *cls.CHAMPS_CHAINE, 'hash_precedent', 'hash_chaine'
+            )
+            a_sceller = []
+            alterees = []
+            ecrites = sorted(pks)
+            supprimees = supprimees or {}
+            dernier_id = cls.objects.filter(pk__lt=debut).order_by('-pk').values_list('pk', flat=True).first() or 0
+            # Maillon enregistré de la ligne précédente, avant rescellement
+            ancien_maillon = precedent
+            for ligne in lignes.iterator(chunk_size=2000):
+                *valeurs, ancien_precedent, ancien_hash = ligne
+                pk = valeurs[0]
+                nouveau = hash_chaine(precedent, valeurs)
+                if pk > fin and ancien_precedent == precedent and ancien_hash == nouveau:
+                    # Le reste de la chaîne est déjà cohérent
+                    dernier_id, precedent = tete.dernier_id, tete.dernier_hash
+                    break
+                if controler:
+                    # Lignes supprimées par l'application juste avant : leurs maillons prolongeaient la chaîne
+                    lien_connu = True
+                    for supprimee in ecrites[bisect_right(ecrites, dernier_id):bisect_left(ecrites, pk)]:
+                        if supprimee not in supprimees:
+                            lien_connu = False
+                            continue
+                        if supprimees[supprimee][0] != ancien_maillon:
+                            alterees.append(pk)
+                        ancien_maillon = supprimees[supprimee][1]
+                    # Une ligne déjà scellée suivait la précédente ; une ligne que l'application n'a pas
+                    # écrite doit de plus être couverte par son propre maillon
+                    lien_rompu = lien_connu and ancien_hash and ancien_precedent != ancien_maillon
+                    contenu_altere = pk not in pks and ancien_hash != (
+                        nouveau if ancien_precedent == precedent else hash_chaine(ancien_precedent, valeurs)
+                    )
+                    if lien_rompu or contenu_altere:
+                        alterees.append(pk)
+                if (ancien_precedent, ancien_hash) != (precedent, nouveau):
+                    a_sceller.append((precedent, nouveau, pk))
+                dernier_id, precedent, ancien_maillon = pk, nouveau, ancien_hash
+            if alterees:
+                raise ChaineRompue(
+                    f"Chaîne d'intégrité rompue ({cls._meta.verbose_name}) : opération(s) "
+                    f"{', '.join(map(str, sorted(set(alterees))[:10]))} modifiée(s) ou précédée(s) d'une suppression "
+                    "hors de l'application. Lancez verifier_chaine avant toute nouvelle écriture."
+                )
+            cls.ecrire_maillons(a_sceller)
+            ChaineOperations.objects.filter(pk=tete.pk).update(dernier_id=dernier_id, dernier_hash=precedent)
+            PointControleChaine.objects.filter(modele=cls.CLE_CHAINE, dernier_id__gte=debut).delete()
+        return len(a_sceller)
+
 # Modèle pour les opérations (entrées et sorties)
 # Modèle pour les entrées
-class OperationEntrer(models.Model):
+class OperationEntrer(MouvementCaisseMixin, models.Model):
     
     description = models.CharField(max_length=255)  # Nom de l'opération
     montant = models.DecimalField(max_digits=10, decimal_places=0, default=0)  # Montant
     date = models.DateField(auto_now_add=True)  # Date de l'ajout dans l'application
     date_transaction = models.DateField(default=timezone.now) # Date de l'opération
     categorie = models.ForeignKey(Categorie, on_delete=models.PROTECT, null=True)  # Clé étrangère vers Categorie
-    history = HistoricalRecords()
-    
+    caisse = models.ForeignKey('Caisse', on_delete=models.PROTECT, related_name='entrees')  # Caisse physique de l'opération
+    recurrence = models.ForeignKey('OperationRecurrente', on_delete=models.SET_NULL, null=True, blank=True, related_name='entrees')  # Modèle récurrent d'origine
+    echeance = models.DateField(null=True, blank=True, editable=False)  # Échéance du modèle récurrent qui a généré l'opération
+    tags = models.ManyToManyField(Tag, blank=True, related_name='entrees')  # Étiquettes (table de liaison indexée par tag)
+    empreinte = models.CharField(max_length=40, db_index=True, editable=False, default='')  # Détection des doublons de saisie
+    hash_precedent = models.CharField(max_length=64, editable=False, default='')  # Maillon de l'opération précédente
+    hash_chaine = models.CharField(max_length=64, editable=False, default='')  # HMAC(maillon précédent, contenu)
+    history = HistoriqueSuspendable(excluded_fields=['hash_precedent', 'hash_chaine'])
+
+    # Champs entrant dans le calcul de l'empreinte
+    CHAMPS_EMPREINTE = ('date_transaction', 'montant', 'description')
+    # Champs scellés par la chaîne d'intégrité (la clé primaire en premier)
+    CHAMPS_CHAINE = ('id', 'date', 'date_transaction', 'montant', 'description', 'categorie_id', 'caisse_id')
+    CLE_CHAINE = 'entree'
+    SENS_SOLDE = 1
+
+    class Meta:
+        indexes = [models.Index(fields=['caisse', 'date_transaction'], name='entree_caisse_date_idx')]
+        constraints = [
+            # Une échéance récurrente n'est générée qu'une fois
+            models.UniqueConstraint(fields=['recurrence', 'echeance'], name='entree_recurrence_echeance_unique'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.montant}"  
 
+    def calculer_empreinte(self):
+        return empreinte_operation(self.date_transaction, self.montant, self.description)
+
+
 # Modèle pour les soeries
-class OperationSortir(models.Model):
+class OperationSortir(MouvementCaisseMixin, models.Model):
     
     description = models.CharField(max_length=255)  # Nom de l'opération
     montant = models.DecimalField(max_digits=10, decimal_places=0, default=0)  # Montant
@@ -153,20 +543,274 @@ class OperationSortir(models.Model):
     categorie = models.ForeignKey(Categorie, on_delete=models.PROTECT, null=False)  # Clé étrangère vers Categorie
     beneficiaire = models.ForeignKey(Beneficiaire, on_delete=models.PROTECT, null=False) #clé étrangère vers Personnel
     fournisseur = models.ForeignKey(Fournisseur, on_delete=models.PROTECT, null=False) #clé étrangère vers Fournisseur
-    history = HistoricalRecords() # Stocker l'historique par Django simple history
+    caisse = models.ForeignKey('Caisse', on_delete=models.PROTECT, related_name='sorties')  # Caisse physique de l'opération
+    paie = models.OneToOneField('personnel.Paie', on_delete=models.SET_NULL, null=True, blank=True, related_name='operation_sortie')  # Fiche de paie comptabilisée
+    recurrence = models.ForeignKey('OperationRecurrente', on_delete=models.SET_NULL, null=True, blank=True, related_name='sorties')  # Modèle récurrent d'origine
+    justificatifs = models.ManyToManyField('Justificatif', blank=True, related_name='sorties')  # Reçus et factures scannés
+    echeance = models.DateField(null=True, blank=True, editable=False)  # Échéance du modèle récurrent qui a généré l'opération
+    tags = models.ManyToManyField(Tag, blank=True, related_name='sorties')  # Étiquettes (table de liaison indexée par tag)
+    empreinte = models.CharField(max_length=40, db_index=True, editable=False, default='')  # Détection des doublons de saisie
+    hash_precedent = models.CharField(max_length=64, editable=False, default='')  # Maillon de l'opération précédente
+    hash_chaine = models.CharField(max_length=64, editable=False, default='')  # HMAC(maillon précédent, contenu)
+    history = HistoriqueSuspendable(excluded_fields=['hash_precedent', 'hash_chaine']) # Stocker l'historique par Django simple history
+
+    # Champs entrant dans le calcul de l'empreinte
+    CHAMPS_EMPREINTE = ('date_de_sortie', 'montant', 'fournisseur', 'description')
+    # Champs scellés par la chaîne d'intégrité (la clé primaire en premier)
+    CHAMPS_CHAINE = (
+        'id', 'date', 'date_de_sortie', 'montant', 'quantite', 'description',
+        'categorie_id', 'beneficiaire_id', 'fournisseur_id', 'caisse_id',
+    )
+    CLE_CHAINE = 'sortie'
+    SENS_SOLDE = -1
+
+    class Meta:
+        indexes = [models.Index(fields=['caisse', 'date_de_sortie'], name='sortie_caisse_date_idx')]
+        constraints = [
+            # Une échéance récurrente n'est générée qu'une fois
+            models.UniqueConstraint(fields=['recurrence', 'echeance'], name='sortie_recurrence_echeance_unique'),
+        ]
 
     # Affichage des données stockées 
     def __str__(self):
         return f"{self.description} - {self.montant} - {self.beneficiaire} - {self.categorie} - {self.fournisseur}"
 
+    def calculer_empreinte(self):
+        return empreinte_operation(self.date_de_sortie, self.montant, self.description, self.fournisseur_id)
+
+    def delete(self, *args, **kwargs):
+        # Les justificatifs que seule cette sortie utilisait sont supprimés avec elle
+        with transaction.atomic():
+            justificatifs = list(self.justificatifs.values_list('pk', flat=True))
+            resultat = super().delete(*args, **kwargs)
+            Justificatif.liberer(justificatifs)
+        return resultat
+
+
+# Justificatif (reçu, facture) stocké une seule fois par contenu
+class Justificatif(models.Model):
+    empreinte = models.CharField(max_length=64, unique=True, editable=False)  # SHA-256 du contenu, nom du fichier
+    fichier = models.FileField(max_length=255)  # Chemin fixé par caisse.justificatifs.enregistrer_justificatif
+    miniature = models.ImageField(max_length=255, blank=True)  # Générée en arrière-plan (images uniquement)
+    nom = models.CharField(max_length=255)  # Nom du fichier lors du premier envoi
+    type_mime = models.CharField(max_length=100)
+    taille = models.PositiveIntegerField()  # En octets
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.nom
+
+    @property
+    def est_image(self):
+        return self.type_mime.startswith('image/')
+
+    @classmethod
+    def liberer(cls, pks):
+        """
+        Supprime les justificatifs `pks` qui ne sont plus joints à aucune sortie (justificatif
+        retiré ou sortie supprimée) ; leurs fichiers sont effacés après validation (signals.py).
+        """
+        for justificatif in cls.objects.filter(pk__in=pks, sorties__isnull=True):
+            justificatif.delete()
+
+# Modèle d'opération récurrente (loyer, abonnement, indemnité fixe...)
+class OperationRecurrente(models.Model):
+    TYPE_CHOICES = Categorie.TYPE_CHOICES
+    FREQUENCE_CHOICES = [
+        ('hebdomadaire', 'Hebdomadaire'),
+        ('mensuelle', 'Mensuelle'),
+        ('trimestrielle', 'Trimestrielle'),
+        ('semestrielle', 'Semestrielle'),
+        ('annuelle', 'Annuelle'),
+    ]
+    # Pas de chaque fréquence, en mois (hebdomadaire : en semaines)
+    MOIS_PAR_FREQUENCE = {'mensuelle': 1, 'trimestrielle': 3, 'semestrielle': 6, 'annuelle': 12}
+
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    description = models.CharField(max_length=255)
+    montant = models.DecimalField(max_digits=10, decimal_places=0)
+    quantite = models.DecimalField(max_digits=10, decimal_places=0, default=1)  # Sorties uniquement
+    categorie = models.ForeignKey(Categorie, on_delete=models.PROTECT)
+    fournisseur = models.ForeignKey(Fournisseur, on_delete=models.PROTECT, null=True, blank=True)  # Obligatoire pour une sortie
+    beneficiaire = models.ForeignKey(Beneficiaire, on_delete=models.PROTECT, null=True, blank=True)  # Obligatoire pour une sortie
+    caisse = models.ForeignKey('Caisse', on_delete=models.PROTECT, null=True, blank=True)  # Vide = caisse principale
+    frequence = models.CharField(max_length=15, choices=FREQUENCE_CHOICES, default='mensuelle')
+    date_debut = models.DateField(default=timezone.localdate)  # Première échéance
+    date_fin = models.DateField(null=True, blank=True)  # Dernière échéance possible (vide = sans fin)
+    derniere_echeance = models.DateField(null=True, blank=True, editable=False)  # Dernière échéance générée
+    active = models.BooleanField(default=True)
+    history = HistoricalRecords()
+
+    class Meta:
+        indexes = [models.Index(fields=['active', 'derniere_echeance'], name='recurrente_active_idx')]
+
+    def __str__(self):
+        return f"{self.description} ({self.get_frequence_display()}) - {self.montant}"
+
+    def clean(self):
+        if self.categorie_id and self.categorie.type != self.type:
+            raise ValidationError("La catégorie doit être du même type que l'opération.")
+        if self.type == 'sortie' and not (self.fournisseur_id and self.beneficiaire_id):
+            raise ValidationError("Une sortie récurrente doit avoir un fournisseur et un bénéficiaire.")
+        if self.date_fin and self.date_fin < self.date_debut:
+            raise ValidationError("La date de fin doit suivre la date de début.")
+
+    def echeance(self, rang):
+        """Date de la `rang`-ième échéance (0 = date de début)."""
+        if self.frequence == 'hebdomadaire':
+            return self.date_debut + timedelta(weeks=rang)
+        return ajouter_mois(self.date_debut, rang * self.MOIS_PAR_FREQUENCE[self.frequence])
+
+    def echeances_dues(self, jusqu_au):
+        """Échéances postérieures à la dernière générée, jusqu'à `jusqu_au` (et à la date de fin)."""
+        limite = min(jusqu_au, self.date_fin) if self.date_fin else jusqu_au
+        rang = self.rang_suivant()
+        echeance = self.echeance(rang)
+        while echeance <= limite:
+            yield echeance
+            rang += 1
+            echeance = self.echeance(rang)
+
+    def rang_suivant(self):
+        """Rang de la première échéance postérieure à la dernière générée (0 si aucune)."""
+        if self.derniere_echeance is None:
+            return 0
+        ecart = self.derniere_echeance - self.date_debut
+        if self.frequence == 'hebdomadaire':
+            rang = ecart.days // 7
+        else:
+            mois = (self.derniere_echeance.year - self.date_debut.year) * 12 + self.derniere_echeance.month - self.date_debut.month
+            rang = mois // self.MOIS_PAR_FREQUENCE[self.frequence]
+        # Estimation à une échéance près (fins de mois raccourcies) : ajuste sur les dates réelles
+        rang = max(rang - 1, 0)
+        while self.echeance(rang) <= self.derniere_echeance:
+            rang += 1
+        return rang
+
+    def construire(self, echeance):
+        """Opération (non enregistrée) de l'échéance donnée."""
+        commun = {
+            'description': self.description,
+            'montant': self.montant,
+            'categorie_id': self.categorie_id,
+            'caisse_id': self.caisse_id,
+            'recurrence': self,
+            'echeance': echeance,
+        }
+        if self.type == 'entree':
+            return OperationEntrer(date_transaction=echeance, **commun)
+        return OperationSortir(
+            date_de_sortie=echeance, quantite=self.quantite, fournisseur_id=self.fournisseur_id,
+            beneficiaire_id=self.beneficiaire_id, **commun
+        )
+
 # Modèle Caisse
 class Caisse(models.Model):
-    montant = models.DecimalField(max_digits=10, decimal_places=2)  # Montant en décimal pour plus de précision
+    nom = models.CharField(max_length=100, default='Caisse principale')  # Caisse physique (boîte, guichet...)
+    montant = models.DecimalField(max_digits=18, decimal_places=2)  # Solde courant, tenu à jour à chaque opération (cumul de montants à 10 chiffres)
     date_creation = models.DateField(auto_now_add=True)  # Date de création automatique
     history = HistoricalRecords()
 
     def __str__(self):
-        return f"Caisse {self.id} - Montant: {self.montant}"
+        return self.nom
+
+    def calculer_solde(self):
+        """Solde recalculé à partir des opérations et transferts de la caisse (contrôle)."""
+        def total(operations):
+            return operations.aggregate(total=models.Sum('montant'))['total'] or Decimal('0')
+        return (
+            total(self.entrees.all()) - total(self.sorties.all())
+            + total(self.transferts_recus.all()) - total(self.transferts_emis.all())
+        )
+
+    @classmethod
+    def principale(cls):
+        """Caisse principale (la plus ancienne), lue sans verrou."""
+        caisse = cls.objects.order_by('pk').first()
+        if caisse is None:
+            with transaction.atomic():
+                caisse = cls.verrouiller()
+        return caisse
+
+    @classmethod
+    def verrouiller(cls, pk=None):
+        """
+        Caisse `pk` (par défaut la principale), ligne verrouillée (select_for_update) jusqu'à la fin
+        de la transaction courante : les opérations concurrentes passent l'une après l'autre.
+        """
+        caisses = cls.objects.select_for_update()
+        if pk is not None:
+            return caisses.get(pk=pk)
+        caisse = caisses.order_by('pk').first()
+        if caisse is None:
+            caisse = cls.objects.create(montant=0)
+        return caisse
+
+    @classmethod
+    def verrouiller_plusieurs(cls, pks):
+        """Verrouille plusieurs caisses, toujours dans l'ordre des clés (pas d'interblocage)."""
+        return {caisse.pk: caisse for caisse in cls.objects.select_for_update().filter(pk__in=pks).order_by('pk')}
+
+    def mouvementer(self, variation):
+        """Applique une variation au solde d'une caisse verrouillée par `verrouiller()`."""
+        if not variation:
+            return
+        nouveau_solde = self.montant + variation
+        if variation < 0 and nouveau_solde < 0 and not getattr(settings, 'CAISSE_DECOUVERT_AUTORISE', True):
+            raise SoldeInsuffisant(
+                f"Solde insuffisant dans « {self.nom} » : {self.montant:,.0f} Ar disponibles pour une sortie de {-variation:,.0f} Ar.".replace(',', ' ')
+            )
+        type(self).objects.filter(pk=self.pk).update(montant=nouveau_solde)
+        self.montant = nouveau_solde
+
+    @classmethod
+    def appliquer(cls, variation, pk=None):
+        """Applique une variation au solde dans sa propre transaction (ou celle en cours)."""
+        if not variation:
+            return
+        with transaction.atomic():
+            cls.verrouiller(pk).mouvementer(variation)
+
+# Transfert de fonds entre deux caisses
+class TransfertCaisse(models.Model):
+    caisse_source = models.ForeignKey(Caisse, on_delete=models.PROTECT, related_name='transferts_emis')
+    caisse_destination = models.ForeignKey(Caisse, on_delete=models.PROTECT, related_name='transferts_recus')
+    montant = models.DecimalField(max_digits=10, decimal_places=0)
+    date = models.DateField(default=timezone.now)
+    description = models.CharField(max_length=255, blank=True)
+    utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    history = HistoricalRecords()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['caisse_source', 'date'], name='transfert_source_date_idx'),
+            models.Index(fields=['caisse_destination', 'date'], name='transfert_dest_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.caisse_source} → {self.caisse_destination} : {self.montant}"
+
+    def clean(self):
+        if self.caisse_source_id == self.caisse_destination_id:
+            raise ValidationError("La caisse source et la caisse destination doivent être différentes.")
+        if not self.montant or self.montant <= 0:
+            raise ValidationError("Le montant du transfert doit être positif.")
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValidationError("Un transfert enregistré ne peut pas être modifié : supprimez-le puis refaites-le.")
+        with transaction.atomic():
+            caisses = Caisse.verrouiller_plusieurs({self.caisse_source_id, self.caisse_destination_id})
+            caisses[self.caisse_source_id].mouvementer(-Decimal(self.montant))
+            caisses[self.caisse_destination_id].mouvementer(Decimal(self.montant))
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            caisses = Caisse.verrouiller_plusieurs({self.caisse_source_id, self.caisse_destination_id})
+            caisses[self.caisse_destination_id].mouvementer(-self.montant)
+            caisses[self.caisse_source_id].mouvementer(self.montant)
+            return super().delete(*args, **kwargs)
     
 class UserActivity(models.Model):
     ACTION_CHOICES = [
@@ -181,4 +825,41 @@ class UserActivity(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
-    description = models.TextField(null=True, blank=True)
\ No newline at end of file
+    description = models.TextField(null=True, blank=True)
+
+# Rapprochement bancaire : relevé importé (banque ou mobile money)
+class ReleveBancaire(models.Model):
+    nom = models.CharField(max_length=100)  # Nom du compte ou du fichier importé
+    date_import = models.DateTimeField(auto_now_add=True)
+    importe_par = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    tolerance_jours = models.PositiveSmallIntegerField(default=3)  # Écart de date toléré pour un rapprochement
+
+    class Meta:
+        ordering = ['-date_import']
+
+    def __str__(self):
+        return f"{self.nom} ({self.date_import:%d/%m/%Y})"
+
+# Ligne d'un relevé : montant signé (positif = crédit/entrée, négatif = débit/sortie)
+class LigneReleve(models.Model):
+    releve = models.ForeignKey(ReleveBancaire, on_delete=models.CASCADE, related_name='lignes')
+    date = models.DateField()
+    libelle = models.CharField(max_length=255, blank=True)
+    montant = models.DecimalField(max_digits=12, decimal_places=2)
+    entree = models.ForeignKey(OperationEntrer, on_delete=models.SET_NULL, null=True, blank=True, related_name='lignes_releve')
+    sortie = models.ForeignKey(OperationSortir, on_delete=models.SET_NULL, null=True, blank=True, related_name='lignes_releve')
+
+    class Meta:
+        ordering = ['date', 'pk']
+        indexes = [models.Index(fields=['releve', 'date'], name='ligne_releve_date_idx')]
+
+    def __str__(self):
+        return f"{self.date} - {self.libelle} - {self.montant}"
+
+    @property
+    def operation(self):
+        return self.entree or self.sortie
+
+    @property
+    def est_rapprochee(self):
+        return self.entree_id is not None or self.sortie_id is not None
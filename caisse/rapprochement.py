@@ -0,0 +1,237 @@
+import bisect
+import csv
+import io
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from operator import attrgetter
+from zipfile import BadZipFile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+from django.db import transaction
+from django.db.models import Max, Min
+
+from GPP.normalisation import normaliser_texte
+
+from .models import LigneReleve, OperationEntrer, OperationSortir, ReleveBancaire
+
+FORMATS_DATE = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%d.%m.%Y', '%Y/%m/%d')
+
+# En-têtes reconnus (normalisés : minuscules, sans accents)
+COLONNES = {
+    'date': ('date', 'date operation', 'date de l operation', 'date valeur', 'date de valeur', 'date transaction'),
+    'libelle': ('libelle', 'description', 'designation', 'motif', 'details', 'reference', 'operation'),
+    'montant': ('montant', 'amount', 'montant ar'),
+    'debit': ('debit', 'retrait', 'sortie', 'montant debit'),
+    'credit': ('credit', 'depot', 'entree', 'montant credit'),
+}
+
+# Côté de chaque rapprochement : modèle, champ date, sens du montant, champ de la ligne
+COTES = (
+    (OperationEntrer, 'date_transaction', 1, 'entree'),
+    (OperationSortir, 'date_de_sortie', -1, 'sortie'),
+)
+
+
+def convertir_date(valeur):
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = str(valeur or '').strip()
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(texte[:10], format_date).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Date illisible : {texte!r}")
+
+
+def convertir_montant(valeur):
+    """
+    Convertit un montant de relevé en Decimal ("1 234,50", "-1,234.50", "(500)", 1500.0...).
+    """
+    if valeur in (None, ''):
+        return Decimal('0')
+    if isinstance(valeur, (int, float, Decimal)):
+        return Decimal(str(valeur))
+    texte = str(valeur).replace('\xa0', '').replace(' ', '').replace('Ar', '').replace('MGA', '').strip()
+    negatif = texte.startswith('(') and texte.endswith(')')
+    texte = texte.strip('()')
+    if ',' in texte and '.' in texte:
+        # Le dernier séparateur est le séparateur décimal
+        if texte.rfind(',') > texte.rfind('.'):
+            texte = texte.replace('.', '').replace(',', '.')
+        else:
+            texte = texte.replace(',', '')
+    else:
+        texte = texte.replace(',', '.')
+    try:
+        montant = Decimal(texte)
+    except InvalidOperation:
+        raise ValueError(f"Montant illisible : {valeur!r}")
+    return -montant if negatif else montant
+
+
+def lire_tableaux(fichier):
+    """
+    Retourne les lignes brutes (tuples) d'un fichier XLSX, ou d'un CSV lu avec chaque
+    séparateur courant : le bon séparateur est celui qui fait apparaître l'en-tête.
+    """
+    if fichier.name.lower().endswith(('.xlsx', '.xlsm')):
+        try:
+            classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+        except (BadZipFile, InvalidFileException, KeyError):
+            # Fichier renommé ou corrompu : signalé comme un relevé illisible
+            raise ValueError("Classeur Excel illisible.")
+        return [list(classeur.active.iter_rows(values_only=True))]
+
+    contenu = fichier.read()
+    try:
+        texte = contenu.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texte = contenu.decode('latin-1')
+    return [list(csv.reader(io.StringIO(texte), delimiter=separateur)) for separateur in (';', '\t', ',')]
+
+
+def reperer_colonnes(ligne):
+    """
+    Associe les colonnes reconnues à leur position dans une ligne d'en-tête.
+    """
+    positions = {}
+    for position, entete in enumerate(ligne):
+        entete = normaliser_texte(str(entete or ''))
+        for colonne, noms in COLONNES.items():
+            if colonne not in positions and entete in noms:
+                positions[colonne] = position
+    if 'date' in positions and ('montant' in positions or 'debit' in positions or 'credit' in positions):
+        return positions
+    return None
+
+
+def lire_releve(fichier):
+    """
+    Lit un relevé CSV/XLSX et retourne une liste de dict (date, libelle, montant signé).
+    L'en-tête est cherché parmi les premières lignes du fichier.
+    """
+    for lignes in lire_tableaux(fichier):
+        entete = next(
+            ((numero, colonnes) for numero, colonnes in enumerate(map(reperer_colonnes, lignes[:15])) if colonnes),
+            None
+        )
+        if entete:
+            break
+    else:
+        raise ValueError("En-tête introuvable : une colonne Date et une colonne Montant (ou Débit/Crédit) sont requises.")
+    numero, colonnes = entete
+
+    def cellule(ligne, colonne):
+        position = colonnes.get(colonne)
+        return ligne[position] if position is not None and position < len(ligne) else None
+
+    resultat = []
+    for numero_ligne, ligne in enumerate(lignes[numero + 1:], start=numero + 2):
+        if not ligne or cellule(ligne, 'date') in (None, ''):
+            continue
+        try:
+            if 'montant' in colonnes:
+                montant = convertir_montant(cellule(ligne, 'montant'))
+            else:
+                montant = convertir_montant(cellule(ligne, 'credit')) - abs(convertir_montant(cellule(ligne, 'debit')))
+            resultat.append({
+                'date': convertir_date(cellule(ligne, 'date')),
+                'libelle': str(cellule(ligne, 'libelle') or '')[:255],
+                'montant': montant,
+            })
+        except ValueError as e:
+            raise ValueError(f"Ligne {numero_ligne} : {e}")
+    return resultat
+
+
+def cle_montant(montant):
+    # Les opérations de caisse sont en Ariary entiers
+    return abs(montant).quantize(Decimal('1'))
+
+
+def rapprocher(releve):
+    """
+    Rapproche les lignes non rapprochées d'un relevé avec les opérations de même montant
+    et de date la plus proche (dans la tolérance du relevé).
+
+    Les opérations candidates sont chargées en une requête par type, indexées par montant
+    dans un dictionnaire de listes triées par date ; chaque ligne est placée par dichotomie,
+    soit O(n log n) au lieu d'une comparaison de toutes les paires.
+    """
+    lignes = list(releve.lignes.filter(entree__isnull=True, sortie__isnull=True))
+    if not lignes:
+        return 0
+    tolerance = timedelta(days=releve.tolerance_jours)
+    debut = min(ligne.date for ligne in lignes) - tolerance
+    fin = max(ligne.date for ligne in lignes) + tolerance
+
+    rapprochees = []
+    for modele, champ_date, sens, champ_ligne in COTES:
+        a_rapprocher = [ligne for ligne in lignes if ligne.montant * sens > 0]
+        if not a_rapprocher:
+            continue
+
+        index = defaultdict(list)
+        candidats = modele.objects.filter(
+            montant__in={cle_montant(ligne.montant) for ligne in a_rapprocher},
+            lignes_releve__isnull=True,
+            **{f'{champ_date}__range': (debut, fin)}
+        ).order_by(champ_date, 'pk').values_list(champ_date, 'pk', 'montant')
+        for date_operation, pk, montant in candidats:
+            index[montant].append((date_operation, pk))
+
+        for ligne in sorted(a_rapprocher, key=attrgetter('date')):
+            operations = index.get(cle_montant(ligne.montant))
+            if not operations:
+                continue
+            position = bisect.bisect_left(operations, (ligne.date, 0))
+            meilleure = None
+            for i in (position - 1, position):
+                if 0 <= i < len(operations):
+                    ecart = abs(operations[i][0] - ligne.date)
+                    if ecart <= tolerance and (meilleure is None or ecart < meilleure[0]):
+                        meilleure = (ecart, i)
+            if meilleure:
+                _, pk = operations.pop(meilleure[1])
+                setattr(ligne, f'{champ_ligne}_id', pk)
+                rapprochees.append(ligne)
+
+    LigneReleve.objects.bulk_update(rapprochees, ['entree', 'sortie'], batch_size=500)
+    return len(rapprochees)
+
+
+def importer_releve(fichier, nom='', utilisateur=None, tolerance_jours=3):
+    """
+    Enregistre un relevé et ses lignes puis lance le rapprochement automatique.
+    """
+    lignes = lire_releve(fichier)
+    with transaction.atomic():
+        releve = ReleveBancaire.objects.create(
+            nom=nom or fichier.name, importe_par=utilisateur, tolerance_jours=tolerance_jours
+        )
+        LigneReleve.objects.bulk_create(
+            [LigneReleve(releve=releve, **ligne) for ligne in lignes], batch_size=500
+        )
+        rapprocher(releve)
+    return releve
+
+
+def operations_non_rapprochees(releve):
+    """
+    Opérations de la période du relevé qui ne figurent sur aucun relevé.
+    """
+    periode = releve.lignes.aggregate(debut=Min('date'), fin=Max('date'))
+    if periode['debut'] is None:
+        return OperationEntrer.objects.none(), OperationSortir.objects.none()
+    entrees = OperationEntrer.objects.filter(
+        date_transaction__range=(periode['debut'], periode['fin']), lignes_releve__isnull=True
+    ).select_related('categorie').order_by('date_transaction')
+    sorties = OperationSortir.objects.filter(
+        date_de_sortie__range=(periode['debut'], periode['fin']), lignes_releve__isnull=True
+    ).select_related('categorie', 'fournisseur').order_by('date_de_sortie')
+    return entrees, sorties
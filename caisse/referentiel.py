@@ -0,0 +1,54 @@
+import threading
+
+from django.core.cache import cache
+
+from . import versions
+from .models import Beneficiaire, Categorie, Fournisseur, Personnel
+
+# Version partagée par tous les workers (voir versions.py) : elle change à chaque écriture
+DOMAINE = 'referentiel'
+CLE_DONNEES = 'caisse:referentiel:{version}'
+
+# Copie locale au worker, réutilisée tant que la version partagée n'a pas changé
+_local = {'version': None, 'donnees': None}
+_verrou = threading.Lock()
+
+
+def version_actuelle():
+    return versions.version(DOMAINE)
+
+
+def invalider():
+    """Change la version après la validation de la transaction en cours (voir versions.invalider)."""
+    versions.invalider(DOMAINE)
+
+
+def charger():
+    categories = list(Categorie.objects.all())
+    return {
+        'categories': categories,
+        'categories_entree': [categorie for categorie in categories if categorie.type == 'entree'],
+        'categories_sortie': [categorie for categorie in categories if categorie.type == 'sortie'],
+        'fournisseurs': list(Fournisseur.objects.all()),
+        'beneficiaires': list(Beneficiaire.objects.all()),
+        'personnels': list(Personnel.objects.all()),
+    }
+
+
+def referentiel():
+    """
+    Catégories, fournisseurs, bénéficiaires et personnels des listes déroulantes.
+    Aucune requête SQL tant que la version partagée n'a pas changé : copie du worker,
+    sinon copie partagée de cette version, sinon lecture de la base (une fois par version).
+    """
+    version = version_actuelle()
+    if _local['version'] == version:
+        return _local['donnees']
+    with _verrou:
+        if _local['version'] != version:
+            donnees = cache.get(CLE_DONNEES.format(version=version))
+            if donnees is None:
+                donnees = charger()
+                cache.set(CLE_DONNEES.format(version=version), donnees, timeout=24 * 3600)
+            _local.update(version=version, donnees=donnees)
+        return _local['donnees']
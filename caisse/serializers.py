@@ -1,9 +1,123 @@
+from functools import wraps
+
 from rest_framework import serializers
 from .models import Categorie, OperationEntrer, OperationSortir, Personnel, Fournisseur, Beneficiaire
-from django.db.models import Sum, Count
+from .services import annoter_totaux_operations
+from django.db.models import Prefetch, Sum, Count
+from django.utils import timezone
+
+
+def total_annote(methode):
+    """
+    Pour les champs total_*/nombre_* : reprend l'annotation de même nom posée par
+    annoter_totaux_operations (listes de l'API), sinon la calcule pour l'objet seul.
+    """
+    champ = methode.__name__[len('get_'):]
+
+    @wraps(methode)
+    def lire(self, obj):
+        if hasattr(obj, champ):
+            return getattr(obj, champ)
+        return methode(self, obj)
+    return lire
+
+
+# Totaux calculés (SerializerMethodField), omis par ?fields= ou un ?expand= qui ne cite pas « totaux »
+TOTAUX = ('total_entrees', 'total_sorties', 'nombre_entrees', 'nombre_sorties')
+
+
+class ChampsDynamiquesMixin:
+    """
+    Représentation complète par défaut, réduite d'après la requête du contexte :
+    - `?fields=id,montant,categorie.name` ne garde que les champs cités (notation pointée
+      pour les champs d'un sérialiseur imbriqué) ;
+    - `?expand=totaux,categorie.totaux` ne garde, parmi les groupes coûteux de CHAMPS_EXTENSIBLES,
+      que ceux cités (`?expand=` vide les omet tous ; un champ d'un groupe cité dans `fields` est rendu).
+    Les vues lisent ensuite `serializer.fields` pour ne joindre et n'annoter que le nécessaire.
+    """
+    CHAMPS_EXTENSIBLES = {}
+
+    def get_fields(self):
+        champs = super().get_fields()
+        demandes, etendus = self.parametres_champs()
+        if etendus is None:
+            # Sans ?expand= : tous les groupes, sauf ceux que ?fields= écarte
+            etendus = set(self.CHAMPS_EXTENSIBLES) if demandes is None else set()
+        garder = set(champs) if demandes is None else set(champs) & demandes
+        for groupe, noms in self.CHAMPS_EXTENSIBLES.items():
+            if groupe in etendus or (demandes is not None and groupe in demandes):
+                garder |= set(noms) & set(champs)
+            else:
+                garder -= set(noms) - (demandes or set())
+        return {nom: champ for nom, champ in champs.items() if nom in garder}
+
+    def chemin(self):
+        """Chemin pointé du sérialiseur depuis la racine ('' pour la racine)."""
+        noms = []
+        noeud = self
+        while noeud.parent is not None:
+            if noeud.field_name:
+                noms.append(noeud.field_name)
+            noeud = noeud.parent
+        return '.'.join(reversed(noms))
+
+    def parametres_champs(self):
+        request = self.context.get('request')
+        if request is None:
+            return None, None
+        parametres = getattr(request, 'query_params', request.GET)
+        prefixe = f'{self.chemin()}.' if self.chemin() else ''
+
+        def selection(nom):
+            valeurs = [valeur.strip() for valeur in parametres.get(nom, '').split(',')]
+            return {
+                valeur[len(prefixe):].split('.')[0]
+                for valeur in valeurs if valeur.startswith(prefixe) and len(valeur) > len(prefixe)
+            }
+
+        return selection('fields') or None, selection('expand') if 'expand' in parametres else None
+
+
+def demande_totaux(champs):
+    return bool(set(TOTAUX) & set(champs))
+
+
+def categories_avec_totaux(queryset=None):
+    """Catégories annotées des totaux lus par CategorieSerializer."""
+    queryset = Categorie.objects.all() if queryset is None else queryset
+    return annoter_totaux_operations(queryset, entrees='categorie', sorties='categorie')
+
+
+def joindre_categorie(queryset, champ):
+    """
+    Catégorie des opérations d'après le sérialiseur imbriqué `champ` : rien si elle n'est pas
+    demandée, jointure simple sans totaux, sinon une requête de catégories annotées pour toute la liste.
+    """
+    if champ is None:
+        return queryset
+    if demande_totaux(champ.fields):
+        return queryset.prefetch_related(Prefetch('categorie', queryset=categories_avec_totaux()))
+    return queryset.select_related('categorie')
+
+
+def entrees_jointes(queryset, champs=None):
+    """Entrées avec les relations rendues par `champs` (OperationEntrerSerializer par défaut)."""
+    champs = OperationEntrerSerializer().fields if champs is None else champs
+    return joindre_categorie(queryset, champs.get('categorie'))
+
+
+def sorties_jointes(queryset, champs=None):
+    """Sorties avec les relations rendues par `champs` (OperationSortirSerializer par défaut)."""
+    champs = OperationSortirSerializer().fields if champs is None else champs
+    relations = [nom for nom in ('beneficiaire', 'fournisseur') if nom in champs]
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return joindre_categorie(queryset, champs.get('categorie'))
+
 
 # Sérialiseur pour le modèle Categorie
-class CategorieSerializer(serializers.ModelSerializer):
+class CategorieSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX}
     total_entrees = serializers.SerializerMethodField()
     total_sorties = serializers.SerializerMethodField()
     nombre_entrees = serializers.SerializerMethodField()
@@ -13,20 +127,25 @@ class CategorieSerializer(serializers.ModelSerializer):
         model = Categorie
         fields = ['id', 'name', 'description', 'type', 'total_entrees', 'total_sorties', 'nombre_entrees', 'nombre_sorties']
 
+    @total_annote
     def get_total_entrees(self, obj):
         return OperationEntrer.objects.filter(categorie=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(categorie=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_entrees(self, obj):
         return OperationEntrer.objects.filter(categorie=obj).count()
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(categorie=obj).count()
 
 # Sérialiseur pour les détails d'une catégorie (avec les transactions associées)
-class CategorieDetailSerializer(serializers.ModelSerializer):
+class CategorieDetailSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX, 'entrees': ('entrees',), 'sorties': ('sorties',)}
     total_entrees = serializers.SerializerMethodField()
     total_sorties = serializers.SerializerMethodField()
     nombre_entrees = serializers.SerializerMethodField()
@@ -38,49 +157,53 @@ class CategorieDetailSerializer(serializers.ModelSerializer):
         model = Categorie
         fields = ['id', 'name', 'description', 'type', 'total_entrees', 'total_sorties', 'nombre_entrees', 'nombre_sorties', 'entrees', 'sorties']
 
+    @total_annote
     def get_total_entrees(self, obj):
         return OperationEntrer.objects.filter(categorie=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(categorie=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_entrees(self, obj):
         return OperationEntrer.objects.filter(categorie=obj).count()
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(categorie=obj).count()
 
     def get_entrees(self, obj):
-        entrees = OperationEntrer.objects.filter(categorie=obj)
+        entrees = entrees_jointes(OperationEntrer.objects.filter(categorie=obj))
         return OperationEntrerSerializer(entrees, many=True).data
 
     def get_sorties(self, obj):
-        sorties = OperationSortir.objects.filter(categorie=obj)
+        sorties = sorties_jointes(OperationSortir.objects.filter(categorie=obj))
         return OperationSortirSerializer(sorties, many=True).data
 
 # Sérialiseur pour le modèle OperationEntrer
-class OperationEntrerSerializer(serializers.ModelSerializer):
+class OperationEntrerSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     categorie = CategorieSerializer(read_only=True)
 
     class Meta:
         model = OperationEntrer
-        fields = ['id', 'description', 'montant', 'date', 'date_transaction', 'categorie']
+        fields = ['id', 'description', 'montant', 'date', 'date_transaction', 'categorie', 'caisse']
 
 # Sérialiseur pour le modèle OperationSortir
-class OperationSortirSerializer(serializers.ModelSerializer):
+class OperationSortirSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     categorie = CategorieSerializer(read_only=True)
     beneficiaire = serializers.SerializerMethodField()
     fournisseur = serializers.SerializerMethodField()
 
     class Meta:
         model = OperationSortir
-        fields = ['id', 'description', 'montant', 'date', 'date_de_sortie', 'quantite', 'categorie', 'beneficiaire', 'fournisseur']
+        fields = ['id', 'description', 'montant', 'date', 'date_de_sortie', 'quantite', 'categorie', 'beneficiaire', 'fournisseur', 'caisse']
 
     def get_beneficiaire(self, obj):
-        if obj.beneficiaire.personnel:
+        if obj.beneficiaire.personnel_id:
             return {
-                "id": obj.beneficiaire.personnel.id,
-                "name": f"{obj.beneficiaire.personnel.last_name} {obj.beneficiaire.personnel.first_name}"
+                "id": obj.beneficiaire.personnel_id,
+                "name": obj.beneficiaire.nom_affiche
             }
         elif obj.beneficiaire.name:
             return {
@@ -96,7 +219,8 @@ class OperationSortirSerializer(serializers.ModelSerializer):
         }
 
 # Sérialiseur pour le modèle Personnel
-class PersonnelSerializer(serializers.ModelSerializer):
+class PersonnelSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
 
@@ -106,17 +230,20 @@ class PersonnelSerializer(serializers.ModelSerializer):
                  'sexe', 'date_naissance', 'photo', 'adresse', 'type_personnel', 
                  'total_sorties', 'nombre_sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         # Accéder aux opérations de sortie via le bénéficiaire lié au personnel
         beneficiaires = Beneficiaire.objects.filter(personnel=obj)
         return OperationSortir.objects.filter(beneficiaire__in=beneficiaires).aggregate(
             total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         beneficiaires = Beneficiaire.objects.filter(personnel=obj)
         return OperationSortir.objects.filter(beneficiaire__in=beneficiaires).count()
 
-class PersonnelDetailSerializer(serializers.ModelSerializer):
+class PersonnelDetailSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX, 'sorties': ('sorties',)}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
     sorties = serializers.SerializerMethodField()
@@ -127,22 +254,25 @@ class PersonnelDetailSerializer(serializers.ModelSerializer):
                  'sexe', 'date_naissance', 'photo', 'adresse', 'type_personnel',
                  'total_sorties', 'nombre_sorties', 'sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         beneficiaires = Beneficiaire.objects.filter(personnel=obj)
         return OperationSortir.objects.filter(beneficiaire__in=beneficiaires).aggregate(
             total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         beneficiaires = Beneficiaire.objects.filter(personnel=obj)
         return OperationSortir.objects.filter(beneficiaire__in=beneficiaires).count()
 
     def get_sorties(self, obj):
         beneficiaires = Beneficiaire.objects.filter(personnel=obj)
-        sorties = OperationSortir.objects.filter(beneficiaire__in=beneficiaires)
+        sorties = sorties_jointes(OperationSortir.objects.filter(beneficiaire__in=beneficiaires))
         return OperationSortirSerializer(sorties, many=True).data
 
 # Sérialiseur pour le modèle Fournisseur
-class FournisseurSerializer(serializers.ModelSerializer):
+class FournisseurSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
 
@@ -150,13 +280,16 @@ class FournisseurSerializer(serializers.ModelSerializer):
         model = Fournisseur
         fields = ['id', 'name', 'contact', 'total_sorties', 'nombre_sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(fournisseur=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(fournisseur=obj).count()
 
-class FournisseurDetailSerializer(serializers.ModelSerializer):
+class FournisseurDetailSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX, 'sorties': ('sorties',)}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
     sorties = serializers.SerializerMethodField()
@@ -165,19 +298,22 @@ class FournisseurDetailSerializer(serializers.ModelSerializer):
         model = Fournisseur
         fields = ['id', 'name', 'contact', 'total_sorties', 'nombre_sorties', 'sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(fournisseur=obj).aggregate(
             total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(fournisseur=obj).count()
 
     def get_sorties(self, obj):
-        sorties = OperationSortir.objects.filter(fournisseur=obj)
+        sorties = sorties_jointes(OperationSortir.objects.filter(fournisseur=obj))
         return OperationSortirSerializer(sorties, many=True).data
 
 # Sérialiseur pour le modèle Beneficiaire
-class BeneficiaireSerializer(serializers.ModelSerializer):
+class BeneficiaireSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
 
@@ -185,13 +321,16 @@ class BeneficiaireSerializer(serializers.ModelSerializer):
         model = Beneficiaire
         fields = ['id', 'name', 'total_sorties', 'nombre_sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(beneficiaire=obj).aggregate(total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(beneficiaire=obj).count()
 
-class BeneficiaireDetailSerializer(serializers.ModelSerializer):
+class BeneficiaireDetailSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    CHAMPS_EXTENSIBLES = {'totaux': TOTAUX, 'sorties': ('sorties',)}
     total_sorties = serializers.SerializerMethodField()
     nombre_sorties = serializers.SerializerMethodField()
     sorties = serializers.SerializerMethodField()
@@ -200,34 +339,75 @@ class BeneficiaireDetailSerializer(serializers.ModelSerializer):
         model = Beneficiaire
         fields = ['id', 'name', 'total_sorties', 'nombre_sorties', 'sorties']
 
+    @total_annote
     def get_total_sorties(self, obj):
         return OperationSortir.objects.filter(beneficiaire=obj).aggregate(
             total=Sum('montant'))['total'] or 0
 
+    @total_annote
     def get_nombre_sorties(self, obj):
         return OperationSortir.objects.filter(beneficiaire=obj).count()
 
     def get_sorties(self, obj):
-        sorties = OperationSortir.objects.filter(beneficiaire=obj)
+        sorties = sorties_jointes(OperationSortir.objects.filter(beneficiaire=obj))
         return OperationSortirSerializer(sorties, many=True).data
 
+class ReferencePrechargeeField(serializers.PrimaryKeyRelatedField):
+    """
+    Clé étrangère lue parmi les objets préchargés pour tout un lot (contexte `references`,
+    voir precharger_references) : une requête par modèle pour le lot au lieu d'une par ligne.
+    Hors lot, lecture habituelle en base.
+    """
+    def to_internal_value(self, data):
+        references = self.context.get('references', {}).get(self.field_name)
+        if references is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not str(data).isdigit():
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        objet = references.get(int(data))
+        if objet is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objet
+
+
+def precharger_references(serializer, lignes):
+    """
+    Objets référencés par les `lignes` d'un lot, pour chaque champ ReferencePrechargeeField
+    du serializer : {champ: {pk: objet}}, une requête (in_bulk) par champ.
+    """
+    references = {}
+    for nom, champ in serializer.fields.items():
+        if isinstance(champ, ReferencePrechargeeField):
+            pks = {ligne.get(nom) for ligne in lignes if isinstance(ligne, dict)}
+            references[nom] = champ.get_queryset().in_bulk(
+                {int(pk) for pk in pks if not isinstance(pk, bool) and str(pk).isdigit()}
+            )
+    return references
+
+
 # Modifier le sérialiseur OperationSortirSerializer
 class OperationSortirCreateSerializer(serializers.ModelSerializer):
+    serializer_related_field = ReferencePrechargeeField
+
     class Meta:
         model = OperationSortir
-        fields = ['description', 'montant', 'date_de_sortie', 'quantite', 'categorie', 'beneficiaire', 'fournisseur']
+        fields = ['description', 'montant', 'date_de_sortie', 'quantite', 'categorie', 'beneficiaire', 'fournisseur', 'caisse']
         extra_kwargs = {
             'categorie': {'write_only': True},
             'beneficiaire': {'write_only': True},
-            'fournisseur': {'write_only': True}
+            'fournisseur': {'write_only': True},
+            'caisse': {'required': False}  # Caisse principale par défaut
         }
 
     def validate(self, data):
-        # Vérifier que la catégorie est de type 'sortie'
-        if data['categorie'].type != 'sortie':
+        # Vérifier que la catégorie est de type 'sortie' (absente d'une modification partielle : inchangée)
+        if 'categorie' in data and data['categorie'].type != 'sortie':
             raise serializers.ValidationError(
                 {"categorie": "La catégorie doit être de type 'sortie'"}
             )
+        # Date du jour par défaut (le défaut du modèle, timezone.now, est un datetime que DateField refuse d'afficher)
+        if not self.partial:
+            data.setdefault('date_de_sortie', timezone.localdate())
         return data
 
     def to_representation(self, instance):
@@ -235,19 +415,24 @@ class OperationSortirCreateSerializer(serializers.ModelSerializer):
         return OperationSortirSerializer(instance).data
 
 class OperationEntrerCreateSerializer(serializers.ModelSerializer):
+    serializer_related_field = ReferencePrechargeeField
+
     class Meta:
         model = OperationEntrer
-        fields = ['description', 'montant', 'date_transaction', 'categorie']
+        fields = ['description', 'montant', 'date_transaction', 'categorie', 'caisse']
         extra_kwargs = {
-            'categorie': {'write_only': True}
+            'categorie': {'write_only': True},
+            'caisse': {'required': False}  # Caisse principale par défaut
         }
 
     def validate(self, data):
-        # Vérifier que la catégorie est de type 'entree'
-        if data['categorie'].type != 'entree':
+        # Vérifier que la catégorie est de type 'entree' (facultative, ou inchangée si absente)
+        if data.get('categorie') is not None and data['categorie'].type != 'entree':
             raise serializers.ValidationError(
                 {"categorie": "La catégorie doit être de type 'entree'"}
             )
+        if not self.partial:
+            data.setdefault('date_transaction', timezone.localdate())
         return data
 
     def to_representation(self, instance):
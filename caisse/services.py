@@ -0,0 +1,524 @@
+import operator
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from GPP.normalisation import normaliser_texte
+from personnel.models import Paie
+
+from . import referentiel, versions
+from .models import (
+    Beneficiaire, Caisse, Categorie, ChaineOperations, HistoriqueSuspendable, Justificatif, OperationEntrer, OperationRecurrente,
+    OperationSortir, Tag, TransfertCaisse,
+)
+
+
+def niveaux_categories():
+    """Retourne la liste des niveaux disponibles dans l'arborescence des catégories."""
+    niveau_max = Categorie.objects.order_by('-niveau').values_list('niveau', flat=True).first() or 0
+    return list(range(niveau_max + 1))
+
+
+def operations_sous_categories(operations, categorie):
+    """Filtre les opérations d'une catégorie et de toutes ses sous-catégories (une seule jointure)."""
+    return operations.filter(categorie__liens_ancetres__ancetre=categorie)
+
+
+def cumuler_par_niveau(operations, niveau, **aggregats):
+    """
+    Regroupe les opérations sur la catégorie ancêtre de niveau `niveau`.
+
+    Chaque opération est rattachée à exactement un lien de la table de fermeture :
+    celui de son ancêtre au niveau demandé, ou le lien vers elle-même si sa
+    catégorie est moins profonde. Les totaux sont donc calculés en une seule requête.
+    """
+    aggregats = aggregats or {'total': Sum('montant'), 'nombre': Count('id')}
+    return operations.filter(
+        Q(categorie__liens_ancetres__ancetre__niveau=niveau) |
+        Q(categorie__liens_ancetres__profondeur=0, categorie__niveau__lt=niveau)
+    ).values(
+        categorie_cumul=F('categorie__liens_ancetres__ancetre_id'),
+        categorie_nom=F('categorie__liens_ancetres__ancetre__name'),
+    ).annotate(**aggregats).order_by(f'-{next(iter(aggregats))}')
+
+
+def get_or_create_tags(noms):
+    """Retourne les étiquettes portant ces noms, en créant celles qui manquent (deux requêtes)."""
+    noms = {nom.strip() for nom in noms if nom.strip()}
+    Tag.objects.bulk_create([Tag(name=nom) for nom in noms], ignore_conflicts=True)
+    return list(Tag.objects.filter(name__in=noms))
+
+
+def etiqueter_operations(ids_entrees, ids_sorties, noms, retirer=False):
+    """
+    Ajoute (ou retire) des étiquettes sur un ensemble d'opérations.
+    Les liens sont écrits en masse dans les tables de liaison ; retourne le nombre d'opérations concernées.
+    """
+    nombre = 0
+    with transaction.atomic():
+        tags = get_or_create_tags(noms)
+        for modele, ids in ((OperationEntrer, ids_entrees), (OperationSortir, ids_sorties)):
+            if not ids:
+                continue
+            liaison = modele.tags.through
+            champ = modele._meta.model_name
+            ids = list(modele.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            nombre += len(ids)
+            if retirer:
+                liaison.objects.filter(**{f'{champ}_id__in': ids}, tag__in=tags).delete()
+            else:
+                liaison.objects.bulk_create([
+                    liaison(**{f'{champ}_id': pk}, tag=tag) for pk in ids for tag in tags
+                ], ignore_conflicts=True)
+        # Écritures en masse sans signaux : les réponses conditionnelles des opérations sont périmées
+        versions.invalider('operations')
+    return nombre
+
+
+def totaux_par_tag(date_debut=None, date_fin=None):
+    """
+    Totaux et nombres d'opérations par étiquette, en une seule requête.
+    Chaque total est une sous-requête groupée sur la table de liaison, lue par l'index du tag.
+    """
+    def sous_requete(modele, champ_date, aggregat):
+        champ = modele._meta.model_name
+        liens = modele.tags.through.objects.filter(tag_id=OuterRef('pk'))
+        if date_debut:
+            liens = liens.filter(**{f'{champ}__{champ_date}__gte': date_debut})
+        if date_fin:
+            liens = liens.filter(**{f'{champ}__{champ_date}__lte': date_fin})
+        if aggregat is Count:
+            valeur, type_sortie = Count(champ), IntegerField()
+        else:
+            valeur, type_sortie = Sum(f'{champ}__montant'), modele._meta.get_field('montant')
+        return Coalesce(Subquery(liens.values('tag_id').annotate(valeur=valeur).values('valeur')), 0, output_field=type_sortie)
+
+    return Tag.objects.annotate(
+        total_entrees=sous_requete(OperationEntrer, 'date_transaction', Sum),
+        nombre_entrees=sous_requete(OperationEntrer, 'date_transaction', Count),
+        total_sorties=sous_requete(OperationSortir, 'date_de_sortie', Sum),
+        nombre_sorties=sous_requete(OperationSortir, 'date_de_sortie', Count),
+    ).values('id', 'name', 'type', 'total_entrees', 'nombre_entrees', 'total_sorties', 'nombre_sorties').order_by('name')
+
+
+def annoter_totaux_operations(queryset, entrees=None, sorties=None):
+    """
+    Annote total_entrees/nombre_entrees (chemin `entrees` de OperationEntrer vers l'objet) et
+    total_sorties/nombre_sorties (chemin `sorties` de OperationSortir) en sous-requêtes groupées :
+    une liste de N objets et leurs totaux se lisent en une requête au lieu de 1 + 4N.
+    """
+    def sous_requete(modele, champ, aggregat):
+        operations = modele.objects.filter(**{champ: OuterRef('pk')}).order_by().values(champ)
+        if aggregat is Count:
+            valeur, type_sortie = Count('pk'), IntegerField()
+        else:
+            valeur, type_sortie = Sum('montant'), modele._meta.get_field('montant')
+        return Coalesce(Subquery(operations.annotate(valeur=valeur).values('valeur')), 0, output_field=type_sortie)
+
+    if entrees:
+        queryset = queryset.annotate(
+            total_entrees=sous_requete(OperationEntrer, entrees, Sum),
+            nombre_entrees=sous_requete(OperationEntrer, entrees, Count),
+        )
+    if sorties:
+        queryset = queryset.annotate(
+            total_sorties=sous_requete(OperationSortir, sorties, Sum),
+            nombre_sorties=sous_requete(OperationSortir, sorties, Count),
+        )
+    return queryset
+
+
+def historiser_en_masse(modele, objets, type_historique, utilisateur=None, raison=''):
+    """
+    Écrit en un seul INSERT les lignes d'historique ('+', '~' ou '-') des objets donnés.
+    """
+    Historique = modele.history.model
+    date = timezone.now()
+    lignes = [
+        Historique(
+            history_date=date,
+            history_type=type_historique,
+            history_user=utilisateur,
+            history_change_reason=raison,
+            **{champ.attname: getattr(objet, champ.attname) for champ in Historique.tracked_fields}
+        )
+        for objet in objets
+    ]
+    Historique.objects.bulk_create(lignes, batch_size=500)
+    return lignes
+
+
+def totaux_par_caisse(operations):
+    """Somme des montants d'un queryset d'opérations, par caisse (une requête groupée)."""
+    return dict(operations.order_by().values_list('caisse').annotate(total=Sum('montant')))
+
+
+def mouvementer_caisses(variations):
+    """
+    Applique des variations de solde {caisse_id: variation} dans la transaction courante,
+    caisses verrouillées dans l'ordre des clés.
+    """
+    caisses = Caisse.verrouiller_plusieurs([pk for pk, variation in variations.items() if variation])
+    for pk, caisse in caisses.items():
+        caisse.mouvementer(variations[pk])
+
+
+def modifier_operations_en_masse(modele, ids, utilisateur=None, **valeurs):
+    """
+    Applique `valeurs` aux opérations `ids` en un seul UPDATE, puis historise les lignes modifiées.
+    """
+    with transaction.atomic():
+        operations = modele.objects.filter(pk__in=ids)
+        impact_solde = bool({'montant', 'caisse'} & set(valeurs))
+        if impact_solde:
+            # Les soldes des caisses suivent la différence des totaux, lignes verrouillées
+            caisses = set(operations.values_list('caisse_id', flat=True))
+            nouvelle_caisse = valeurs.get('caisse')
+            if nouvelle_caisse is not None:
+                caisses.add(getattr(nouvelle_caisse, 'pk', nouvelle_caisse))
+            Caisse.verrouiller_plusieurs(caisses)
+            avant = totaux_par_caisse(operations)
+        nombre = operations.update(**valeurs)
+        if nombre and impact_solde:
+            apres = totaux_par_caisse(operations)
+            mouvementer_caisses({
+                pk: modele.SENS_SOLDE * (apres.get(pk, 0) - avant.get(pk, 0)) for pk in set(avant) | set(apres)
+            })
+        if nombre and set(valeurs) & {champ.removesuffix('_id') for champ in modele.CHAMPS_CHAINE}:
+            # Les maillons des lignes modifiées (et des suivantes) sont recalculés
+            modele.sceller(ids)
+        if nombre:
+            operations = list(operations)
+            # L'empreinte dépend de certains champs (ex. fournisseur) : on la recalcule en lot
+            if set(valeurs) & set(modele.CHAMPS_EMPREINTE):
+                for operation in operations:
+                    operation.empreinte = operation.calculer_empreinte()
+                modele.objects.bulk_update(operations, ['empreinte'], batch_size=500)
+            historiser_en_masse(modele, operations, '~', utilisateur, raison='Modification en masse')
+            versions.invalider('operations')
+    return nombre
+
+
+def modifier_operations_par_ligne(modele, modifications, utilisateur=None, raison=''):
+    """
+    Applique à chaque opération ses propres valeurs ({pk: {champ: valeur}}) par UPDATE groupés
+    (bulk_update) au lieu d'un save() par ligne, avec les mêmes effets que modifier_operations_en_masse :
+    soldes des caisses, empreintes, maillons de la chaîne et historique. Retourne les opérations modifiées.
+    """
+    if not modifications:
+        return []
+    with transaction.atomic():
+        operations = modele.objects.filter(pk__in=modifications)
+        caisses = set(operations.values_list('caisse_id', flat=True))
+        caisses |= {getattr(valeurs['caisse'], 'pk', valeurs['caisse']) for valeurs in modifications.values() if 'caisse' in valeurs}
+        Caisse.verrouiller_plusieurs(caisses)
+        operations = list(operations.order_by('pk'))
+        champs = set()
+        variations = defaultdict(Decimal)
+        for operation in operations:
+            variations[operation.caisse_id] -= modele.SENS_SOLDE * operation.montant
+            for champ, valeur in modifications[operation.pk].items():
+                setattr(operation, champ, valeur)
+                champs.add(champ)
+            operation.montant = modele.arrondir(operation.montant)
+            operation.empreinte = operation.calculer_empreinte()
+            variations[operation.caisse_id] += modele.SENS_SOLDE * operation.montant
+        if not champs:
+            return operations
+        mouvementer_caisses(variations)
+        modele.objects.bulk_update(operations, [*champs, 'empreinte'], batch_size=500)
+        if champs & {champ.removesuffix('_id') for champ in modele.CHAMPS_CHAINE}:
+            modele.sceller([operation.pk for operation in operations])
+        historiser_en_masse(modele, operations, '~', utilisateur, raison)
+        versions.invalider('operations')
+    return operations
+
+
+def inserer_en_masse(modele, operations):
+    """
+    bulk_create qui renseigne toujours les clés des opérations créées. MySQL ne les renvoie pas
+    (pas de RETURNING) : elles sont relues au-delà de la plus grande clé existante, ce qui suppose
+    la tête de chaîne verrouillée (aucune autre opération de ce type insérée entre-temps).
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return modele.objects.bulk_create(operations, batch_size=500)
+    derniere = modele.objects.aggregate(derniere=Max('pk'))['derniere'] or 0
+    modele.objects.bulk_create(operations, batch_size=500)
+    cles = list(modele.objects.filter(pk__gt=derniere).order_by('pk').values_list('pk', flat=True))
+    if len(cles) != len(operations):
+        raise DatabaseError("Clés des opérations insérées introuvables : insertion concurrente hors verrou de chaîne.")
+    for operation, cle in zip(operations, cles):
+        operation.pk = cle
+    return operations
+
+
+def creer_operations_en_masse(modele, operations, utilisateur=None, raison=''):
+    """
+    Enregistre des opérations non sauvegardées par INSERT groupés, avec ce que fait save()
+    ligne par ligne : caisse par défaut, empreinte, solde de chaque caisse (une mise à jour
+    par caisse), maillons de la chaîne d'intégrité et historique, dans une seule transaction.
+    """
+    if not operations:
+        return []
+    with transaction.atomic():
+        principale = None
+        variations = defaultdict(Decimal)
+        for operation in operations:
+            if operation.caisse_id is None:
+                principale = principale or Caisse.principale()
+                operation.caisse = principale
+            operation.montant = modele.arrondir(operation.montant)
+            operation.empreinte = operation.calculer_empreinte()
+            variations[operation.caisse_id] += modele.SENS_SOLDE * operation.montant
+        mouvementer_caisses(variations)
+        ChaineOperations.verrouiller(modele.CLE_CHAINE)
+        operations = inserer_en_masse(modele, operations)
+        modele.sceller([operation.pk for operation in operations])
+        historiser_en_masse(modele, operations, '+', utilisateur, raison)
+        versions.invalider('operations')
+    return operations
+
+
+def paies_a_comptabiliser():
+    """Fiches de paie payées ('P') qui n'ont pas encore de sortie de caisse."""
+    return Paie.objects.filter(statut='P', operation_sortie__isnull=True).select_related('employee')
+
+
+def comptabiliser_paies(paies_ids, categorie, fournisseur, caisse=None, date_de_sortie=None, utilisateur=None):
+    """
+    Transforme des fiches de paie payées en sorties de caisse, en une transaction :
+    les bénéficiaires manquants des employés sont créés en un INSERT, puis une sortie
+    par fiche (liée à sa fiche) est enregistrée en masse. Les fiches déjà comptabilisées
+    sont ignorées. Retourne les sorties créées.
+    """
+    with transaction.atomic():
+        # Verrouille les fiches : deux comptabilisations simultanées ne créent pas de doublon
+        paies = list(paies_a_comptabiliser().filter(pk__in=paies_ids).select_for_update(of=('self',)))
+        if not paies:
+            return []
+
+        beneficiaires = dict(
+            Beneficiaire.objects.filter(employee_id__in={paie.employee_id for paie in paies})
+            .order_by('pk').values_list('employee_id', 'pk')
+        )
+        nouveaux = {
+            paie.employee_id: Beneficiaire(employee=paie.employee, name=f"{paie.employee.nom} {paie.employee.prenom or ''}".strip()[:50])
+            for paie in paies if paie.employee_id not in beneficiaires
+        }
+        for beneficiaire in nouveaux.values():
+            # bulk_create n'appelle pas save()
+            beneficiaire.nom_affiche = beneficiaire.calculer_nom_affiche()
+            beneficiaire.nom_normalise = normaliser_texte(beneficiaire.nom_affiche)
+        if nouveaux:
+            crees = Beneficiaire.objects.bulk_create(list(nouveaux.values()), batch_size=500)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # Clés non renvoyées (MySQL) : relues par employé, sans bénéficiaire avant l'insertion
+                cles = dict(
+                    Beneficiaire.objects.filter(employee_id__in=nouveaux).order_by('pk')
+                    .values_list('employee_id', 'pk')
+                )
+                for beneficiaire in crees:
+                    beneficiaire.pk = cles[beneficiaire.employee_id]
+            historiser_en_masse(Beneficiaire, crees, '+', utilisateur, 'Comptabilisation de la paie')
+            # bulk_create n'envoie pas post_save : invalide le référentiel des listes déroulantes
+            referentiel.invalider()
+            beneficiaires.update({beneficiaire.employee_id: beneficiaire.pk for beneficiaire in crees})
+
+        sorties = [
+            OperationSortir(
+                description=f"Salaire {paie.employee.nom} {paie.employee.prenom or ''} - {paie.exercice}".replace('  ', ' ')[:255],
+                montant=paie.net_a_payer,
+                quantite=1,
+                date_de_sortie=date_de_sortie or paie.date_fin,
+                categorie=categorie,
+                fournisseur=fournisseur,
+                beneficiaire_id=beneficiaires[paie.employee_id],
+                caisse=caisse,
+                paie=paie,
+            )
+            for paie in paies
+        ]
+        return creer_operations_en_masse(OperationSortir, sorties, utilisateur, 'Comptabilisation de la paie')
+
+
+def generer_operations_recurrentes(jusqu_au=None, recurrences=None, utilisateur=None, simulation=False):
+    """
+    Crée les opérations des modèles récurrents actifs dont l'échéance tombe au plus tard
+    `jusqu_au` (aujourd'hui par défaut) : un INSERT groupé pour les entrées et un pour les
+    sorties. Les échéances déjà générées (même par un autre passage) sont ignorées, la
+    commande peut donc être relancée sans risque. Retourne {'entree': [...], 'sortie': [...]}.
+    """
+    jusqu_au = jusqu_au or timezone.localdate()
+    with transaction.atomic():
+        # Verrouille les modèles : deux générations simultanées ne créent pas de doublon
+        modeles = OperationRecurrente.objects.filter(active=True, date_debut__lte=jusqu_au).select_for_update()
+        if recurrences is not None:
+            modeles = modeles.filter(pk__in=recurrences)
+        modeles = list(modeles)
+
+        crees = {'entree': [], 'sortie': []}
+        dues = {}
+        for cle, modele in (('entree', OperationEntrer), ('sortie', OperationSortir)):
+            recurrentes = [recurrente for recurrente in modeles if recurrente.type == cle]
+            if not recurrentes:
+                continue
+            # Échéances dues de chaque modèle, calculées une fois (servent aussi au curseur)
+            for recurrente in recurrentes:
+                dues[recurrente.pk] = list(recurrente.echeances_dues(jusqu_au))
+            a_verifier = [recurrente for recurrente in recurrentes if dues[recurrente.pk]]
+            if not a_verifier:
+                continue
+            # Seules les échéances après le curseur de chaque modèle peuvent déjà exister
+            deja_generees = set(
+                modele.objects.filter(reduce(operator.or_, (
+                    Q(recurrence=recurrente, echeance__gt=recurrente.derniere_echeance, echeance__lte=jusqu_au)
+                    if recurrente.derniere_echeance else Q(recurrence=recurrente, echeance__lte=jusqu_au)
+                    for recurrente in a_verifier
+                )))
+                .values_list('recurrence_id', 'echeance')
+            )
+            operations = [
+                recurrente.construire(echeance)
+                for recurrente in a_verifier
+                for echeance in dues[recurrente.pk]
+                if (recurrente.pk, echeance) not in deja_generees
+            ]
+            if simulation:
+                crees[cle] = operations
+                continue
+            crees[cle] = creer_operations_en_masse(modele, operations, utilisateur, 'Opération récurrente')
+
+        if not simulation:
+            # Avance le curseur de chaque modèle pour ne plus reparcourir les échéances passées
+            a_jour = []
+            for recurrente in modeles:
+                echeances = dues.get(recurrente.pk)
+                if echeances:
+                    recurrente.derniere_echeance = echeances[-1]
+                    a_jour.append(recurrente)
+            OperationRecurrente.objects.bulk_update(a_jour, ['derniere_echeance'], batch_size=500)
+    return crees
+
+
+def supprimer_operations_en_masse(modele, ids, utilisateur=None):
+    """
+    Supprime les opérations `ids` en un seul DELETE ; l'historique est écrit en masse
+    avant la suppression plutôt que ligne par ligne par les signaux, et le solde
+    de chaque caisse concernée est corrigé en une fois.
+    """
+    with transaction.atomic():
+        operations = modele.objects.filter(pk__in=ids)
+        Caisse.verrouiller_plusieurs(set(operations.values_list('caisse_id', flat=True)))
+        ChaineOperations.verrouiller(modele.CLE_CHAINE)
+        totaux = totaux_par_caisse(operations)
+        operations = list(operations)
+        if not operations:
+            return 0
+        historiser_en_masse(modele, operations, '-', utilisateur, raison='Suppression en masse')
+        justificatifs = []
+        if modele is OperationSortir:
+            justificatifs = list(
+                OperationSortir.justificatifs.through.objects.filter(operationsortir_id__in=ids)
+                .values_list('justificatif_id', flat=True).distinct()
+            )
+        with HistoriqueSuspendable.suspendre():
+            modele.objects.filter(pk__in=ids).delete()
+        # Justificatifs que seules ces sorties utilisaient
+        Justificatif.liberer(justificatifs)
+        mouvementer_caisses({pk: -modele.SENS_SOLDE * total for pk, total in totaux.items()})
+        modele.sceller(
+            [operation.pk for operation in operations],
+            supprimees={operation.pk: (operation.hash_precedent, operation.hash_chaine) for operation in operations},
+        )
+        versions.invalider('operations')
+    return len(operations)
+
+
+def soldes_par_caisse(date_debut=None, date_fin=None):
+    """
+    Totaux des entrées, sorties et transferts par caisse, une requête groupée par table.
+    Sans période, `solde_calcule` doit égaler le solde tenu par chaque caisse ; la vue
+    consolidée additionne ces agrégats par caisse au lieu de relire les opérations.
+    """
+    def totaux(queryset, champ_caisse, champ_date):
+        if date_debut:
+            queryset = queryset.filter(**{f'{champ_date}__gte': date_debut})
+        if date_fin:
+            queryset = queryset.filter(**{f'{champ_date}__lte': date_fin})
+        return dict(queryset.order_by().values_list(champ_caisse).annotate(total=Sum('montant')))
+
+    entrees = totaux(OperationEntrer.objects.all(), 'caisse', 'date_transaction')
+    sorties = totaux(OperationSortir.objects.all(), 'caisse', 'date_de_sortie')
+    recus = totaux(TransfertCaisse.objects.all(), 'caisse_destination', 'date')
+    emis = totaux(TransfertCaisse.objects.all(), 'caisse_source', 'date')
+
+    resultat = []
+    for caisse in Caisse.objects.order_by('pk'):
+        ligne = {
+            'caisse': caisse,
+            'solde': caisse.montant,
+            'entrees': entrees.get(caisse.pk, 0),
+            'sorties': sorties.get(caisse.pk, 0),
+            'transferts_recus': recus.get(caisse.pk, 0),
+            'transferts_emis': emis.get(caisse.pk, 0),
+        }
+        ligne['solde_calcule'] = ligne['entrees'] - ligne['sorties'] + ligne['transferts_recus'] - ligne['transferts_emis']
+        resultat.append(ligne)
+    return resultat
+
+
+def transferts_nets(caisse_id, debut=None, fin=None):
+    """Transferts reçus moins transferts émis par une caisse sur une période."""
+    transferts = TransfertCaisse.objects.all()
+    if debut:
+        transferts = transferts.filter(date__gte=debut)
+    if fin:
+        transferts = transferts.filter(date__lte=fin)
+    totaux = transferts.aggregate(
+        recus=Sum('montant', filter=Q(caisse_destination_id=caisse_id)),
+        emis=Sum('montant', filter=Q(caisse_source_id=caisse_id)),
+    )
+    return (totaux['recus'] or 0) - (totaux['emis'] or 0)
+
+
+def transferts_nets_par_mois(caisse_id, debut, fin):
+    """Transferts nets d'une caisse par mois ('AAAA-MM' -> montant)."""
+    mois = TransfertCaisse.objects.filter(
+        Q(caisse_source_id=caisse_id) | Q(caisse_destination_id=caisse_id), date__range=(debut, fin)
+    ).annotate(mois=TruncMonth('date')).values('mois').annotate(
+        recus=Coalesce(Sum('montant', filter=Q(caisse_destination_id=caisse_id)), 0, output_field=DecimalField()),
+        emis=Coalesce(Sum('montant', filter=Q(caisse_source_id=caisse_id)), 0, output_field=DecimalField()),
+    ).order_by('mois')
+    return {ligne['mois'].strftime('%Y-%m'): ligne['recus'] - ligne['emis'] for ligne in mois}
+
+
+def consolider(soldes):
+    """Additionne les agrégats par caisse de `soldes_par_caisse()`."""
+    champs = ('solde', 'entrees', 'sorties', 'transferts_recus', 'transferts_emis', 'solde_calcule')
+    return {champ: sum((ligne[champ] for ligne in soldes), 0) for champ in champs}
+
+
+def detecter_doublons(modele, operations):
+    """
+    Cherche, pour des opérations non encore enregistrées, celles qui ont déjà été saisies
+    (même empreinte en base, une seule requête sur l'index) ou qui se répètent dans le lot.
+    Retourne une liste de (index de la ligne, opération existante ou None).
+    """
+    empreintes = [operation.calculer_empreinte() for operation in operations]
+    existantes = {}
+    for operation in modele.objects.filter(empreinte__in=set(empreintes)).order_by('pk'):
+        existantes.setdefault(operation.empreinte, operation)
+
+    doublons, vues = [], set()
+    for index, empreinte in enumerate(empreintes):
+        if empreinte in existantes:
+            doublons.append((index, existantes[empreinte]))
+        elif empreinte in vues:
+            doublons.append((index, None))
+        vues.add(empreinte)
+    return doublons
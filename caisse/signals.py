@@ -1,6 +1,14 @@
+from functools import partial
+
 from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import UserActivity
+from GPP.normalisation import normaliser_texte
+from personnel.models import Employee
+from .models import Beneficiaire, Categorie, Fournisseur, Justificatif, OperationEntrer, OperationSortir, Personnel, TransfertCaisse, UserActivity
+from . import referentiel, versions
+from .justificatifs import supprimer_fichiers
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
@@ -8,4 +16,42 @@ def log_user_login(sender, request, user, **kwargs):
 
 @receiver(user_logged_out)
 def log_user_logout(sender, request, user, **kwargs):
-    UserActivity.objects.create(user=user, action='Déconnexion', description="s'est déconnecté ")
\ No newline at end of file
+    UserActivity.objects.create(user=user, action='Déconnexion', description="s'est déconnecté ")
+
+@receiver(post_save, sender=Personnel)
+def actualiser_nom_beneficiaires(sender, instance, **kwargs):
+    # Un seul UPDATE pour tous les bénéficiaires liés au personnel renommé
+    Beneficiaire.objects.filter(personnel=instance).exclude(nom_affiche=str(instance)).update(
+        nom_affiche=str(instance), nom_normalise=instance.nom_normalise
+    )
+
+@receiver(post_save, sender=Employee)
+def actualiser_nom_beneficiaires_employe(sender, instance, **kwargs):
+    # Bénéficiaires créés par la comptabilisation de la paie : même mise à jour en un UPDATE
+    nom = Beneficiaire.nom_employe(instance)
+    renommes = Beneficiaire.objects.filter(employee=instance, personnel__isnull=True).exclude(nom_affiche=nom).update(
+        nom_affiche=nom, nom_normalise=normaliser_texte(nom)[:Beneficiaire._meta.get_field('nom_normalise').max_length]
+    )
+    if renommes:
+        # update() n'envoie pas post_save : les listes déroulantes des bénéficiaires sont rechargées
+        referentiel.invalider()
+
+@receiver([post_save, post_delete], sender=Categorie)
+@receiver([post_save, post_delete], sender=Fournisseur)
+@receiver([post_save, post_delete], sender=Beneficiaire)
+@receiver([post_save, post_delete], sender=Personnel)
+def invalider_referentiel(sender, **kwargs):
+    # Les listes déroulantes mises en cache par chaque worker sont rechargées à la prochaine page
+    referentiel.invalider()
+
+@receiver([post_save, post_delete], sender=OperationEntrer)
+@receiver([post_save, post_delete], sender=OperationSortir)
+@receiver([post_save, post_delete], sender=TransfertCaisse)
+def invalider_operations(sender, **kwargs):
+    # Les réponses conditionnelles (ETag) des listes d'opérations et du tableau de bord sont périmées
+    versions.invalider('operations')
+
+@receiver(post_delete, sender=Justificatif)
+def supprimer_fichiers_justificatif(sender, instance, **kwargs):
+    # Après validation seulement : une transaction annulée garde ses fichiers
+    transaction.on_commit(partial(supprimer_fichiers, [instance.fichier.name, instance.miniature.name]))
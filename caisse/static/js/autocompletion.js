@@ -0,0 +1,39 @@
+// Autocomplétion des noms (catégories, bénéficiaires, fournisseurs...) depuis caisse:autocompletion.
+// Les suggestions sont demandées au fil de la frappe au lieu d'embarquer toutes les listes dans la page.
+
+// Remplit la <datalist> `liste` avec les noms commençant par `texte` (option : data-id = identifiant)
+function suggerer(url, liste, texte) {
+    const separateur = url.includes('?') ? '&' : '?';
+    return fetch(`${url}${separateur}q=${encodeURIComponent(texte || '')}`)
+        .then(reponse => reponse.json())
+        .then(donnees => {
+            liste.innerHTML = '';
+            donnees.resultats.forEach(resultat => {
+                const option = document.createElement('option');
+                option.value = resultat.label;
+                option.dataset.id = resultat.id;
+                liste.appendChild(option);
+            });
+        });
+}
+
+// Composant Alpine d'un filtre : champ texte + <datalist> + champ caché portant l'identifiant.
+// Le champ caché reçoit un évènement `change` quand la valeur choisie change.
+function autocompletion(url, valeur, libelle) {
+    return {
+        texte: libelle || '',
+        valeur: valeur || '',
+        chercher() {
+            suggerer(url, this.$refs.liste, this.texte);
+        },
+        choisir() {
+            const option = Array.from(this.$refs.liste.options).find(opt => opt.value === this.texte);
+            const valeur = this.texte ? (option ? option.dataset.id : this.valeur) : '';
+            if (valeur !== this.valeur) {
+                this.valeur = valeur;
+                this.$refs.valeur.value = valeur;
+                this.$refs.valeur.dispatchEvent(new Event('change'));
+            }
+        },
+    };
+}
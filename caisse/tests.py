@@ -1,3 +1,928 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import environ
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, models, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from GPP.coordination import coordination, coordination_atomique
+from GPP.normalisation import NomNormaliseMixin
+from personnel.models import Employee, Paie
+
+from . import chaine, referentiel, versions
+from .api_views import LOT_MAXIMUM
+from .justificatifs import detacher_justificatif, enregistrer_justificatif, joindre_justificatifs, type_fichier
+from .models import (
+    Beneficiaire, Caisse, Categorie, ChaineRompue, Fournisseur, Justificatif, OperationEntrer, OperationRecurrente, OperationSortir,
+    Personnel, ReleveBancaire, SoldeInsuffisant, TransfertCaisse,
+)
+from .services import (
+    comptabiliser_paies, consolider, creer_operations_en_masse, generer_operations_recurrentes, modifier_operations_en_masse, soldes_par_caisse,
+    supprimer_operations_en_masse,
+)
+
+
+class DonneesCaisseMixin:
+    """Données communes : catégories, fournisseur, bénéficiaire et un utilisateur connecté."""
+
+    def setUp(self):
+        # Le cache fichier (versions) est partagé avec le serveur de développement,
+        # le cache de coordination (limitations, délestage) avec les autres tests
+        cache.clear()
+        coordination.clear()
+        self.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'motdepasse')
+        self.client.force_login(self.user)
+        self.categorie_sortie = Categorie.objects.create(name='Carburant', type='sortie')
+        self.categorie_entree = Categorie.objects.create(name='Ventes', type='entree')
+        self.fournisseur = Fournisseur.objects.create(name='Shell', contact='0340000000')
+        self.beneficiaire = Beneficiaire.objects.create(name='Jean')
+
+    def sortie(self, montant, **valeurs):
+        return OperationSortir.objects.create(
+            description=valeurs.pop('description', 'Essence'), montant=montant, categorie=self.categorie_sortie,
+            beneficiaire=self.beneficiaire, fournisseur=self.fournisseur, **valeurs
+        )
+
+    def entree(self, montant, **valeurs):
+        return OperationEntrer.objects.create(
+            description=valeurs.pop('description', 'Vente'), montant=montant, categorie=self.categorie_entree, **valeurs
+        )
+
+    def solde(self, caisse=None):
+        return Caisse.objects.get(pk=(caisse or Caisse.principale()).pk).montant
+
+    def assertSoldeTenu(self, caisse=None):
+        """Le solde tenu de la caisse est celui recalculé depuis ses opérations et transferts."""
+        caisse = Caisse.objects.get(pk=(caisse or Caisse.principale()).pk)
+        self.assertEqual(caisse.montant, caisse.calculer_solde())
+
+    def employe(self, nom, **valeurs):
+        # Le signal de création du compte utilisateur écrit sur la sortie standard
+        with redirect_stdout(io.StringIO()):
+            return Employee.objects.create(
+                nom=nom, prenom=valeurs.pop('prenom', 'Paul'), email=f'{nom.lower()}@example.com', date_naissance=date(1990, 1, 1),
+                sexe='Masculin', ville='Antananarivo', adresse='Lot 1', statut_matrimonial='Célibataire',
+                nationalite='Malgache', pays='Madagascar', code_postal='101', type_salarie='salarie', **valeurs
+            )
+
+    def envoyer(self, methode, url, donnees, **extra):
+        return self.client.generic(
+            methode, url, json.dumps(donnees), content_type='application/json', HTTP_ACCEPT='application/json', **extra
+        )
+
+
+class CaisseTestCase(DonneesCaisseMixin, TestCase):
+    pass
+
+
+class SoldeCaisseTests(CaisseTestCase):
+
+    def test_solde_suit_chaque_ecriture(self):
+        entree = self.entree(1000)
+        sortie = self.sortie(300)
+        self.assertEqual(self.solde(), 700)
+        sortie.montant = 450
+        sortie.save()
+        self.assertEqual(self.solde(), 550)
+        entree.delete()
+        self.assertEqual(self.solde(), -450)
+        self.assertSoldeTenu()
+
+    def test_ecritures_en_masse(self):
+        creer_operations_en_masse(OperationEntrer, [
+            OperationEntrer(description=f'Vente {i}', montant=100, categorie=self.categorie_entree) for i in range(5)
+        ])
+        ids = [self.sortie(50).pk for _ in range(4)]
+        modifier_operations_en_masse(OperationSortir, ids[:2], montant=80)
+        supprimer_operations_en_masse(OperationSortir, ids[2:])
+        self.assertEqual(self.solde(), 500 - 160)
+        self.assertSoldeTenu()
+
+    def test_suppression_d_une_instance_perimee(self):
+        perimee = self.sortie(100)
+        a_jour = OperationSortir.objects.get(pk=perimee.pk)
+        a_jour.montant = 300
+        a_jour.save()
+        perimee.delete()
+        self.assertEqual(self.solde(), 0)
+        self.assertSoldeTenu()
+
+    @override_settings(CAISSE_DECOUVERT_AUTORISE=False)
+    def test_decouvert_interdit(self):
+        self.entree(100)
+        with self.assertRaises(SoldeInsuffisant):
+            self.sortie(150)
+        self.assertEqual(self.solde(), 100)
+        self.assertFalse(OperationSortir.objects.exists())
+
+
+class TransfertCaisseTests(CaisseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.principale = Caisse.principale()
+        self.annexe = Caisse.objects.create(nom='Annexe', montant=0)
+
+    def test_transfert_et_annulation(self):
+        self.entree(1000)
+        transfert = TransfertCaisse.objects.create(caisse_source=self.principale, caisse_destination=self.annexe, montant=400)
+        self.assertEqual((self.solde(self.principale), self.solde(self.annexe)), (600, 400))
+        with self.assertRaises(ValidationError):
+            transfert.save()
+        transfert.delete()
+        self.assertEqual((self.solde(self.principale), self.solde(self.annexe)), (1000, 0))
+
+    def test_operation_deplacee(self):
+        sortie = self.sortie(250)
+        self.entree(100, caisse=self.annexe)
+        sortie.caisse = self.annexe
+        sortie.save()
+        self.assertEqual((self.solde(self.principale), self.solde(self.annexe)), (0, -150))
+        for caisse in (self.principale, self.annexe):
+            self.assertSoldeTenu(caisse)
+
+    def test_totaux_par_caisse(self):
+        self.entree(1000)
+        self.entree(300, caisse=self.annexe)
+        TransfertCaisse.objects.create(caisse_source=self.principale, caisse_destination=self.annexe, montant=200)
+        soldes = {ligne['caisse'].pk: ligne['solde'] for ligne in soldes_par_caisse()}
+        self.assertEqual(soldes, {self.principale.pk: 800, self.annexe.pk: 500})
+        self.assertEqual(consolider(soldes_par_caisse())['solde'], 1300)
+
+
+class ChaineIntegriteTests(CaisseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sorties = [self.sortie(100 + i) for i in range(5)]
+
+    def motifs(self, resultat):
+        return [(pk, motif.split(' ')[0]) for _, pk, motif in resultat['anomalies']]
+
+    def test_ecritures_de_l_application(self):
+        self.sorties[1].montant = 999
+        self.sorties[1].save()
+        self.sorties[3].delete()
+        supprimer_operations_en_masse(OperationSortir, [self.sorties[4].pk])
+        self.sortie(50)
+        resultat = chaine.verifier_complete('sortie')
+        self.assertEqual(resultat['anomalies'], [])
+        self.assertEqual(resultat['nombre'], 4)
+
+    def test_modification_hors_application(self):
+        OperationSortir.objects.filter(pk=self.sorties[2].pk).update(montant=1)
+        self.assertEqual(self.motifs(chaine.verifier_complete('sortie')), [(self.sorties[2].pk, 'contenu')])
+
+    def test_suppression_hors_application(self):
+        # QuerySet.delete() ne passe pas par le delete() du modèle : la chaîne n'est pas rescellée
+        OperationSortir.objects.filter(pk=self.sorties[2].pk).delete()
+        self.assertEqual(self.motifs(chaine.verifier_complete('sortie')), [(self.sorties[3].pk, 'chaînage')])
+        OperationSortir.objects.filter(pk=self.sorties[4].pk).delete()
+        self.assertIn((self.sorties[4].pk, 'fin'), self.motifs(chaine.verifier_complete('sortie')))
+
+    def test_pas_de_rescellement_d_une_ligne_alteree(self):
+        OperationSortir.objects.filter(pk=self.sorties[3].pk).update(montant=1)
+        self.sorties[2].montant = 500
+        with self.assertRaises(ChaineRompue):
+            self.sorties[2].save()
+        # Modification refusée, l'altération reste signalée
+        self.assertEqual(OperationSortir.objects.get(pk=self.sorties[2].pk).montant, 102)
+        self.assertEqual(self.motifs(chaine.verifier_complete('sortie')), [(self.sorties[3].pk, 'contenu')])
+
+    def test_pas_de_rescellement_apres_suppression_hors_application(self):
+        OperationSortir.objects.filter(pk=self.sorties[3].pk).delete()
+        with self.assertRaises(ChaineRompue):
+            self.sorties[2].delete()
+        self.assertEqual(self.motifs(chaine.verifier_complete('sortie')), [(self.sorties[4].pk, 'chaînage')])
+
+    def test_verification_incrementale(self):
+        self.assertEqual(chaine.verifier_incrementale('sortie')['nombre'], 5)
+        suivante = self.sortie(50)
+        resultat = chaine.verifier_incrementale('sortie')
+        self.assertEqual((resultat['anomalies'], resultat['nombre']), ([], 1))
+        # Opération du point de contrôle supprimée hors de l'application : signalée, toute la chaîne est relue
+        OperationSortir.objects.filter(pk=suivante.pk).delete()
+        resultat = chaine.verifier_incrementale('sortie')
+        self.assertIn((suivante.pk, 'opération'), self.motifs(resultat))
+        self.assertEqual((resultat['depuis'], resultat['nombre']), (None, 5))
+
+
+class OperationsRecurrentesTests(CaisseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loyer = OperationRecurrente.objects.create(
+            type='sortie', description='Loyer', montant=500, categorie=self.categorie_sortie,
+            fournisseur=self.fournisseur, beneficiaire=self.beneficiaire, date_debut=date(2024, 1, 31),
+        )
+
+    def test_echeances_generees_une_fois(self):
+        crees = generer_operations_recurrentes(jusqu_au=date(2024, 4, 30))
+        # Fin de mois ramenée au dernier jour des mois courts
+        self.assertEqual(
+            [operation.date_de_sortie for operation in crees['sortie']],
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+        self.assertEqual(generer_operations_recurrentes(jusqu_au=date(2024, 4, 30)), {'entree': [], 'sortie': []})
+        self.assertEqual(len(generer_operations_recurrentes(jusqu_au=date(2024, 5, 31))['sortie']), 1)
+        self.assertEqual(self.solde(), -2500)
+        self.assertSoldeTenu()
+
+    def test_reprise_apres_le_curseur(self):
+        # Fin de mois raccourcie : la reprise part bien de l'échéance suivante
+        self.loyer.derniere_echeance = date(2024, 2, 29)
+        self.assertEqual(self.loyer.rang_suivant(), 2)
+        self.assertEqual(list(self.loyer.echeances_dues(date(2024, 4, 30))), [date(2024, 3, 31), date(2024, 4, 30)])
+        hebdo = OperationRecurrente(frequence='hebdomadaire', date_debut=date(2024, 1, 1), derniere_echeance=date(2024, 1, 15))
+        self.assertEqual(list(hebdo.echeances_dues(date(2024, 1, 29))), [date(2024, 1, 22), date(2024, 1, 29)])
+
+    def test_simulation(self):
+        crees = generer_operations_recurrentes(jusqu_au=date(2024, 2, 29), simulation=True)
+        self.assertEqual(len(crees['sortie']), 2)
+        self.assertFalse(OperationSortir.objects.exists())
+        self.assertIsNone(OperationRecurrente.objects.get(pk=self.loyer.pk).derniere_echeance)
+
+
+class ReferentielTests(DonneesCaisseMixin, TransactionTestCase):
+    # Écritures validées : les versions changent réellement après chaque transaction
+
+    def setUp(self):
+        super().setUp()
+        referentiel._local.update(version=None, donnees=None)
+
+    def test_cache_partage_et_invalidation(self):
+        with self.assertNumQueries(4):
+            referentiel.referentiel()
+        with self.assertNumQueries(0):
+            referentiel.referentiel()
+        # Autre worker : copie partagée de la même version, sans lire la base
+        referentiel._local.update(version=None, donnees=None)
+        with self.assertNumQueries(0):
+            referentiel.referentiel()
+        Fournisseur.objects.create(name='Total', contact='0330000000')
+        self.assertEqual([fournisseur.name for fournisseur in referentiel.referentiel()['fournisseurs']], ['Shell', 'Total'])
+
+
+class ApiCaisseTests(CaisseTestCase):
+    url = '/api/caisse/operations-sortir/'
+
+    def lire(self, url, **parametres):
+        reponse = self.client.get(url, parametres, HTTP_ACCEPT='application/json')
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.json()
+
+    def test_pagination(self):
+        aujourdhui = timezone.localdate()
+        operations = [self.sortie(10 * i, description=f'Plein {i}', date_de_sortie=aujourdhui - timedelta(days=i)) for i in range(1, 4)]
+        page = self.lire(self.url, page_size=2)
+        self.assertEqual(page['count'], 3)
+        self.assertIsNotNone(page['next'])
+        # Les plus récentes d'abord
+        self.assertEqual([resultat['id'] for resultat in page['results']], [operations[0].pk, operations[1].pk])
+        page = self.lire(self.url, page_size=2, page=2)
+        self.assertEqual([resultat['id'] for resultat in page['results']], [operations[2].pk])
+        self.assertIsNone(page['next'])
+
+    def test_filtres(self):
+        aujourdhui = timezone.localdate()
+        ancienne = self.sortie(100, description='Ancienne', date_de_sortie=aujourdhui - timedelta(days=10))
+        recente = self.sortie(200, description='Récente', date_de_sortie=aujourdhui)
+        autre_categorie = Categorie.objects.create(name='Loyer', type='sortie')
+        loyer = OperationSortir.objects.create(
+            description='Loyer', montant=300, categorie=autre_categorie, beneficiaire=self.beneficiaire, fournisseur=self.fournisseur,
+        )
+
+        def ids(**parametres):
+            return {resultat['id'] for resultat in self.lire(self.url, **parametres)['results']}
+
+        self.assertEqual(ids(categorie=self.categorie_sortie.pk), {ancienne.pk, recente.pk})
+        self.assertEqual(ids(categorie=autre_categorie.pk), {loyer.pk})
+        self.assertEqual(ids(date_min=aujourdhui - timedelta(days=1)), {recente.pk, loyer.pk})
+        self.assertEqual(ids(date_max=aujourdhui - timedelta(days=1)), {ancienne.pk})
+        reponse = self.client.get(self.url, {'date_min': 'hier'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_filtre_nom_par_prefixe(self):
+        electricite = Fournisseur.objects.create(name='Électricité du Sud', contact='0340000001')
+        eau = Fournisseur.objects.create(name='Eau potable', contact='0340000002')
+
+        def noms(valeur):
+            return [resultat['id'] for resultat in self.lire('/api/caisse/fournisseurs/', nom=valeur)['results']]
+
+        # Sans tenir compte des accents ni des majuscules, triés par nom
+        self.assertEqual(noms('ELEC'), [electricite.pk])
+        self.assertEqual(noms('e'), [eau.pk, electricite.pk])
+        self.assertEqual(noms('sud'), [])
+        self.assertEqual(len(noms('')), 3)
+
+    def test_date_du_jour_par_defaut(self):
+        reponse = self.envoyer('POST', self.url, {
+            'description': 'Sans date', 'montant': 50, 'categorie': self.categorie_sortie.pk,
+            'beneficiaire': self.beneficiaire.pk, 'fournisseur': self.fournisseur.pk,
+        })
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.json()['date_de_sortie'], timezone.localdate().isoformat())
+
+    def test_authentification_requise(self):
+        self.client.logout()
+        for url in (self.url, '/api/caisse/categories/', '/api/caisse/fournisseurs/', '/api/caisse/tableau-bord/resume/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json').status_code, 401)
+        self.assertEqual(self.envoyer('POST', self.url, {'description': 'Anonyme', 'montant': 10}).status_code, 401)
+        self.assertFalse(OperationSortir.objects.filter(description='Anonyme').exists())
+
+
+class OperationsEnLotTests(CaisseTestCase):
+    url = '/api/caisse/operations-sortir/lot/'
+
+    def ligne(self, montant, **valeurs):
+        return {
+            'description': 'Lot', 'montant': montant, 'categorie': self.categorie_sortie.pk,
+            'beneficiaire': self.beneficiaire.pk, 'fournisseur': self.fournisseur.pk, **valeurs,
+        }
+
+    def test_creation(self):
+        reponse = self.envoyer('POST', self.url, [self.ligne(100), self.ligne(250, description='Pneus')])
+        self.assertEqual(reponse.status_code, 201)
+        ids = [resultat['id'] for resultat in reponse.json()['resultats']]
+        self.assertEqual(
+            list(OperationSortir.objects.filter(pk__in=ids).order_by('pk').values_list('description', 'montant')),
+            [('Lot', 100), ('Pneus', 250)],
+        )
+        self.assertEqual(self.solde(), -350)
+        self.assertEqual(chaine.verifier_complete('sortie')['anomalies'], [])
+
+    def test_lignes_invalides(self):
+        lot = [self.ligne(100), self.ligne(100, categorie=0), 'texte', self.ligne('abc')]
+        reponse = self.envoyer('POST', self.url, lot)
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual([resultat['index'] for resultat in reponse.json()['resultats']], [1, 2, 3])
+        self.assertFalse(OperationSortir.objects.exists())
+        # ?partiel=1 : seules les lignes valides sont écrites
+        reponse = self.envoyer('POST', f'{self.url}?partiel=1', lot)
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.json()['nombre'], 1)
+        self.assertEqual(OperationSortir.objects.count(), 1)
+        for corps in ({'montant': 5}, [self.ligne(1)] * (LOT_MAXIMUM + 1)):
+            self.assertEqual(self.envoyer('POST', self.url, corps).status_code, 400)
+
+    def test_modification(self):
+        premiere, seconde = self.sortie(10), self.sortie(20)
+        reponse = self.envoyer('PATCH', self.url, [
+            {'id': premiere.pk, 'montant': 15}, {'id': seconde.pk, 'description': 'Gazole'},
+        ])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(
+            list(OperationSortir.objects.order_by('pk').values_list('description', 'montant')),
+            [('Essence', 15), ('Gazole', 20)],
+        )
+        self.assertEqual(self.solde(), -35)
+        reponse = self.envoyer('PATCH', self.url, [
+            {'id': premiere.pk, 'montant': 1}, {'id': premiere.pk, 'montant': 2}, {'id': 999999, 'montant': 3},
+        ])
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(
+            [resultat['erreurs']['id'] for resultat in reponse.json()['resultats']],
+            [['Opération déjà modifiée dans ce lot.'], ['Opération introuvable.']],
+        )
+        self.assertEqual(OperationSortir.objects.get(pk=premiere.pk).montant, 15)
+
+    def test_suppression(self):
+        sorties = [self.sortie(10) for _ in range(3)]
+        reponse = self.envoyer('DELETE', self.url, [sorties[0].pk, sorties[1].pk, 999999])
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(OperationSortir.objects.count(), 3)
+        reponse = self.envoyer('DELETE', f'{self.url}?partiel=1', [sorties[0].pk, sorties[1].pk, 999999])
+        self.assertEqual((reponse.status_code, reponse.json()['nombre']), (200, 2))
+        self.assertEqual(list(OperationSortir.objects.values_list('pk', flat=True)), [sorties[2].pk])
+        self.assertEqual(self.solde(), -10)
+        self.assertSoldeTenu()
+
+    def test_identifiants_invalides(self):
+        sortie = self.sortie(10)
+        for methode, lot in (
+            ('DELETE', [{'id': sortie.pk}, [sortie.pk], True, '1']),
+            ('PATCH', [{'id': [sortie.pk], 'montant': 5}, {'id': {'pk': 1}, 'montant': 5}, {'id': True}, {'montant': 5}]),
+        ):
+            with self.subTest(methode=methode):
+                reponse = self.envoyer(methode, self.url, lot)
+                self.assertEqual(reponse.status_code, 400)
+                resultats = reponse.json()['resultats']
+                self.assertEqual([resultat['index'] for resultat in resultats], list(range(len(lot))))
+                self.assertTrue(all(resultat['erreurs']['id'] == ['Identifiant invalide.'] for resultat in resultats))
+        self.assertEqual(OperationSortir.objects.get(pk=sortie.pk).montant, 10)
+
+
+class ComptabilisationPaieTests(CaisseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.paies = []
+        for nom, net in (('Rakoto', 300000), ('Rabe', 250000)):
+            # Paie.save() enregistre deux fois : pas de create() (force_insert)
+            paie = Paie(employee=self.employe(nom), statut='P', net_a_payer=net, date_debut=date(2024, 1, 1), date_fin=date(2024, 1, 31))
+            paie.save()
+            self.paies.append(paie)
+        # Le premier employé a déjà son bénéficiaire
+        self.existant = Beneficiaire.objects.create(name='Rakoto Paul', employee=self.paies[0].employee)
+
+    def comptabiliser(self):
+        sorties = comptabiliser_paies([paie.pk for paie in self.paies], self.categorie_sortie, self.fournisseur, utilisateur=self.user)
+        self.assertEqual(len(sorties), 2)
+        for sortie, paie in zip(sorties, self.paies):
+            self.assertEqual(OperationSortir.objects.get(pk=sortie.pk).paie_id, paie.pk)
+        self.assertEqual(sorties[0].beneficiaire_id, self.existant.pk)
+        cree = Beneficiaire.objects.get(employee=self.paies[1].employee)
+        self.assertEqual((sorties[1].beneficiaire_id, cree.history.count()), (cree.pk, 1))
+        self.assertEqual(self.solde(), -550000)
+        self.assertEqual(chaine.verifier_complete('sortie')['anomalies'], [])
+        # Fiches déjà comptabilisées : ignorées
+        self.assertEqual(comptabiliser_paies([paie.pk for paie in self.paies], self.categorie_sortie, self.fournisseur), [])
+
+    def test_comptabilisation(self):
+        self.comptabiliser()
+
+    def test_comptabilisation_sans_cles_renvoyees(self):
+        # Comme sous MySQL : bulk_create ne renseigne pas les clés, elles sont relues
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.comptabiliser()
+
+
+class CategoriesTests(CaisseTestCase):
+
+    def modifier(self, categorie, **donnees):
+        return self.envoyer('POST', f'/caisse/categories/modifier/{categorie.pk}/', donnees)
+
+    def test_parent_inconnu(self):
+        for url, donnees in (
+            (f'/caisse/categories/modifier/{self.categorie_sortie.pk}/', {}),
+            ('/caisse/categories/creer/', {'name': 'Pneus', 'type': 'sortie'}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.envoyer('POST', url, {'parent': 999999, **donnees}).status_code, 400)
+        self.assertIsNone(Categorie.objects.get(pk=self.categorie_sortie.pk).parent_id)
+
+    def test_type_des_sous_categories(self):
+        transport = Categorie.objects.create(name='Transport', type='sortie')
+        self.assertEqual(self.modifier(self.categorie_sortie, parent=transport.pk).status_code, 200)
+        reponse = self.modifier(transport, type='entree')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(Categorie.objects.get(pk=transport.pk).type, 'sortie')
+        # Sans sous-catégorie, le type peut changer
+        self.assertEqual(self.modifier(self.categorie_sortie, parent=None).status_code, 200)
+        self.assertEqual(self.modifier(transport, type='entree').status_code, 200)
+
+
+class NomNormaliseTests(CaisseTestCase):
+
+    def test_nom_normalise_tenu_a_jour(self):
+        self.fournisseur.name = 'Société Générale'
+        self.fournisseur.save(update_fields=['name'])
+        self.assertEqual(Fournisseur.objects.get(pk=self.fournisseur.pk).nom_normalise, 'societe generale')
+
+    def test_beneficiaires_renommes_avec_leur_personne(self):
+        personnel = Personnel.objects.create(last_name='Rasoa', first_name='Marie', email='marie@example.com', date_naissance=date(1990, 1, 1))
+        du_personnel = Beneficiaire.objects.create(personnel=personnel)
+        employe = self.employe('Rakoto')
+        de_l_employe = Beneficiaire.objects.create(name='Rakoto Paul', employee=employe)
+        personnel.last_name = 'Rasoanirina'
+        personnel.save()
+        employe.nom, employe.prenom = 'Randria', 'Élodie'
+        employe.save()
+        self.assertEqual(
+            list(Beneficiaire.objects.filter(pk__in=[du_personnel.pk, de_l_employe.pk]).order_by('pk').values_list('nom_affiche', 'nom_normalise')),
+            [('Rasoanirina Marie', 'rasoanirina marie'), ('Randria Élodie', 'randria elodie')],
+        )
+
+    def test_nom_a_normaliser_requis(self):
+        with self.assertRaises(TypeError):
+            type('SansNom', (NomNormaliseMixin, models.Model), {'__module__': __name__})
+
+
+class SaisieOperationsTests(CaisseTestCase):
+
+    def formulaire_sortie(self, **valeurs):
+        return {
+            'date': '2024-03-10', 'designation': 'Essence', 'beneficiaire': self.beneficiaire.pk,
+            'fournisseur': self.fournisseur.pk, 'quantite': '2', 'prixUnitaire': '250', 'categorie': self.categorie_sortie.pk,
+            **valeurs,
+        }
+
+    def test_colonnes_inegales(self):
+        reponse = self.client.post('/caisse/ajouts-sortie/', self.formulaire_sortie(designation=['Essence', 'Pneus']))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertFalse(OperationSortir.objects.exists())
+        self.client.post('/caisse/ajouts-entree/', {
+            'date': ['2024-03-10', '2024-03-11'], 'designation': 'Vente', 'montant': ['100', '200'],
+            'categorie': [self.categorie_entree.pk] * 2,
+        })
+        self.assertFalse(OperationEntrer.objects.exists())
+
+    def test_doublon_reaffiche_les_lignes(self):
+        self.sortie(500, date_de_sortie=date(2024, 3, 10))
+        reponse = self.client.post('/caisse/ajouts-sortie/', self.formulaire_sortie())
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(OperationSortir.objects.count(), 1)
+        self.assertEqual(reponse.context['lignes_saisies'], [{
+            'date': '2024-03-10', 'designation': 'Essence', 'beneficiaire': str(self.beneficiaire.pk), 'beneficiaire_nom': 'Jean',
+            'fournisseur': str(self.fournisseur.pk), 'fournisseur_nom': 'Shell', 'quantite': '2', 'prixUnitaire': '250',
+            'categorie': str(self.categorie_sortie.pk), 'categorie_nom': 'Carburant', 'prixTotal': 500.0,
+        }])
+        self.assertContains(reponse, 'id="lignes-saisies"')
+        reponse = self.client.post('/caisse/ajouts-sortie/', self.formulaire_sortie(confirmer_doublons='1'))
+        self.assertRedirects(reponse, '/caisse/sorties/', fetch_redirect_response=False)
+        self.assertEqual(OperationSortir.objects.count(), 2)
+
+
+class RapprochementTests(CaisseTestCase):
+    url = '/caisse/rapprochements/'
+
+    def importer(self, contenu, nom='releve.csv', **donnees):
+        return self.client.post(self.url, {'fichier': SimpleUploadedFile(nom, contenu), **donnees})
+
+    def test_import_et_rapprochement(self):
+        proche = self.sortie(500, date_de_sortie=date(2024, 3, 11))
+        self.sortie(500, date_de_sortie=date(2024, 3, 7))
+        vente = self.entree(1000, date_transaction=date(2024, 3, 12))
+        contenu = (
+            "Relevé du compte courant\n"
+            "Date;Libellé;Débit;Crédit\n"
+            "10/03/2024;Carte SHELL;500,00;\n"
+            "10/03/2024;Versement;;1 000,00\n"
+            "20/03/2024;Frais;1 500,00;\n"
+        ).encode('latin-1')
+        reponse = self.importer(contenu)
+        releve = ReleveBancaire.objects.get()
+        self.assertRedirects(reponse, f'{self.url}{releve.pk}/', fetch_redirect_response=False)
+        # Même montant et date la plus proche dans la tolérance ; les frais restent à rapprocher
+        self.assertEqual(
+            list(releve.lignes.order_by('pk').values_list('montant', 'sortie', 'entree')),
+            [(-500, proche.pk, None), (1000, None, vente.pk), (-1500, None, None)],
+        )
+        ligne = releve.lignes.get(sortie=proche)
+        for valeur in ('abc', ''):
+            self.client.post(f'{self.url}{releve.pk}/', {'action': 'dissocier', 'ligne': valeur})
+        self.assertTrue(releve.lignes.filter(sortie=proche).exists())
+        self.client.post(f'{self.url}{releve.pk}/', {'action': 'dissocier', 'ligne': ligne.pk})
+        self.assertFalse(releve.lignes.filter(sortie=proche).exists())
+
+    def test_tolerance(self):
+        self.sortie(500, date_de_sortie=date(2024, 3, 15))
+        self.importer(b"Date,Montant\n2024-03-10,-500\n", tolerance_jours=2)
+        self.assertFalse(ReleveBancaire.objects.get().lignes.filter(sortie__isnull=False).exists())
+
+    def test_fichiers_refuses(self):
+        for contenu, nom, donnees in (
+            (b"pas un classeur", 'releve.xlsx', {}),
+            (b"Libelle;Montant\nFrais;-500\n", 'releve.csv', {}),
+            (b"Date;Montant\n10/03/2024;-500\n", 'releve.csv', {'tolerance_jours': '-1'}),
+        ):
+            with self.subTest(nom=nom, donnees=donnees):
+                self.assertRedirects(self.importer(contenu, nom, **donnees), self.url, fetch_redirect_response=False)
+        self.assertFalse(ReleveBancaire.objects.exists())
+
+
+class JustificatifsTests(CaisseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=dossier.name))
+
+    def image(self, nom='recu.jpg', type_mime='image/jpeg'):
+        contenu = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(contenu, 'PNG')
+        return SimpleUploadedFile(nom, contenu.getvalue(), content_type=type_mime)
+
+    def test_contenu_verifie(self):
+        # Le format détecté fait foi sur le type annoncé par le navigateur
+        self.assertEqual(type_fichier(self.image()), 'image/png')
+        self.assertEqual(type_fichier(SimpleUploadedFile('f.pdf', b'%PDF-1.4 ...', content_type='application/pdf')), 'application/pdf')
+        for fichier in (
+            SimpleUploadedFile('f.pdf', b'<html></html>', content_type='application/pdf'),
+            SimpleUploadedFile('f.png', b'<script></script>', content_type='image/png'),
+        ):
+            with self.subTest(fichier=fichier.name), self.assertRaises(ValueError):
+                type_fichier(fichier)
+
+    def test_fichier_supprime_avec_la_derniere_sortie(self):
+        premiere, seconde = self.sortie(10), self.sortie(20)
+        [justificatif] = joindre_justificatifs(premiere, [self.image()])
+        self.assertEqual(joindre_justificatifs(seconde, [self.image('copie.jpg')]), [justificatif])
+        chemin = justificatif.fichier.name
+        with self.captureOnCommitCallbacks(execute=True):
+            premiere.delete()
+        self.assertTrue(default_storage.exists(chemin))
+        with self.captureOnCommitCallbacks(execute=True):
+            detacher_justificatif(seconde, justificatif)
+        self.assertFalse(Justificatif.objects.exists())
+        self.assertFalse(default_storage.exists(chemin))
+        # Suppression en masse des sorties : même nettoyage
+        [justificatif] = joindre_justificatifs(seconde, [self.image()])
+        with self.captureOnCommitCallbacks(execute=True):
+            supprimer_operations_en_masse(OperationSortir, [seconde.pk])
+        self.assertFalse(Justificatif.objects.exists())
+        self.assertFalse(default_storage.exists(justificatif.fichier.name))
+
+    def test_envoi_simultane_sans_fichier_orphelin(self):
+        justificatif = enregistrer_justificatif(self.image())
+        dossier = os.path.dirname(justificatif.fichier.name)
+        # L'autre envoi n'était pas encore visible : copie renommée par le stockage puis contrainte d'unicité
+        exists = FileSystemStorage.exists
+        reponses = iter([False])
+
+        def existe(stockage, nom):
+            return next(reponses, exists(stockage, nom))
+
+        with mock.patch.object(QuerySet, 'first', return_value=None), mock.patch.object(FileSystemStorage, 'exists', existe):
+            self.assertEqual(enregistrer_justificatif(self.image()), justificatif)
+        self.assertEqual(default_storage.listdir(dossier)[1], [os.path.basename(justificatif.fichier.name)])
+
+
+class ChampsDynamiquesTests(CaisseTestCase):
+
+    def test_representation_complete_par_defaut(self):
+        self.sortie(10)
+        detail = self.client.get(
+            f'/api/caisse/categories/{self.categorie_sortie.pk}/detail/', HTTP_ACCEPT='application/json'
+        ).json()
+        self.assertEqual(detail['total_sorties'], 10)
+        self.assertEqual(len(detail['sorties']), 1)
+        self.assertIn('total_sorties', detail['sorties'][0]['categorie'])
+
+    def test_fields_et_expand_reduisent(self):
+        self.sortie(10)
+        url = f'/api/caisse/categories/{self.categorie_sortie.pk}/detail/'
+        for parametres, attendus in (
+            ('fields=id,name', {'id', 'name'}),
+            ('expand=', {'id', 'name', 'description', 'type'}),
+            ('expand=sorties', {'id', 'name', 'description', 'type', 'sorties'}),
+        ):
+            with self.subTest(parametres=parametres):
+                detail = self.client.get(f'{url}?{parametres}', HTTP_ACCEPT='application/json').json()
+                self.assertEqual(set(detail), attendus)
+
+
+class VersionsTests(DonneesCaisseMixin, TransactionTestCase):
+    # Écritures validées : les appels programmés par on_commit s'exécutent réellement
+
+    def test_une_invalidation_par_transaction(self):
+        with mock.patch('caisse.versions._incrementer') as incrementer:
+            with transaction.atomic():
+                ids = [self.sortie(10).pk for _ in range(5)]
+                self.categorie_sortie.save()
+                supprimer_operations_en_masse(OperationSortir, ids)
+        self.assertEqual(sorted(appel.args for appel in incrementer.call_args_list), [('operations',), ('referentiel',)])
+
+    def test_transaction_annulee(self):
+        with mock.patch('caisse.versions._incrementer') as incrementer:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        versions.invalider('operations')
+                        raise ValueError
+                except ValueError:
+                    pass
+                versions.invalider('operations')
+            incrementer.assert_called_once_with('operations')
+            with self.assertRaises(ValueError), transaction.atomic():
+                versions.invalider('operations')
+                raise ValueError
+            with transaction.atomic():
+                versions.invalider('operations')
+        self.assertEqual(incrementer.call_count, 2)
+
+    def test_invalidation_hors_du_point_annule(self):
+        with mock.patch('caisse.versions._incrementer') as incrementer:
+            with transaction.atomic():
+                versions.invalider('referentiel')
+                with self.assertRaises(ValueError), transaction.atomic():
+                    versions.invalider('operations')
+                    raise ValueError
+            # L'incrément programmé avant le point de sauvegarde annulé reste dû
+            incrementer.assert_called_once_with('referentiel')
+
+    def test_tableau_bord_change_de_jour(self):
+        url = '/api/caisse/tableau-bord/resume/'
+        self.sortie(10)
+        etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Sans aucune écriture, la fenêtre des 12 derniers mois glisse le lendemain
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            reponse = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+
+
+def debits(**taux):
+    """REST_FRAMEWORK avec les débits `taux` (ex. export='2/hour') à la place de ceux de l'environnement."""
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **taux},
+    })
+
+
+class LimitationTests(CaisseTestCase):
+
+    @debits(export='2/hour')
+    def test_export_limite(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post('/caisse/export-sortie/excel/', {'export_all': '1'}).status_code, 200)
+        reponse = self.client.post('/caisse/export-sortie/excel/', {'export_all': '1'})
+        self.assertEqual(reponse.status_code, 429)
+        self.assertGreaterEqual(int(reponse['Retry-After']), 1)
+
+    @debits(connexion='2/min')
+    def test_essais_de_mot_de_passe_limites(self):
+        for _ in range(2):
+            reponse = self.envoyer('POST', '/api/token/', {'username': 'admin', 'password': 'faux'})
+            self.assertEqual(reponse.status_code, 401)
+        reponse = self.envoyer('POST', '/api/token/', {'username': 'admin', 'password': 'motdepasse'})
+        self.assertEqual(reponse.status_code, 429)
+        self.assertIn('Retry-After', reponse)
+
+    @debits(lourd='1/min')
+    def test_api_limitee_par_portee(self):
+        url = '/api/caisse/tableau-bord/resume/'
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json').status_code, 200)
+        reponse = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(reponse.status_code, 429)
+        self.assertTrue(1 <= int(reponse['Retry-After']) <= 60)
+        # Compteur par vue : les listes (portée 'lecture') restent accessibles
+        self.assertEqual(self.client.get('/api/caisse/categories/', HTTP_ACCEPT='application/json').status_code, 200)
+
+
+class JetonsTests(CaisseTestCase):
+    url = '/api/caisse/operations-sortir/'
+
+    def setUp(self):
+        super().setUp()
+        # Client machine : pas de session
+        self.client.logout()
+
+    def test_jetons_et_acces_bearer(self):
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT='application/json').status_code, 401)
+        jetons = self.envoyer('POST', '/api/token/', {'username': 'admin', 'password': 'motdepasse'}).json()
+        self.assertEqual(self.envoyer('POST', '/api/token/verify/', {'token': jetons['access']}).status_code, 200)
+        self.assertEqual(self.envoyer('POST', '/api/token/verify/', {'token': 'invalide'}).status_code, 401)
+        reponse = self.client.get(self.url, HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=f"Bearer {jetons['access']}")
+        self.assertEqual(reponse.status_code, 200)
+        # Nouveau jeton d'accès à partir du jeton de rafraîchissement
+        acces = self.envoyer('POST', '/api/token/refresh/', {'refresh': jetons['refresh']}).json()['access']
+        reponse = self.client.get(self.url, HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=f'Bearer {acces}')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(self.envoyer('POST', '/api/token/refresh/', {'refresh': jetons['access']}).status_code, 401)
+
+    def test_authentification_basic_refusee(self):
+        identifiants = base64.b64encode(b'admin:motdepasse').decode()
+        reponse = self.client.get(self.url, HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=f'Basic {identifiants}')
+        self.assertEqual(reponse.status_code, 401)
+
+
+@override_settings(CAISSE_DELAI_STABILITE=0)
+class ChangementsTests(CaisseTestCase):
+    url = '/api/caisse/changes/'
+
+    def lire(self, curseur, **parametres):
+        reponse = self.client.get(self.url, {'since': curseur, **parametres}, HTTP_ACCEPT='application/json')
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.json()
+
+    def test_changements_depuis_le_curseur(self):
+        curseur = self.lire('courant')['curseur']
+        sortie = self.sortie(10)
+        sortie.montant = 20
+        sortie.save()
+        pk = sortie.pk
+        sortie.delete()
+        page = self.lire(curseur)
+        self.assertEqual(
+            [(changement['ressource'], changement['id'], changement['type']) for changement in page['changements']],
+            [('sorties', pk, 'creation'), ('sorties', pk, 'modification'), ('sorties', pk, 'suppression')],
+        )
+        self.assertFalse(page['suite'])
+        self.assertEqual(self.lire(page['curseur'])['changements'], [])
+
+    def test_pagination(self):
+        curseur = self.lire('courant')['curseur']
+        attendus = [self.sortie(10).pk, self.entree(20).pk, self.sortie(30).pk]
+        Fournisseur.objects.create(name='Total', contact='0330000000')
+        recus = []
+        while True:
+            page = self.lire(curseur, limite=2)
+            recus += [(changement['ressource'], changement['id']) for changement in page['changements']]
+            curseur = page['curseur']
+            if not page['suite']:
+                break
+        self.assertEqual(len(recus), 4)
+        self.assertEqual(len(set(recus)), 4)
+        self.assertEqual([pk for ressource, pk in recus if ressource != 'fournisseurs'], attendus)
+
+    def test_changement_trop_recent(self):
+        curseur = self.lire('courant')['curseur']
+        self.sortie(10)
+        with override_settings(CAISSE_DELAI_STABILITE=60):
+            page = self.lire(curseur)
+        # Ni livré, ni dépassé par le curseur : il le sera au passage suivant
+        self.assertEqual((page['changements'], page['curseur']), ([], curseur))
+        self.assertEqual(len(self.lire(curseur)['changements']), 1)
+
+    def test_curseur_invalide(self):
+        for curseur in ('%%%', 'bm9u', 'WzFd'):
+            with self.subTest(curseur=curseur):
+                reponse = self.client.get(self.url, {'since': curseur}, HTTP_ACCEPT='application/json')
+                self.assertEqual(reponse.status_code, 400)
+
+
+@override_settings(DELESTAGE={'export': {
+    'concurrence': 1, 'attente': 0, 'retry_after': 7,
+    'vues': ['caisse:generer_excel_operations_sorties'],
+}})
+class DelestageTests(CaisseTestCase):
+    url = '/caisse/export-sortie/excel/'
+
+    def test_place_liberee_apres_chaque_requete(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post(self.url, {'export_all': '1'}).status_code, 200)
+        self.assertIsNone(coordination.get('delestage:export:0'))
+
+    def test_surcharge(self):
+        # Place occupée par une exportation en cours dans un autre worker
+        coordination.set('delestage:export:0', 'autre', timeout=60)
+        reponse = self.client.post(self.url, {'export_all': '1'})
+        self.assertEqual((reponse.status_code, reponse['Retry-After']), (503, '7'))
+        # Les autres vues n'ont pas de limite de concurrence
+        self.assertEqual(self.client.get('/api/caisse/categories/', HTTP_ACCEPT='application/json').status_code, 200)
+        self.assertEqual(coordination.get('delestage:export:0'), 'autre')
+
+
+    def test_cache_de_coordination_atomique_exige(self):
+        self.assertEqual(coordination_atomique(None), [])
+        for url in ('filecache:///tmp/coordination', 'dummycache://'):
+            with self.subTest(url=url), override_settings(CACHES={**settings.CACHES, 'coordination': environ.Env.cache_url_config(url)}):
+                self.assertEqual([erreur.id for erreur in coordination_atomique(None)], ['GPP.E001'])
+
+
+class ActionsEnMasseTests(CaisseTestCase):
+    url = '/caisse/operations/actions/'
+
+    def test_redirection_hors_site_refusee(self):
+        sortie = self.sortie(10)
+        for suivante, attendue in (('https://exemple.org/', '/caisse/listes/'), ('/caisse/sorties/', '/caisse/sorties/')):
+            with self.subTest(suivante=suivante):
+                reponse = self.client.post(self.url, {'selected_operations': [f'sortie-{sortie.pk}'], 'next': suivante})
+                self.assertRedirects(reponse, attendue, fetch_redirect_response=False)
+
+    def test_identifiant_sans_type_ignore(self):
+        entree, sortie = self.entree(100), self.sortie(10)
+        self.assertEqual(entree.pk, sortie.pk)
+        self.client.post(self.url, {'selected_operations': [str(sortie.pk)], 'action_masse': 'supprimer'})
+        self.assertTrue(OperationEntrer.objects.filter(pk=entree.pk).exists())
+        self.assertTrue(OperationSortir.objects.filter(pk=sortie.pk).exists())
+
+    def test_suppression_tout_ou_rien(self):
+        entree, sortie = self.entree(100), self.sortie(10)
+        def supprimer(modele, ids, utilisateur=None):
+            if modele is OperationSortir:
+                raise SoldeInsuffisant('Échec sur les sorties.')
+            return supprimer_operations_en_masse(modele, ids, utilisateur)
+
+        with mock.patch('caisse.views.supprimer_operations_en_masse', side_effect=supprimer):
+            self.client.post(self.url, {
+                'selected_operations': [f'entree-{entree.pk}', f'sortie-{sortie.pk}'], 'action_masse': 'supprimer',
+            })
+        self.assertTrue(OperationEntrer.objects.filter(pk=entree.pk).exists())
+
+
+class EtiquettesTests(CaisseTestCase):
+
+    def test_etiqueter_redirection_hors_site_refusee(self):
+        sortie = self.sortie(10)
+        reponse = self.client.post('/caisse/operations/etiqueter/', {
+            'selected_operations': [f'sortie-{sortie.pk}'], 'tags': 'carburant', 'next': '//exemple.org/',
+        })
+        self.assertRedirects(reponse, '/caisse/listes/', fetch_redirect_response=False)
+        self.assertEqual(list(sortie.tags.values_list('name', flat=True)), ['carburant'])
+
+    def test_totaux_dates_invalides(self):
+        url = '/caisse/api/tags/totaux/'
+        self.assertEqual(self.client.get(url, {'debut': '2024-01-01', 'fin': '2024-12-31'}).status_code, 200)
+        for parametres in ({'debut': 'foo'}, {'fin': '2024-02-30'}):
+            with self.subTest(parametres=parametres):
+                self.assertEqual(self.client.get(url, parametres).status_code, 400)
@@ -31,14 +31,31 @@ urlpatterns = [
     # Opérations financières
     path('ajouts-entree/', views.ajouts_entree, name="ajouts_entree"),  # Ajoute une nouvelle entrée financière
     path('ajouts-sortie/', views.ajouts_sortie, name="ajouts_sortie"),  # Ajoute une nouvelle sortie financière
+    path('ajouts-<str:type_operation>/doublons/', views.verifier_doublons, name="verifier_doublons"),  # Vérifie les doublons probables avant enregistrement
     path('entrees/', views.liste_entrees, name='liste_entrees'),  # Affiche la liste des entrées financières
     path('sorties/', views.liste_sorties, name='liste_sorties'),  # Affiche la liste des sorties financières
     path('operations/modifier/entree/<int:pk>/', views.modifier_entree, name='modifier_entree'),  # Modifie une entrée financière existante
     path('operations/modifier/sortie/<int:pk>/', views.modifier_sortie, name='modifier_sortie'),  # Modifie une sortie financière existante
+    path('operations/sortie/<int:pk>/justificatifs/', views.joindre_justificatif, name='joindre_justificatif'),  # Joint des reçus à une sortie
+    path('operations/sortie/<int:pk>/justificatifs/<int:justificatif_pk>/retirer/', views.detacher_justificatif_sortie, name='detacher_justificatif'),  # Retire un reçu
+    path('justificatifs/<int:pk>/', views.fichier_justificatif, name='fichier_justificatif'),  # Fichier original d'un reçu
+    path('justificatifs/<int:pk>/miniature/', views.fichier_justificatif, {'miniature': True}, name='miniature_justificatif'),  # Miniature d'un reçu
     path('caisse/operations/supprimer_entrer/<int:pk>/', views.supprimer_entree, name="supprimer_entree"),  # Supprime une entrée financière
     path('caisse/operations/supprimer_sortir/<int:pk>/', views.supprimer_sortie, name="supprimer_sortie"),  # Supprime une sortie financière
 
     path('operations/', views.operations, name="operations"),  # Nouvelle URL
+
+    # Actions en masse et étiquettes
+    path('operations/actions/', views.actions_en_masse, name="actions_en_masse"),  # Suppression / recatégorisation / fournisseur en masse
+    path('operations/etiqueter/', views.etiqueter, name="etiqueter"),  # Étiquetage en masse des opérations cochées
+    path('api/tags/totaux/', views.totaux_tags, name="totaux_tags"),  # Totaux par étiquette
+
+    # Rapprochement bancaire
+    path('caisses/', views.caisses, name="caisses"),  # Soldes par caisse et création d'une caisse
+    path('caisses/transfert/', views.transferer, name="transferer"),  # Transfert entre deux caisses
+    path('paies/', views.comptabilisation_paies, name="comptabilisation_paies"),  # Fiches de paie payées à passer en sorties
+    path('rapprochements/', views.rapprochements, name="rapprochements"),  # Relevés importés et import d'un relevé
+    path('rapprochements/<int:pk>/', views.detail_releve, name="detail_releve"),  # Détail du rapprochement d'un relevé
     
     # Paramètres 
     path('parametres/', views.parametres, name="parametres"),
@@ -67,7 +84,13 @@ urlpatterns = [
     # API de vérification pour l'ajouts des opérations
     path('ajouter-element/', views.ajouter_element, name='ajouter_element'),
     
-    # Routes API pour la vérification
+    # Listes de référence en JSON paginé (chargées par les pages acteurs, catégories, bénéficiaires)
+    path('api/listes/<str:ressource>/', views.liste_json, name='liste_json'),
+    # Autocomplétion (recherche par préfixe sur les noms normalisés)
+    path('api/autocompletion/<str:ressource>/', views.autocompletion, name='autocompletion'),
+
+    # Routes API pour la vérification (verifier_references : toutes les lignes d'un formulaire en une requête)
+    path('api/verifier-references/', views.verifier_references, name='verifier_references'),
     path('api/verifier-categorie/<str:id>/', views.verifier_categorie, name='verifier_categorie'),
     path('api/verifier-beneficiaire/<str:id>/', views.verifier_beneficiaire, name='verifier_beneficiaire'),
     path('api/verifier-fournisseur/<str:id>/', views.verifier_fournisseur, name='verifier_fournisseur'),
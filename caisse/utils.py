@@ -0,0 +1,62 @@
+import calendar
+import hashlib
+import hmac
+from decimal import Decimal, InvalidOperation
+
+from GPP.normalisation import normaliser_texte
+
+
+def empreinte_operation(date, montant, description, fournisseur_id=None):
+    """
+    Empreinte d'une opération sur (date, montant, fournisseur, libellé normalisé).
+    Deux saisies du même reçu donnent la même empreinte, indexée en base.
+    """
+    try:
+        montant = Decimal(str(montant)).quantize(Decimal('1'))
+    except (InvalidOperation, ValueError):
+        montant = montant or ''
+    valeur = '|'.join([str(date)[:10], str(montant), str(fournisseur_id or ''), normaliser_texte(description)])
+    return hashlib.sha1(valeur.encode('utf-8')).hexdigest()
+
+
+def valeur_canonique(valeur):
+    """Représentation texte stable d'une valeur lue en base (indépendante du moteur SQL)."""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, Decimal):
+        return str(valeur.quantize(Decimal('0.01')))
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    return str(valeur)
+
+
+def hash_chaine(precedent, valeurs, cle=None):
+    """
+    Maillon de la chaîne d'intégrité : HMAC-SHA256 du maillon précédent et des valeurs
+    de l'opération. La clé reste hors de la base : modifier une ligne directement en SQL
+    ne permet pas de recalculer une chaîne valide.
+    """
+    if cle is None:
+        from django.conf import settings
+        cle = settings.CAISSE_CHAINE_CLE
+    message = '|'.join([precedent or ''] + [valeur_canonique(valeur) for valeur in valeurs])
+    return hmac.new(cle.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def ajouter_mois(depart, mois, jour=None):
+    """
+    Ajoute `mois` mois à une date en gardant le jour `jour` (par défaut celui de `depart`),
+    ramené au dernier jour du mois si besoin (31 janvier + 1 mois = 28 ou 29 février).
+    """
+    annee, mois_index = divmod(depart.month - 1 + mois, 12)
+    annee += depart.year
+    jour = jour or depart.day
+    return depart.replace(year=annee, month=mois_index + 1, day=min(jour, calendar.monthrange(annee, mois_index + 1)[1]))
+
+
+def bornes_prefixe(prefixe):
+    """
+    Bornes (début, fin) telles que « début <= texte < fin » équivaut à « texte commence par
+    prefixe » : une recherche par intervalle qui parcourt l'index, contrairement à LIKE sous SQLite.
+    """
+    return prefixe, prefixe[:-1] + chr(ord(prefixe[-1]) + 1)
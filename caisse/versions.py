@@ -0,0 +1,106 @@
+import hashlib
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+# Compteurs partagés par tous les workers (cache commun, voir CACHES), un par domaine de données :
+# 'referentiel' (catégories, fournisseurs, bénéficiaires, personnels) et 'operations' (entrées,
+# sorties, transferts, étiquettes). Chacun change à chaque écriture validée dans son domaine.
+CLE_VERSION = 'caisse:{domaine}:version'
+CLE_DATE = 'caisse:{domaine}:modifie'
+
+
+def version(domaine):
+    cle = CLE_VERSION.format(domaine=domaine)
+    valeur = cache.get(cle)
+    if valeur is None:
+        # Premier accès (ou cache vidé) : add() ne remplace pas la version posée entre-temps par un autre worker.
+        # Départ à l'heure courante (ms) : une version antérieure au vidage du cache ne peut pas revenir.
+        cache.add(cle, int(time.time() * 1000), timeout=None)
+        valeur = cache.get(cle)
+    return valeur
+
+
+def _incrementer(domaine):
+    cle = CLE_VERSION.format(domaine=domaine)
+    try:
+        cache.incr(cle)
+    except ValueError:
+        version(domaine)
+    cache.set(CLE_DATE.format(domaine=domaine), timezone.now().replace(microsecond=0), timeout=None)
+
+
+def _valider(connexion, domaine):
+    # Appelé après la validation : le domaine n'est plus en attente sur cette connexion
+    _, domaines = getattr(connexion, '_versions_en_attente', (None, set()))
+    domaines.discard(domaine)
+    _incrementer(domaine)
+
+
+def _en_attente(connexion):
+    """
+    Domaines dont l'incrément est déjà programmé dans la transaction en cours de `connexion`.
+    L'ensemble est lié à la liste des appels on_commit de la transaction : Django la remplace
+    à la validation, à l'annulation et au retour à un point de sauvegarde (qui peut retirer
+    l'appel programmé). L'ensemble repart alors vide, au pire un second incrément est programmé.
+    """
+    liste, domaines = getattr(connexion, '_versions_en_attente', (None, None))
+    if liste is not connexion.run_on_commit:
+        domaines = set()
+        connexion._versions_en_attente = (connexion.run_on_commit, domaines)
+    return domaines
+
+
+def invalider(domaine):
+    """
+    Change la version du domaine après la validation de la transaction en cours : un autre
+    worker ne peut pas recalculer (et garder) les données d'avant l'écriture sous la nouvelle version.
+    Une seule fois par transaction et par domaine : les signaux d'une suppression de 2000 lignes
+    ne programment qu'un incrément.
+    """
+    connexion = transaction.get_connection()
+    if not connexion.in_atomic_block:
+        # Hors transaction : l'écriture est déjà validée
+        _incrementer(domaine)
+        return
+    domaines = _en_attente(connexion)
+    if domaine in domaines:
+        return
+    domaines.add(domaine)
+    transaction.on_commit(partial(_valider, connexion, domaine))
+
+
+def debut_du_jour():
+    """Période des réponses calculées sur une fenêtre glissante (« les 12 derniers mois »)."""
+    return timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def conditionnel(*domaines, periode=None):
+    """
+    GET conditionnel d'une vue dont la réponse ne dépend que des `domaines` et de la requête :
+    ETag = empreinte (versions des domaines, utilisateur, chemin et paramètres, Accept),
+    Last-Modified = dernière écriture connue. Si le client a déjà cette version, la réponse 304
+    est rendue sans exécuter la vue (aucune requête SQL hormis l'authentification).
+    `periode` (ex. debut_du_jour) donne le début de la période courante quand la réponse dépend
+    aussi de la date : elle entre dans l'ETag et Last-Modified n'est jamais antérieur.
+    """
+    def etag(request, *args, **kwargs):
+        versions = '.'.join(str(version(domaine)) for domaine in domaines)
+        if periode is not None:
+            versions += f'|{periode().isoformat()}'
+        cle = f"{versions}|{request.user.pk}|{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return hashlib.sha1(cle.encode('utf-8')).hexdigest()
+
+    def derniere_modification(request, *args, **kwargs):
+        dates = [cache.get(CLE_DATE.format(domaine=domaine)) for domaine in domaines]
+        if not all(dates):
+            return None
+        if periode is not None:
+            dates.append(periode())
+        return max(dates)
+
+    return condition(etag_func=etag, last_modified_func=derniere_modification)
@@ -1,18 +1,19 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.core.serializers import serialize
-from django.db import models  # Ajoutez cette ligne
+from django.db import models, transaction  # Ajoutez cette ligne
 import json
 from decimal import Decimal
-from .models import Categorie, Personnel, Fournisseur, OperationEntrer, OperationSortir, Beneficiaire
+from .models import Categorie, Personnel, Fournisseur, OperationEntrer, OperationSortir, Beneficiaire, Tag, ReleveBancaire, Caisse, TransfertCaisse, Justificatif
 from .forms import FournisseurForm, PersonnelForm, CategorieForm, OperationEntrerForm, OperationSortirForm
 from django.db.models import Sum, Count
 from django.core.paginator import Paginator
 from django.db.models.functions import TruncYear, TruncMonth
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import timedelta
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
@@ -20,6 +21,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import update_session_auth_hash
 from django.template import loader
+from GPP.renderers import JsonResponse  # json.dumps remplacé par orjson, mêmes arguments
+from GPP.throttling import limiter
 import openpyxl
 from openpyxl import Workbook
 from datetime import datetime
@@ -30,15 +33,58 @@ from itertools import chain
 from operator import attrgetter
 from django.core.paginator import Paginator
 from .models import UserActivity
+from .services import cumuler_par_niveau, niveaux_categories, etiqueter_operations, totaux_par_tag
+from .services import modifier_operations_en_masse, supprimer_operations_en_masse, detecter_doublons
+from .services import soldes_par_caisse, consolider, transferts_nets, transferts_nets_par_mois
+from .services import comptabiliser_paies, paies_a_comptabiliser
+from .rapprochement import importer_releve, operations_non_rapprochees, rapprocher
+from .justificatifs import detacher_justificatif, joindre_justificatifs
+from .json_leger import LISTES, reponse_page_json
+from . import autocompletion as recherche_noms
+from .referentiel import referentiel
+from .versions import conditionnel
 from functools import wraps
 from babel.dates import format_date
 from django.db.models import F
+from django.core.exceptions import ValidationError
 
 User = get_user_model()
 
 def is_admin(user):
     return user.is_staff
 
+def get_niveau(valeur):
+    """Convertit le paramètre `niveau` (cumul par niveau de catégorie) en entier, ou None."""
+    return int(valeur) if valeur and valeur.isdigit() else None
+
+def get_caisse_id(valeur):
+    """Convertit le paramètre `caisse` (filtre par caisse physique) en entier, ou None (toutes les caisses)."""
+    return int(valeur) if valeur and valeur.isdigit() else None
+
+def get_operations_selectionnees(request):
+    """
+    Retourne les identifiants (entrées, sorties) cochés dans une liste.
+    Les cases de la liste combinée sont préfixées par leur type ("entree-12", "sortie-7") ;
+    sur les listes dédiées, le type est donné par le champ caché `type_operation`.
+    Un identifiant de type inconnu est ignoré : entrées et sorties ont des clés indépendantes,
+    le même numéro désigne deux opérations sans rapport.
+    """
+    type_operation = request.POST.get('type_operation')
+    ids = {'entree': [], 'sortie': []}
+    for valeur in request.POST.getlist('selected_operations'):
+        type_ligne, _, pk = valeur.rpartition('-')
+        type_ligne = type_ligne or type_operation
+        if pk.isdigit() and type_ligne in ids:
+            ids[type_ligne].append(int(pk))
+    return ids['entree'], ids['sortie']
+
+def url_de_retour(request, defaut='caisse:listes'):
+    """Page de retour `next` du formulaire si elle est sur ce site, sinon l'URL nommée `defaut`."""
+    suivante = request.POST.get('next') or request.GET.get('next')
+    if suivante and url_has_allowed_host_and_scheme(suivante, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        return suivante
+    return reverse(defaut)
+
 def superuser_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
@@ -48,6 +94,9 @@ def superuser_required(view_func):
     return _wrapped_view
 
 # Vues principales
+# Pas de GET conditionnel (versions.conditionnel) sur le tableau de bord : la mise en page affiche
+# les messages flash, consommés au rendu, et la photo du profil, hors des domaines versionnés ;
+# un 304 réafficherait une page gardée par le navigateur avec des messages périmés.
 @login_required
 def index(request):
     """Vue du tableau de bord"""
@@ -55,24 +104,34 @@ def index(request):
     
     # Obtenir l'année sélectionnée (par défaut, l'année en cours)
     selected_year = int(request.GET.get('year', today.year))
+    # Niveau de cumul des catégories (vide = catégories détaillées)
+    niveau = get_niveau(request.GET.get('niveau'))
+    # Caisse affichée (vide = vue consolidée de toutes les caisses)
+    caisse_id = get_caisse_id(request.GET.get('caisse'))
+    entrees = OperationEntrer.objects.all()
+    sorties = OperationSortir.objects.all()
+    if caisse_id:
+        # Les requêtes passent par les index (caisse, date) : les autres caisses ne sont pas lues
+        entrees = entrees.filter(caisse_id=caisse_id)
+        sorties = sorties.filter(caisse_id=caisse_id)
     
     # Calculer le premier et dernier jour de l'année sélectionnée
     first_day_of_year = datetime(selected_year, 1, 1)
     last_day_of_year = datetime(selected_year, 12, 31)
     
     # Calculer les totaux de l'année sélectionnée
-    total_entrees_mois = OperationEntrer.objects.filter(
+    total_entrees_mois = entrees.filter(
         date_transaction__gte=first_day_of_year,
         date_transaction__lte=last_day_of_year
     ).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
 
-    total_sorties_mois = OperationSortir.objects.filter(
+    total_sorties_mois = sorties.filter(
         date_de_sortie__gte=first_day_of_year,
         date_de_sortie__lte=last_day_of_year
     ).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
     
     # Données des entrées par mois pour l'année sélectionnée
-    entrees_par_mois = list(OperationEntrer.objects.filter(
+    entrees_par_mois = list(entrees.filter(
         date_transaction__gte=first_day_of_year,
         date_transaction__lte=last_day_of_year
     ).annotate(
@@ -82,7 +141,7 @@ def index(request):
     ).order_by('mois'))
 
     # Données des sorties par mois pour l'année sélectionnée
-    sorties_par_mois = list(OperationSortir.objects.filter(
+    sorties_par_mois = list(sorties.filter(
         date_de_sortie__gte=first_day_of_year,
         date_de_sortie__lte=last_day_of_year
     ).annotate(
@@ -106,17 +165,24 @@ def index(request):
     
     # Calculer le solde initial
     solde_initial = (
-        OperationEntrer.objects.filter(date_transaction__lt=first_day_of_year).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
+        entrees.filter(date_transaction__lt=first_day_of_year).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
     ) - (
-        OperationSortir.objects.filter(date_de_sortie__lt=first_day_of_year).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
+        sorties.filter(date_de_sortie__lt=first_day_of_year).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
     )
     
+    # Transferts entre caisses : neutres en vue consolidée, à compter pour une caisse donnée
+    transferts_dict = {}
+    if caisse_id:
+        solde_initial += transferts_nets(caisse_id, fin=(first_day_of_year - timedelta(days=1)).date())
+        transferts_dict = transferts_nets_par_mois(caisse_id, first_day_of_year, last_day_of_year)
+        all_months = sorted(set(all_months) | set(transferts_dict))
+
     solde_cumule = solde_initial
 
     for mois_str in all_months:
         entree_mois = entrees_dict.get(mois_str, Decimal('0'))
         sortie_mois = sorties_dict.get(mois_str, Decimal('0'))
-        solde_mois = entree_mois - sortie_mois
+        solde_mois = entree_mois - sortie_mois + transferts_dict.get(mois_str, Decimal('0'))
         solde_cumule += solde_mois
         
         # Convertir la chaîne de date en objet datetime pour le formatage
@@ -137,18 +203,23 @@ def index(request):
         })
 
     # Données pour le graphique des catégories de sorties
-    sorties_categories = list(OperationSortir.objects.filter(
+    sorties_annee = sorties.filter(
         date_de_sortie__gte=first_day_of_year,
         date_de_sortie__lte=last_day_of_year
-    ).values(
-        'categorie__name'
-    ).annotate(
-        total=Sum('montant')
-    ).order_by('-total')[:5])
+    )
+    if niveau is not None:
+        # Cumul des sous-catégories sur leur catégorie du niveau choisi
+        sorties_categories = list(cumuler_par_niveau(sorties_annee, niveau, total=Sum('montant'))[:5])
+    else:
+        sorties_categories = list(sorties_annee.values(
+            categorie_nom=F('categorie__name')
+        ).annotate(
+            total=Sum('montant')
+        ).order_by('-total')[:5])
 
     # Formater les données des catégories
     formatted_categories = [{
-        'categorie': item['categorie__name'],
+        'categorie': item['categorie_nom'],
         'total': float(item['total'] or Decimal('0'))
     } for item in sorties_categories]
 
@@ -160,8 +231,18 @@ def index(request):
     years = range(today.year - 5, today.year + 1)  # Par exemple, les 5 dernières années
 
     # Formater les données pour le template
+    # Soldes tenus par caisse et totaux de l'année par caisse (agrégats groupés, sans relire les lignes)
+    soldes_caisses = soldes_par_caisse(first_day_of_year, last_day_of_year)
+    if selected_year != today.year:
+        solde_actuel = solde_cumule
+    elif caisse_id:
+        solde_actuel = next((ligne['solde'] for ligne in soldes_caisses if ligne['caisse'].pk == caisse_id), Decimal('0'))
+    else:
+        # Vue consolidée : somme des soldes tenus par chaque caisse
+        solde_actuel = consolider(soldes_caisses)['solde']
+
     context = {
-        'solde_actuel': float(solde_cumule),
+        'solde_actuel': float(solde_actuel),
         'total_entrees': float(total_entrees_mois),  # Total des entrées de l'année sélectionnée
         'total_sorties': float(total_sorties_mois),  # Total des sorties de l'année sélectionnée
         'entrees_par_mois': json.dumps(formatted_entrees),
@@ -171,6 +252,11 @@ def index(request):
         'entrees_4_mois': json.dumps(formatted_entrees[-4:][::-1]) if formatted_entrees else json.dumps([]),
         'years': years,
         'selected_year': selected_year,
+        'niveaux': niveaux_categories(),
+        'niveau': niveau,
+        'caisses': [ligne['caisse'] for ligne in soldes_caisses],
+        'caisse_id': caisse_id,
+        'soldes_caisses': soldes_caisses if len(soldes_caisses) > 1 else [],
     }
 
     return render(request, "caisse/dashboard.html", context)
@@ -182,18 +268,15 @@ def operations(request):
     """
     Affiche la page des opérations.
     """
-    categories = Categorie.objects.all()
-    categories_entree = Categorie.objects.filter(type='entree')
-    categories_sortie = Categorie.objects.filter(type='sortie')
-    beneficiaires = Beneficiaire.objects.all()
-    fournisseurs = Fournisseur.objects.all()
+    # Listes déroulantes servies par le référentiel en cache (aucune requête tant qu'il est à jour) ;
+    # bénéficiaires et fournisseurs sont proposés par l'autocomplétion
+    donnees = referentiel()
 
     return render(request, "caisse/operations/entre-sortie.html", {
-        'categories': categories,
-        'categories_entree': categories_entree,
-        'categories_sortie': categories_sortie,
-        'beneficiaires': beneficiaires,
-        'fournisseurs': fournisseurs,
+        'categories': donnees['categories'],
+        'categories_entree': donnees['categories_entree'],
+        'categories_sortie': donnees['categories_sortie'],
+        'caisses': Caisse.objects.order_by('pk'),
         })
 
 @login_required
@@ -201,13 +284,37 @@ def categories(request):
     """
     Affiche la liste des catégories.
     """
-    categories = Categorie.objects.all()
-    categories_json = json.loads(serialize('json', categories))
-    
-    context = {
-        'categories': json.dumps([{**item['fields'], 'id': item['pk']} for item in categories_json]),
-    }
-    return render(request, "caisse/categories/categories.html", context)
+    # La liste est chargée par la page depuis liste_json (pages de LIMITE_PAR_DEFAUT catégories)
+    return render(request, "caisse/categories/categories.html")
+
+@login_required
+@conditionnel('referentiel')
+def liste_json(request, ressource):
+    """
+    Page JSON d'une liste de référence (personnels, fournisseurs, catégories, bénéficiaires),
+    encodée en flux depuis values() ; `?apres=<id>` donne la page suivante.
+    """
+    if ressource not in LISTES:
+        raise Http404("Liste inconnue.")
+    queryset = None
+    if ressource == 'categories' and request.GET.get('type') in ('entree', 'sortie'):
+        queryset = Categorie.objects.filter(type=request.GET['type'])
+    return reponse_page_json(request, ressource, queryset)
+
+@login_required
+def autocompletion(request, ressource):
+    """
+    Suggestions de saisie : les premiers noms de `ressource` commençant par `?q=`
+    (sans accents ni majuscules), au plus `?limite=` ; `?type=` restreint les catégories.
+    """
+    if ressource not in recherche_noms.SOURCES:
+        raise Http404("Liste inconnue.")
+    limite = request.GET.get('limite', '')
+    limite = min(int(limite), recherche_noms.LIMITE_MAXIMALE) if limite.isdigit() and int(limite) > 0 else recherche_noms.LIMITE_PAR_DEFAUT
+    filtres = {}
+    if ressource == 'categories' and request.GET.get('type') in ('entree', 'sortie'):
+        filtres['type'] = request.GET['type']
+    return JsonResponse({'resultats': recherche_noms.rechercher(ressource, request.GET.get('q', ''), limite, **filtres)})
 
 @login_required
 def listes(request):
@@ -219,6 +326,7 @@ def listes(request):
     categorie_id = request.GET.get('categorie')
     beneficiaire_id = request.GET.get('beneficiaire')
     fournisseur_id = request.GET.get('fournisseur')
+    tag_id = request.GET.get('tag')
     mois = request.GET.get('mois')  # Récupérer le mois sélectionné
     sort_by = request.GET.get('sort', 'date')
     ordre = request.GET.get('order', 'desc')
@@ -240,8 +348,9 @@ def listes(request):
     ]
 
     # Initialiser les queryset avec tri par défaut
-    entree = OperationEntrer.objects.all().order_by('-date_transaction')
-    sortie = OperationSortir.objects.all().order_by('-date_de_sortie')
+    # Jointures de tout ce que le template affiche : nombre de requêtes indépendant du nombre de lignes
+    entree = OperationEntrer.objects.select_related('categorie').order_by('-date_transaction')
+    sortie = OperationSortir.objects.select_related('categorie', 'beneficiaire', 'fournisseur').order_by('-date_de_sortie')
 
     # Appliquer les filtres de recherche
     if query:
@@ -269,6 +378,17 @@ def listes(request):
     if fournisseur_id and fournisseur_id.isdigit():  # Vérifier que c'est un nombre
         sortie = sortie.filter(fournisseur_id=fournisseur_id)
 
+    # Filtre par étiquette (index de la table de liaison)
+    if tag_id and tag_id.isdigit():
+        entree = entree.filter(tags=tag_id)
+        sortie = sortie.filter(tags=tag_id)
+
+    # Filtre par caisse (index (caisse, date))
+    caisse_id = get_caisse_id(request.GET.get('caisse'))
+    if caisse_id:
+        entree = entree.filter(caisse_id=caisse_id)
+        sortie = sortie.filter(caisse_id=caisse_id)
+
     # Filtre par mois
     if mois and mois.isdigit():  # Vérifier que c'est un nombre
         entree = entree.filter(date_transaction__month=int(mois))
@@ -290,16 +410,22 @@ def listes(request):
     # Contexte à passer au template
     context = {
         'page_obj': page_obj,
-        'categories': Categorie.objects.all(),
-        'beneficiaires': Beneficiaire.objects.all(),
-        'fournisseurs': Fournisseur.objects.all(),
+        # Filtres en autocomplétion : seul le libellé de la valeur choisie est chargé
+        'categorie_libelle': recherche_noms.libelle('categories', categorie_id),
+        'beneficiaire_libelle': recherche_noms.libelle('beneficiaires', beneficiaire_id),
+        'fournisseur_libelle': recherche_noms.libelle('fournisseurs', fournisseur_id),
+        'tags': Tag.objects.all(),
         'lignes_par_page': lignes_par_page,
         'query': query,
         'categorie_id': categorie_id,
         'beneficiaire_id': beneficiaire_id,
         'fournisseur_id': fournisseur_id,
+        'tag_id': tag_id,
+        'caisses': Caisse.objects.order_by('pk'),
+        'caisse_id': caisse_id,
         'mois_liste': mois_liste,
         'mois': mois,
+        'niveaux': niveaux_categories(),
     }
     return render(request, 'caisse/listes/listes_operations.html', context)
 
@@ -310,6 +436,8 @@ def depenses(request):
     """
     # Récupérer le mois sélectionné
     mois_selectionne = request.GET.get('mois', timezone.now().strftime('%Y-%m'))
+    # Niveau de cumul des catégories (vide = catégories détaillées)
+    niveau = get_niveau(request.GET.get('niveau'))
     
     try:
         date_debut = timezone.datetime.strptime(f"{mois_selectionne}-01", '%Y-%m-%d')
@@ -335,12 +463,22 @@ def depenses(request):
     ).order_by('-total_depenses')
 
     # Dépenses par catégorie
-    depenses_par_categorie = operations.values(
-        'categorie__name'
-    ).annotate(
-        total_depenses=Sum('montant'),
-        nombre_depenses=Count('id')
-    ).order_by('-total_depenses')
+    if niveau is not None:
+        depenses_par_categorie = [
+            {**depense, 'categorie__name': depense['categorie_nom']}
+            for depense in cumuler_par_niveau(
+                operations, niveau,
+                total_depenses=Sum('montant'),
+                nombre_depenses=Count('id')
+            )
+        ]
+    else:
+        depenses_par_categorie = operations.values(
+            'categorie__name'
+        ).annotate(
+            total_depenses=Sum('montant'),
+            nombre_depenses=Count('id')
+        ).order_by('-total_depenses')
 
     # Couleurs pour les catégories
     colors = [
@@ -374,6 +512,8 @@ def depenses(request):
         'depenses_par_annee': depenses_par_annee,
         'mois_selectionne': mois_selectionne,
         'mois_liste': mois_liste,
+        'niveaux': niveaux_categories(),
+        'niveau': niveau,
     }
     return render(request, "caisse/depenses/depense.html", context)
 
@@ -384,22 +524,8 @@ def acteurs(request):
     """
     Affiche la page des acteurs (personnels, fournisseurs, catégories).
     """
-    personnels = Personnel.objects.all()
-    fournisseurs = Fournisseur.objects.all()
-    categories = Categorie.objects.all()
-    
-    personnels_json = json.loads(serialize('json', personnels))
-    fournisseurs_json = json.loads(serialize('json', fournisseurs))
-    categories_entrees = json.loads(serialize('json', categories.filter(type='entree')))
-    categories_sorties = json.loads(serialize('json', categories.filter(type='sortie')))
-    
-    context = {
-        'personnels': json.dumps([{**item['fields'], 'id': item['pk']} for item in personnels_json]),
-        'fournisseurs': json.dumps([{**item['fields'], 'id': item['pk']} for item in fournisseurs_json]),
-        'categories_entrees': json.dumps([{**item['fields'], 'id': item['pk']} for item in categories_entrees]),
-        'categories_sorties': json.dumps([{**item['fields'], 'id': item['pk']} for item in categories_sorties]),
-    }
-    return render(request, "caisse/acteurs/acteurs.html", context)
+    # Les listes sont chargées par la page, page par page, depuis liste_json
+    return render(request, "caisse/acteurs/acteurs.html")
 
 @login_required
 def ajouter_acteur(request):
@@ -515,8 +641,14 @@ def modifier_categorie(request, pk):
     categorie.name = data.get('name', categorie.name)
     categorie.description = data.get('description', categorie.description)
     categorie.type = data.get('type', categorie.type)
-    
-    categorie.save()
+    if 'parent' in data:
+        categorie.parent_id = data['parent'] or None
+
+    try:
+        categorie.clean()
+        categorie.save()
+    except (ValidationError, Categorie.DoesNotExist) as e:
+        return JsonResponse({'success': False, 'error': ' '.join(getattr(e, 'messages', [str(e)]))}, status=400)
     # Enregistrement de l'activité
     UserActivity.objects.create(user=request.user, action='Modification', description='a modifier une catégorie')
     return JsonResponse({
@@ -525,7 +657,9 @@ def modifier_categorie(request, pk):
             'id': categorie.id,
             'name': categorie.name,
             'description': categorie.description,
-            'type': categorie.type
+            'type': categorie.type,
+            'parent': categorie.parent_id,
+            'niveau': categorie.niveau,
         }
     })
 
@@ -540,103 +674,235 @@ def supprimer_categorie(request, pk):
 
 # Gestion des opérations
 
+# Champs de chaque ligne du formulaire multi-lignes, et modèle (attribut affiché) des références
+CHAMPS_LIGNES = {
+    'entree': ('date', 'designation', 'montant', 'categorie'),
+    'sortie': ('date', 'designation', 'beneficiaire', 'fournisseur', 'quantite', 'prixUnitaire', 'categorie'),
+}
+REFERENCES_LIGNES = {
+    'categorie': (Categorie, 'name'),
+    'beneficiaire': (Beneficiaire, 'nom_affiche'),
+    'fournisseur': (Fournisseur, 'name'),
+}
+
+def verifier_colonnes(*colonnes):
+    """
+    Les colonnes du formulaire multi-lignes doivent avoir autant de valeurs les unes que les autres :
+    sinon les valeurs d'une ligne seraient associées à celles d'une autre.
+    """
+    if len({len(colonne) for colonne in colonnes}) > 1:
+        raise ValueError("Formulaire incomplet : toutes les lignes doivent avoir tous leurs champs.")
+
+def lignes_saisies(post, operation):
+    """
+    Lignes du formulaire telles que saisies, avec le nom des références choisies,
+    pour le réafficher rempli quand l'enregistrement est refusé (doublons, solde...).
+    """
+    champs = CHAMPS_LIGNES[operation]
+    lignes = [dict(zip(champs, valeurs)) for valeurs in zip(*(post.getlist(champ) for champ in champs))]
+    for champ, (modele, attribut) in REFERENCES_LIGNES.items():
+        if champ not in champs:
+            continue
+        objets = modele.objects.in_bulk([ligne[champ] for ligne in lignes if ligne[champ].isdigit()])
+        for ligne in lignes:
+            objet = objets.get(int(ligne[champ])) if ligne[champ].isdigit() else None
+            ligne[f'{champ}_nom'] = getattr(objet, attribut) if objet else ''
+    for ligne in lignes:
+        if operation == 'sortie':
+            try:
+                ligne['prixTotal'] = float(ligne['quantite']) * float(ligne['prixUnitaire'])
+            except ValueError:
+                ligne['prixTotal'] = ''
+    return lignes
+
+def lire_lignes_entrees(post):
+    """
+    Construit les opérations d'entrée (non enregistrées) à partir du formulaire multi-lignes.
+    """
+    caisse_id = get_caisse_id(post.get('caisse'))
+    dates = post.getlist('date')
+    designations = post.getlist('designation')
+    montants = post.getlist('montant')
+    categories_ids = post.getlist('categorie')
+    verifier_colonnes(dates, designations, montants, categories_ids)
+    categories = Categorie.objects.filter(type='entree').in_bulk([c for c in categories_ids if c.isdigit()])
+
+    lignes = []
+    for i in range(len(dates)):
+        categorie = categories.get(int(categories_ids[i])) if categories_ids[i].isdigit() else None
+        if categorie is None:
+            raise ValueError(f"Catégorie invalide à la ligne {i + 1}.")
+        lignes.append(OperationEntrer(
+            date_transaction=dates[i],
+            description=designations[i],
+            montant=float(montants[i]),
+            categorie=categorie,
+            caisse_id=caisse_id
+        ))
+    return lignes
+
+def lire_lignes_sorties(post):
+    """
+    Construit les opérations de sortie (non enregistrées) à partir du formulaire multi-lignes.
+    """
+    dates = post.getlist('date')
+    designations = post.getlist('designation')
+    beneficiaires_ids = post.getlist('beneficiaire')
+    fournisseurs_ids = post.getlist('fournisseur')
+    quantites = post.getlist('quantite')
+    prix_unitaires = post.getlist('prixUnitaire')
+    categories_ids = post.getlist('categorie')
+    caisse_id = get_caisse_id(post.get('caisse'))
+    verifier_colonnes(dates, designations, beneficiaires_ids, fournisseurs_ids, quantites, prix_unitaires, categories_ids)
+
+    lignes = []
+    for i in range(len(dates)):
+        try:
+            # Validation de base des données
+            if not dates[i] or not designations[i] or not beneficiaires_ids[i] or not fournisseurs_ids[i]:
+                raise ValueError("Tous les champs doivent être remplis.")
+
+            date_operation = datetime.strptime(dates[i], '%Y-%m-%d').date()
+            quantite = int(quantites[i])
+            prix_unitaire = float(prix_unitaires[i])
+
+            if quantite <= 0 or prix_unitaire < 0:
+                raise ValueError("Quantité et prix unitaire doivent être positifs.")
+
+            lignes.append(OperationSortir(
+                date_de_sortie=date_operation,
+                description=designations[i],
+                beneficiaire_id=int(beneficiaires_ids[i]),
+                fournisseur_id=int(fournisseurs_ids[i]),
+                quantite=quantite,
+                montant=quantite * prix_unitaire,
+                categorie_id=int(categories_ids[i]),
+                caisse_id=caisse_id
+            ))
+        except (ValueError, IndexError) as e:
+            raise ValueError(f"Erreur à la ligne {i + 1} : {e}")
+    return lignes
+
+def decrire_doublons(doublons, lignes):
+    """
+    Liste lisible des doublons détectés, pour la confirmation de saisie.
+    """
+    resultat = []
+    for index, existante in doublons:
+        ligne = lignes[index]
+        resultat.append({
+            'ligne': index + 1,
+            'description': ligne.description,
+            'montant': float(ligne.montant),
+            'existante': existante.pk if existante else None,
+            'date_saisie': existante.date.strftime('%d/%m/%Y') if existante else None,
+        })
+    return resultat
+
+def message_doublons(doublons):
+    details = ', '.join(
+        f"ligne {d['ligne']} ({d['description']} : {d['montant']:,.0f} Ar)".replace(',', ' ')
+        for d in doublons
+    )
+    return f"Doublon(s) probable(s) : {details}. Confirmez pour enregistrer malgré tout."
+
+@login_required
+@require_POST
+def verifier_doublons(request, type_operation):
+    """
+    Vérifie en une seule requête si des lignes du formulaire ont déjà été saisies.
+    """
+    modele, lire_lignes = {
+        'entree': (OperationEntrer, lire_lignes_entrees),
+        'sortie': (OperationSortir, lire_lignes_sorties),
+    }.get(type_operation, (None, None))
+    if modele is None:
+        return JsonResponse({'error': "Type d'opération inconnu"}, status=404)
+    try:
+        lignes = lire_lignes(request.POST)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'doublons': decrire_doublons(detecter_doublons(modele, lignes), lignes)})
+
 @login_required
 def ajouts_entree(request):
     """
     Gère l'ajout d'opérations d'entrée.
     """
-    categories_entree = Categorie.objects.filter(type='entree')
+    context = {
+        'categories_entree': referentiel()['categories_entree'],
+        'caisses': Caisse.objects.order_by('pk'),
+        'operation': 'entree',
+    }
     
     if request.method == 'POST' and 'date' in request.POST:
-        lignes_entrees = []
-        for i in range(len(request.POST.getlist('date'))):
-            date_operation = request.POST.getlist('date')[i]
-            designation = request.POST.getlist('designation')[i]
-            montant = request.POST.getlist('montant')[i]
-            categorie_id = request.POST.getlist('categorie')[i]
-    
-            try:
-                montant = float(montant)
-                categorie = Categorie.objects.get(id=categorie_id)
-    
-                operation_entree = OperationEntrer(
-                    date_transaction=date_operation,
-                    description=designation,
-                    montant=montant,
-                    categorie=categorie
-                )
+        try:
+            lignes_entrees = lire_lignes_entrees(request.POST)
+        except ValueError:
+            return render(request, 'caisse/operations/entre-sortie.html', {'error': 'Données invalides', **context})
+
+        # Doublons probables : on demande confirmation avant d'enregistrer
+        doublons = detecter_doublons(OperationEntrer, lignes_entrees)
+        if doublons and not request.POST.get('confirmer_doublons'):
+            messages.warning(request, message_doublons(decrire_doublons(doublons, lignes_entrees)))
+            context['lignes_saisies'] = lignes_saisies(request.POST, 'entree')
+            return render(request, 'caisse/operations/entre-sortie.html', context)
+
+        with transaction.atomic():
+            for operation_entree in lignes_entrees:
                 operation_entree.save()
                 # Enregistrement de l'activité
                 UserActivity.objects.create(user=request.user, action='Création', description='a ajouté une opération entrée')
-                lignes_entrees.append(operation_entree)
-            except (ValueError, Categorie.DoesNotExist):
-                return render(request, 'caisse/operations/entre-sortie.html', {'error': 'Données invalides', 'categories_entree': categories_entree})
         messages.success(request, "Le(s) opération(s) d'entrée a (ont) été ajoutée(s) avec succès.")    
         return redirect('caisse:liste_entrees')
 
-    return render(request, 'caisse/operations/entre-sortie.html', {'categories_entree': categories_entree, 'operation': 'entree',})
+    return render(request, 'caisse/operations/entre-sortie.html', context)
 
 @login_required
 def ajouts_sortie(request):
     """
-    Gère l'ajout d'opérations de sortie sans vérification.
+    Gère l'ajout d'opérations de sortie, avec détection des doublons de saisie.
     """
-    categories_sortie = Categorie.objects.filter(type='sortie') 
-    beneficiaires = Beneficiaire.objects.all()
-    fournisseurs = Fournisseur.objects.all()
+    context = {
+        'categories_sortie': referentiel()['categories_sortie'],
+        'caisses': Caisse.objects.order_by('pk'),
+        'operation': 'sortie',
+    }
 
     if request.method == 'POST':
-        dates = request.POST.getlist('date')
-        designations = request.POST.getlist('designation')
-        beneficiaires_ids = request.POST.getlist('beneficiaire')
-        fournisseurs_ids = request.POST.getlist('fournisseur')
-        quantites = request.POST.getlist('quantite')
-        prix_unitaires = request.POST.getlist('prixUnitaire')
-        categories_ids = request.POST.getlist('categorie')
-
-        for i in range(len(dates)):
-            try:
-                # Validation de base des données
-                if not dates[i] or not designations[i] or not beneficiaires_ids[i] or not fournisseurs_ids[i]:
-                    raise ValueError("Tous les champs doivent être remplis.")
-
-                date_operation = datetime.strptime(dates[i], '%Y-%m-%d').date()
-                quantite = int(quantites[i])
-                prix_unitaire = float(prix_unitaires[i])
-
-                if quantite <= 0 or prix_unitaire < 0:
-                    raise ValueError("Quantité et prix unitaire doivent être positifs.")
-
-                # Création de l'opération
-                OperationSortir.objects.create(
-                    date_de_sortie=date_operation,
-                    description=designations[i],
-                    beneficiaire_id=int(beneficiaires_ids[i]),
-                    fournisseur_id=int(fournisseurs_ids[i]),
-                    quantite=quantite,
-                    montant=quantite * prix_unitaire,
-                    categorie_id=int(categories_ids[i])
-                )
+        # Toutes les lignes sont validées avant d'en enregistrer une seule
+        try:
+            lignes_sorties = lire_lignes_sorties(request.POST)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'caisse/operations/entre-sortie.html', context)
+
+        # Doublons probables (une requête pour tout le lot) : on demande confirmation
+        doublons = detecter_doublons(OperationSortir, lignes_sorties)
+        if doublons and not request.POST.get('confirmer_doublons'):
+            messages.warning(request, message_doublons(decrire_doublons(doublons, lignes_sorties)))
+            context['lignes_saisies'] = lignes_saisies(request.POST, 'sortie')
+            return render(request, 'caisse/operations/entre-sortie.html', context)
 
-            except Exception as e:
-                messages.error(request, f"Erreur à la ligne {i + 1} : {e}")
-                return render(request, 'caisse/operations/entre-sortie.html', {
-                    'categories_sortie': categories_sortie,
-                    'beneficiaires': beneficiaires,
-                    'fournisseurs': fournisseurs,
-                    'operation': 'sortie',
-                })
+        try:
+            with transaction.atomic():
+                for operation in lignes_sorties:
+                    operation.save()
+        except ValidationError as e:
+            # Ex. solde insuffisant quand le découvert est interdit
+            messages.error(request, ' '.join(e.messages))
+            context['lignes_saisies'] = lignes_saisies(request.POST, 'sortie')
+            return render(request, 'caisse/operations/entre-sortie.html', context)
+        except Exception as e:
+            messages.error(request, f"Erreur lors de l'enregistrement : {e}")
+            context['lignes_saisies'] = lignes_saisies(request.POST, 'sortie')
+            return render(request, 'caisse/operations/entre-sortie.html', context)
 
         # Ajout des opérations réussi
         messages.success(request, "Les opérations de sortie ont été ajoutées avec succès.")
         return redirect('caisse:liste_sorties')
 
-    return render(request, 'caisse/operations/entre-sortie.html', {
-        'categories_sortie': categories_sortie,
-        'beneficiaires': beneficiaires,
-        'fournisseurs': fournisseurs,
-        'operation': 'sortie',
-    })
+    return render(request, 'caisse/operations/entre-sortie.html', context)
 
 @login_required
 def modifier_entree(request, pk):
@@ -670,7 +936,7 @@ def modifier_entree(request, pk):
     # Préparer le contexte pour le template
     context = {
         'entree': entree,
-        'categories_entree': Categorie.objects.filter(type='entree'),
+        'categories_entree': referentiel()['categories_entree'],
     }
 
     # Rendre le template avec le contexte
@@ -679,8 +945,8 @@ def modifier_entree(request, pk):
 
 @login_required
 def modifier_sortie(request, pk):
-    # Récupérer l'opération de sortie spécifique
-    operation = get_object_or_404(OperationSortir, id=pk)
+    # Récupérer l'opération de sortie spécifique (libellés du bénéficiaire et du fournisseur joints)
+    operation = get_object_or_404(OperationSortir.objects.select_related('beneficiaire', 'fournisseur'), id=pk)
 
     if request.method == 'POST':
         # Récupérer les données du formulaire
@@ -713,9 +979,8 @@ def modifier_sortie(request, pk):
     # Préparer le contexte pour le template avec les options de sélection
     context = {
         'operation': operation,
-        'beneficiaires': Beneficiaire.objects.all(),
-        'fournisseurs': Fournisseur.objects.all(),
-        'categories_sortie': Categorie.objects.filter(type='sortie'),
+        'justificatifs': operation.justificatifs.all(),
+        'categories_sortie': referentiel()['categories_sortie'],
     }
 
     # Rendre le template avec le contexte
@@ -751,6 +1016,325 @@ def supprimer_sortie(request, pk):
     
     return redirect('caisse:listes')
 
+# Justificatifs des sorties
+@login_required
+@require_POST
+def joindre_justificatif(request, pk):
+    """
+    Rattache un ou plusieurs reçus (images ou PDF) à une sortie. Un fichier déjà
+    envoyé n'est stocké qu'une fois ; sa miniature est générée en arrière-plan.
+    """
+    operation = get_object_or_404(OperationSortir, pk=pk)
+    fichiers = request.FILES.getlist('fichiers')
+    if not fichiers:
+        messages.error(request, "Veuillez choisir au moins un fichier.")
+        return redirect('caisse:modifier_sortie', pk=pk)
+    try:
+        with transaction.atomic():
+            justificatifs = joindre_justificatifs(operation, fichiers)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('caisse:modifier_sortie', pk=pk)
+    UserActivity.objects.create(user=request.user, action='Modification', description='a joint un justificatif à une opération sortie')
+    messages.success(request, f"{len(justificatifs)} justificatif(s) joint(s).")
+    return redirect('caisse:modifier_sortie', pk=pk)
+
+@login_required
+@require_POST
+def detacher_justificatif_sortie(request, pk, justificatif_pk):
+    operation = get_object_or_404(OperationSortir, pk=pk)
+    justificatif = get_object_or_404(operation.justificatifs, pk=justificatif_pk)
+    with transaction.atomic():
+        detacher_justificatif(operation, justificatif)
+    messages.success(request, "Le justificatif a été retiré.")
+    return redirect('caisse:modifier_sortie', pk=pk)
+
+@login_required
+def fichier_justificatif(request, pk, miniature=False):
+    """
+    Sert le justificatif (ou sa miniature) en flux : FileResponse laisse le serveur WSGI
+    l'envoyer via wsgi.file_wrapper (sendfile) sans le copier en mémoire. Le nom du
+    fichier étant son empreinte, le contenu ne change jamais : cache navigateur d'un an.
+    """
+    justificatif = get_object_or_404(Justificatif.objects.only('empreinte', 'fichier', 'miniature', 'nom', 'type_mime'), pk=pk)
+    fichier = justificatif.miniature if miniature else justificatif.fichier
+    if not fichier:
+        raise Http404("Miniature pas encore disponible.")
+    etag = f'"{justificatif.empreinte}{"-m" if miniature else ""}"'
+    if request.headers.get('If-None-Match') == etag:
+        reponse = HttpResponseNotModified()
+    else:
+        reponse = FileResponse(
+            fichier.open('rb'), content_type='image/jpeg' if miniature else justificatif.type_mime,
+            filename=justificatif.nom,
+        )
+    reponse['ETag'] = etag
+    reponse['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return reponse
+
+# Actions en masse depuis les listes
+@login_required
+@require_POST
+def actions_en_masse(request):
+    """
+    Supprime, recatégorise ou change le fournisseur des opérations cochées.
+    Chaque action est un seul UPDATE/DELETE par table, dans une transaction.
+    """
+    ids_entrees, ids_sorties = get_operations_selectionnees(request)
+    action = request.POST.get('action_masse')
+    redirection = url_de_retour(request)
+
+    if not (ids_entrees or ids_sorties):
+        messages.error(request, "Veuillez sélectionner au moins une opération.")
+        return redirect(redirection)
+
+    if action == 'supprimer':
+        try:
+            # Les deux tables ensemble : un échec sur les sorties annule aussi la suppression des entrées
+            with transaction.atomic():
+                nombre = supprimer_operations_en_masse(OperationEntrer, ids_entrees, request.user)
+                nombre += supprimer_operations_en_masse(OperationSortir, ids_sorties, request.user)
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect(redirection)
+        UserActivity.objects.create(user=request.user, action='Suppression', description=f'a supprimé {nombre} opération(s)')
+        messages.success(request, f"{nombre} opération(s) supprimée(s) avec succès.")
+
+    elif action == 'categorie':
+        categorie = get_object_or_404(Categorie, pk=request.POST.get('nouvelle_categorie') or None)
+        # Une catégorie ne s'applique qu'aux opérations de son type
+        if categorie.type == 'entree':
+            nombre = modifier_operations_en_masse(OperationEntrer, ids_entrees, request.user, categorie=categorie)
+        else:
+            nombre = modifier_operations_en_masse(OperationSortir, ids_sorties, request.user, categorie=categorie)
+        UserActivity.objects.create(user=request.user, action='Modification', description=f'a recatégorisé {nombre} opération(s)')
+        messages.success(request, f"{nombre} opération(s) déplacée(s) dans « {categorie.name} ».")
+
+    elif action == 'fournisseur':
+        fournisseur = get_object_or_404(Fournisseur, pk=request.POST.get('nouveau_fournisseur') or None)
+        nombre = modifier_operations_en_masse(OperationSortir, ids_sorties, request.user, fournisseur=fournisseur)
+        UserActivity.objects.create(user=request.user, action='Modification', description=f'a changé le fournisseur de {nombre} sortie(s)')
+        messages.success(request, f"Fournisseur « {fournisseur.name} » appliqué à {nombre} sortie(s).")
+
+    elif action == 'caisse':
+        caisse = get_object_or_404(Caisse, pk=request.POST.get('nouvelle_caisse') or None)
+        try:
+            # Les soldes des caisses d'origine et de destination sont corrigés dans la même transaction
+            with transaction.atomic():
+                nombre = modifier_operations_en_masse(OperationEntrer, ids_entrees, request.user, caisse=caisse)
+                nombre += modifier_operations_en_masse(OperationSortir, ids_sorties, request.user, caisse=caisse)
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect(redirection)
+        UserActivity.objects.create(user=request.user, action='Modification', description=f'a déplacé {nombre} opération(s) vers {caisse.nom}')
+        messages.success(request, f"{nombre} opération(s) déplacée(s) vers « {caisse.nom} ».")
+
+    else:
+        messages.error(request, "Action inconnue.")
+
+    return redirect(redirection)
+
+# Étiquetage en masse depuis les listes
+@login_required
+@require_POST
+def etiqueter(request):
+    """
+    Ajoute ou retire des étiquettes (séparées par des virgules) sur les opérations cochées.
+    """
+    ids_entrees, ids_sorties = get_operations_selectionnees(request)
+    noms = request.POST.get('tags', '').split(',')
+    retirer = request.POST.get('action_tags') == 'retirer'
+    redirection = url_de_retour(request)
+
+    if not any(nom.strip() for nom in noms) or not (ids_entrees or ids_sorties):
+        messages.error(request, "Veuillez sélectionner des opérations et saisir au moins une étiquette.")
+        return redirect(redirection)
+
+    nombre = etiqueter_operations(ids_entrees, ids_sorties, noms, retirer=retirer)
+    UserActivity.objects.create(
+        user=request.user,
+        action='Modification',
+        description=f"a {'retiré' if retirer else 'ajouté'} des étiquettes sur {nombre} opération(s)"
+    )
+    messages.success(request, f"Étiquettes mises à jour sur {nombre} opération(s).")
+    return redirect(redirection)
+
+@login_required
+def totaux_tags(request):
+    """
+    Totaux des entrées et sorties par étiquette (filtre optionnel par période `debut`/`fin`).
+    """
+    bornes = {}
+    for nom in ('debut', 'fin'):
+        valeur = request.GET.get(nom)
+        try:
+            bornes[nom] = parse_date(valeur) if valeur else None
+        except ValueError:
+            bornes[nom] = None
+        if valeur and bornes[nom] is None:
+            return JsonResponse({'error': f"Date « {nom} » invalide (format AAAA-MM-JJ)."}, status=400)
+    totaux = totaux_par_tag(bornes['debut'], bornes['fin'])
+    return JsonResponse({'tags': list(totaux)})
+
+# Caisses physiques et transferts
+@login_required
+def caisses(request):
+    """
+    Solde de chaque caisse, total consolidé, derniers transferts et création d'une caisse.
+    """
+    if request.method == 'POST':
+        nom = request.POST.get('nom', '').strip()
+        if not nom:
+            messages.error(request, "Veuillez saisir le nom de la caisse.")
+        elif Caisse.objects.filter(nom__iexact=nom).exists():
+            messages.error(request, f"La caisse « {nom} » existe déjà.")
+        else:
+            Caisse.objects.create(nom=nom, montant=0)
+            UserActivity.objects.create(user=request.user, action='Création', description=f'a créé la caisse {nom}')
+            messages.success(request, f"La caisse « {nom} » a été créée.")
+        return redirect('caisse:caisses')
+
+    soldes = soldes_par_caisse()
+    context = {
+        'soldes': soldes,
+        'total': consolider(soldes),
+        'transferts': TransfertCaisse.objects.select_related('caisse_source', 'caisse_destination').order_by('-date', '-pk')[:20],
+    }
+    return render(request, 'caisse/caisses/caisses.html', context)
+
+@login_required
+@require_POST
+def transferer(request):
+    """
+    Transfert de fonds d'une caisse à une autre ; les deux soldes sont mis à jour ensemble.
+    """
+    try:
+        transfert = TransfertCaisse(
+            caisse_source_id=get_caisse_id(request.POST.get('caisse_source')),
+            caisse_destination_id=get_caisse_id(request.POST.get('caisse_destination')),
+            montant=Decimal(request.POST.get('montant') or 0),
+            date=request.POST.get('date') or timezone.now().date(),
+            description=request.POST.get('description', '').strip(),
+            utilisateur=request.user,
+        )
+        transfert.full_clean()
+        transfert.save()
+    except (ValidationError, ArithmeticError) as e:
+        erreurs = e.messages if isinstance(e, ValidationError) else ["Montant invalide."]
+        messages.error(request, ' '.join(erreurs))
+        return redirect('caisse:caisses')
+    UserActivity.objects.create(user=request.user, action='Création', description=f'a transféré {transfert.montant} Ar ({transfert})')
+    messages.success(request, "Le transfert a été enregistré.")
+    return redirect('caisse:caisses')
+
+# Comptabilisation de la paie
+@login_required
+def comptabilisation_paies(request):
+    """
+    Fiches de paie payées non encore comptabilisées ; les fiches cochées deviennent
+    des sorties de caisse en une seule transaction.
+    """
+    if request.method == 'POST':
+        ids = [int(pk) for pk in request.POST.getlist('paies') if pk.isdigit()]
+        if not ids:
+            messages.error(request, "Veuillez sélectionner au moins une fiche de paie.")
+            return redirect('caisse:comptabilisation_paies')
+        categorie = get_object_or_404(Categorie, pk=request.POST.get('categorie') or None, type='sortie')
+        fournisseur = get_object_or_404(Fournisseur, pk=request.POST.get('fournisseur') or None)
+        caisse_id = get_caisse_id(request.POST.get('caisse'))
+        caisse = get_object_or_404(Caisse, pk=caisse_id) if caisse_id else None
+        try:
+            sorties = comptabiliser_paies(
+                ids, categorie, fournisseur, caisse, request.POST.get('date_de_sortie') or None, request.user
+            )
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+            return redirect('caisse:comptabilisation_paies')
+        if not sorties:
+            messages.warning(request, "Aucune fiche à comptabiliser : les fiches sélectionnées sont déjà comptabilisées ou non payées.")
+            return redirect('caisse:comptabilisation_paies')
+        total = sum(sortie.montant for sortie in sorties)
+        UserActivity.objects.create(user=request.user, action='Création', description=f'a comptabilisé {len(sorties)} fiche(s) de paie')
+        messages.success(request, f"{len(sorties)} fiche(s) de paie comptabilisée(s) pour {total:,.0f} Ar.".replace(',', ' '))
+        return redirect('caisse:liste_sorties')
+
+    paies = paies_a_comptabiliser().order_by('date_fin', 'employee__nom')
+    context = {
+        'paies': paies,
+        'total': paies.aggregate(total=Sum('net_a_payer'))['total'] or 0,
+        'categories_sortie': referentiel()['categories_sortie'],
+        'fournisseurs': referentiel()['fournisseurs'],
+        'caisses': Caisse.objects.order_by('pk'),
+    }
+    return render(request, 'caisse/paies/comptabilisation.html', context)
+
+# Rapprochement bancaire
+@login_required
+def rapprochements(request):
+    """
+    Liste des relevés importés et import d'un nouveau relevé (CSV ou XLSX).
+    """
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        if not fichier:
+            messages.error(request, "Veuillez choisir un fichier de relevé.")
+            return redirect('caisse:rapprochements')
+        try:
+            tolerance = int(request.POST.get('tolerance_jours') or 3)
+            if tolerance < 0:
+                raise ValueError("la tolérance doit être un nombre de jours positif ou nul.")
+            releve = importer_releve(fichier, request.POST.get('nom', '').strip(), request.user, tolerance)
+        except ValueError as e:
+            messages.error(request, f"Import impossible : {e}")
+            return redirect('caisse:rapprochements')
+        UserActivity.objects.create(user=request.user, action='Création', description='a importé un relevé bancaire')
+        messages.success(request, "Le relevé a été importé et rapproché.")
+        return redirect('caisse:detail_releve', pk=releve.pk)
+
+    releves = ReleveBancaire.objects.annotate(
+        nombre_lignes=Count('lignes'),
+        nombre_rapprochees=Count('lignes', filter=Q(lignes__entree__isnull=False) | Q(lignes__sortie__isnull=False)),
+    )
+    return render(request, 'caisse/rapprochement/rapprochements.html', {'releves': releves})
+
+@login_required
+def detail_releve(request, pk):
+    """
+    Lignes rapprochées et non rapprochées d'un relevé, et opérations de la période absentes du relevé.
+    """
+    releve = get_object_or_404(ReleveBancaire, pk=pk)
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'relancer':
+            nombre = rapprocher(releve)
+            messages.success(request, f"{nombre} ligne(s) rapprochée(s).")
+        elif action == 'dissocier':
+            ligne = request.POST.get('ligne', '')
+            if ligne.isdigit():
+                releve.lignes.filter(pk=ligne).update(entree=None, sortie=None)
+                messages.success(request, "Le rapprochement a été annulé.")
+            else:
+                messages.error(request, "Ligne de relevé invalide.")
+        elif action == 'supprimer':
+            releve.delete()
+            UserActivity.objects.create(user=request.user, action='Suppression', description='a supprimé un relevé bancaire')
+            messages.success(request, "Le relevé a été supprimé.")
+            return redirect('caisse:rapprochements')
+        return redirect('caisse:detail_releve', pk=releve.pk)
+
+    lignes = releve.lignes.select_related('entree', 'sortie')
+    entrees_restantes, sorties_restantes = operations_non_rapprochees(releve)
+    context = {
+        'releve': releve,
+        'lignes_rapprochees': [ligne for ligne in lignes if ligne.est_rapprochee],
+        'lignes_non_rapprochees': [ligne for ligne in lignes if not ligne.est_rapprochee],
+        'entrees_restantes': entrees_restantes,
+        'sorties_restantes': sorties_restantes,
+        'nombre_restantes': len(entrees_restantes) + len(sorties_restantes),
+    }
+    return render(request, 'caisse/rapprochement/detail_releve.html', context)
+
 # Add this new view
 @login_required
 def parametres(request):
@@ -770,6 +1354,7 @@ def creer_categorie(request):
     name = data.get('name')
     description = data.get('description')
     type = data.get('type')
+    parent_id = data.get('parent') or None
     
     if not name or not type:
         return JsonResponse({'success': False, 'error': 'Nom et type sont requis'}, status=400)
@@ -777,7 +1362,12 @@ def creer_categorie(request):
         UserActivity.objects.create(user=request.user, action='Création', description='a créé une nouvelle catégorie')
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
-    categorie = Categorie.objects.create(name=name, description=description, type=type)
+    categorie = Categorie(name=name, description=description, type=type, parent_id=parent_id)
+    try:
+        categorie.clean()
+        categorie.save()
+    except (ValidationError, Categorie.DoesNotExist) as e:
+        return JsonResponse({'success': False, 'error': ' '.join(getattr(e, 'messages', [str(e)]))}, status=400)
     
     return JsonResponse({
         'success': True,
@@ -785,7 +1375,9 @@ def creer_categorie(request):
             'id': categorie.id,
             'name': categorie.name,
             'description': categorie.description,
-            'type': categorie.type
+            'type': categorie.type,
+            'parent': categorie.parent_id,
+            'niveau': categorie.niveau,
         }
     })
 
@@ -1068,6 +1660,7 @@ def liste_entrees(request):
     # Récupérer les filtres de recherche et de triage
     query = request.GET.get('q')
     categorie_id = request.GET.get('categorie')
+    tag_id = request.GET.get('tag')
     mois = request.GET.get('mois')
     sort_by = request.GET.get('sort', 'date')  # Trier par date par défaut
     ordre = request.GET.get('order', 'desc')  # Ordre décroissant par défaut
@@ -1089,7 +1682,7 @@ def liste_entrees(request):
     ]
 
     # Filtrer les opérations d'entrée
-    entrees = OperationEntrer.objects.all()
+    entrees = OperationEntrer.objects.select_related('categorie')
 
     if query:
         entrees = entrees.filter(
@@ -1100,6 +1693,13 @@ def liste_entrees(request):
         )
     if categorie_id and categorie_id.isdigit():  # Vérifier que c'est un nombre
         entrees = entrees.filter(categorie_id=categorie_id)
+    # Filtre par étiquette
+    if tag_id and tag_id.isdigit():
+        entrees = entrees.filter(tags=tag_id)
+    # Filtre par caisse
+    caisse_id = get_caisse_id(request.GET.get('caisse'))
+    if caisse_id:
+        entrees = entrees.filter(caisse_id=caisse_id)
     # Filtre par mois
     if mois and mois.isdigit():  # Vérifier que c'est un nombre
         entrees = entrees.filter(date_transaction__month=int(mois))
@@ -1119,9 +1719,6 @@ def liste_entrees(request):
             sort_field = f'-{sort_field}'  # Tri décroissant
         entrees = entrees.order_by(sort_field)
         
-    # Récupérer uniquement les catégories de type "entrée" pour les options de filtrage
-    categories = Categorie.objects.filter(type="entree")
-    
     # Charger le template
     template = loader.get_template('caisse/listes/entrees.html')
 
@@ -1134,15 +1731,20 @@ def liste_entrees(request):
     # Contexte à passer au template
     context = {
         'page_obj': page_obj,
-        'categories': categories,
+        'categorie_libelle': recherche_noms.libelle('categories', categorie_id),
         'prix': "Ar",
         'sort_by': sort_by,
         'ordre': ordre,
         'lignes_par_page': request.GET.get('lignes', 10),
         'query': query,
         'categorie_id': categorie_id,
+        'tags': Tag.objects.all(),
+        'tag_id': tag_id,
+        'caisses': Caisse.objects.order_by('pk'),
+        'caisse_id': caisse_id,
         'mois_liste': mois_liste, 
         'mois': mois, 
+        'niveaux': niveaux_categories(),
     }
     return HttpResponse(template.render(context, request))
 
@@ -1156,6 +1758,7 @@ def liste_sorties(request):
     categorie_id = request.GET.get('categorie')
     beneficiaire_id = request.GET.get('beneficiaire')
     fournisseur_id = request.GET.get('fournisseur')
+    tag_id = request.GET.get('tag')
     mois = request.GET.get('mois')
     sort_by = request.GET.get('sort', 'date')  # Trier par date par défaut
     ordre = request.GET.get('order', 'desc')  # Ordre décroissant par défaut
@@ -1176,8 +1779,10 @@ def liste_sorties(request):
         {'value': 12, 'label': 'Décembre'},
     ]
 
-    # Filtrer les opérations de sortie
-    sorties = OperationSortir.objects.all()
+    # Filtrer les opérations de sortie (miniatures des justificatifs préchargées en une requête)
+    sorties = OperationSortir.objects.select_related('categorie', 'beneficiaire', 'fournisseur').prefetch_related(
+        models.Prefetch('justificatifs', queryset=Justificatif.objects.only('pk', 'miniature', 'type_mime', 'nom'))
+    )
 
     if query:
         sorties = sorties.filter(
@@ -1192,6 +1797,13 @@ def liste_sorties(request):
         sorties = sorties.filter(beneficiaire_id=beneficiaire_id)
     if fournisseur_id:
         sorties = sorties.filter(fournisseur_id=fournisseur_id)
+    # Filtre par étiquette
+    if tag_id and tag_id.isdigit():
+        sorties = sorties.filter(tags=tag_id)
+    # Filtre par caisse
+    caisse_id = get_caisse_id(request.GET.get('caisse'))
+    if caisse_id:
+        sorties = sorties.filter(caisse_id=caisse_id)
     # Filtre par mois
     if mois and mois.isdigit():  # Vérifiez que mois est un nombre
         sorties = sorties.filter(date_de_sortie__month=int(mois))
@@ -1201,7 +1813,7 @@ def liste_sorties(request):
         'description': 'description',
         'categorie': 'categorie__name',
         'date': 'date_de_sortie',
-        'beneficiaire': 'beneficiaire__name',
+        'beneficiaire': 'beneficiaire__nom_affiche',
         'fournisseur': 'fournisseur__name',
         'montant': 'montant',
         'quantite': 'quantite'
@@ -1214,11 +1826,6 @@ def liste_sorties(request):
             sort_field = f'-{sort_field}'
         sorties = sorties.order_by(sort_field)
 
-    # Récupérer uniquement les catégories de type "sortie" pour les options de filtrage
-    categories = Categorie.objects.filter(type="sortie")
-    beneficiaires = Beneficiaire.objects.all()
-    fournisseurs = Fournisseur.objects.all()
-    
     # Charger le template
     template = loader.get_template('caisse/listes/sorties.html')
 
@@ -1231,9 +1838,11 @@ def liste_sorties(request):
     # Contexte à passer au template
     context = {
         'page_obj': page_obj,
-        'categories': categories,
-        'beneficiaires': beneficiaires,
-        'fournisseurs': fournisseurs,
+        # Filtres en autocomplétion : seul le libellé de la valeur choisie est chargé
+        'categorie_libelle': recherche_noms.libelle('categories', categorie_id),
+        'beneficiaire_libelle': recherche_noms.libelle('beneficiaires', beneficiaire_id),
+        'fournisseur_libelle': recherche_noms.libelle('fournisseurs', fournisseur_id),
+        'tags': Tag.objects.all(),
         'prix': "Ar",
         'sort_by': sort_by,
         'ordre': ordre,
@@ -1242,22 +1851,62 @@ def liste_sorties(request):
         'categorie_id': categorie_id,
         'beneficiaire_id': beneficiaire_id,
         'fournisseur_id': fournisseur_id,
+        'tag_id': tag_id,
+        'caisses': Caisse.objects.order_by('pk'),
+        'caisse_id': caisse_id,
         'mois_liste': mois_liste,
         'mois': mois,
+        'niveaux': niveaux_categories(),
     }
     return HttpResponse(template.render(context, request))
 
 
 #Pour générer un rapport en EXCEL (.xlsx)
+def ajouter_feuille_cumul(workbook, niveau, *operations_par_type):
+    """
+    Ajoute une feuille de synthèse avec les totaux cumulés par catégorie du niveau choisi.
+    `operations_par_type` est une suite de couples (libellé du type, queryset d'opérations).
+    """
+    sheet = workbook.create_sheet(title=f"Cumul niveau {niveau}")
+    headers = ["Type", "Catégorie", "Nombre d'opérations", "Montant"]
+    sheet.append(headers)
+    for col_num, header in enumerate(headers, 1):
+        cell = sheet.cell(row=1, column=col_num)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    for type_operation, operations in operations_par_type:
+        for ligne in cumuler_par_niveau(operations, niveau):
+            sheet.append([type_operation, ligne['categorie_nom'], ligne['nombre'], ligne['total']])
+
+    for i, width in enumerate([10, 30, 20, 15], 1):
+        sheet.column_dimensions[get_column_letter(i)].width = width
+
+# Exports Excel : formulaires POST (sélection, filtres), hors du champ du GET conditionnel
+@limiter('export')
 def generer_excel_operations(request):
     # Vérifie si l'utilisateur souhaite exporter toutes les opérations ou seulement celles sélectionnées
     if request.POST.get("export_all"):
         operations_entrer = OperationEntrer.objects.all()
         operations_sortir = OperationSortir.objects.all()
     else:
-        selected_ids = request.POST.getlist("selected_operations")
-        operations_entrer = OperationEntrer.objects.filter(id__in=selected_ids)
-        operations_sortir = OperationSortir.objects.filter(id__in=selected_ids)
+        ids_entrees, ids_sorties = get_operations_selectionnees(request)
+        operations_entrer = OperationEntrer.objects.filter(id__in=ids_entrees)
+        operations_sortir = OperationSortir.objects.filter(id__in=ids_sorties)
+    operations_entrer = operations_entrer.select_related('categorie')
+    operations_sortir = operations_sortir.select_related('categorie', 'beneficiaire', 'fournisseur')
+
+    # Filtre par étiquette
+    tag_id = request.POST.get('tag')
+    if tag_id and tag_id.isdigit():
+        operations_entrer = operations_entrer.filter(tags=tag_id)
+        operations_sortir = operations_sortir.filter(tags=tag_id)
+    # Filtre par caisse
+    caisse_id = get_caisse_id(request.POST.get('caisse'))
+    if caisse_id:
+        operations_entrer = operations_entrer.filter(caisse_id=caisse_id)
+        operations_sortir = operations_sortir.filter(caisse_id=caisse_id)
 
     # Création d'un nouveau classeur Excel
     workbook = Workbook()
@@ -1285,7 +1934,7 @@ def generer_excel_operations(request):
     # Fonction pour ajouter des opérations au fichier Excel
     def ajouter_operations(operations, type_operation, avec_beneficiaire=False):
         for operation in operations:
-            beneficiaire = operation.beneficiaire.name if avec_beneficiaire else "N/A"
+            beneficiaire = operation.beneficiaire.nom_affiche if avec_beneficiaire else "N/A"
             fournisseur = operation.fournisseur.name if avec_beneficiaire else "N/A"
             quantite = operation.quantite if avec_beneficiaire else "N/A"
             date_str = operation.date.strftime('%d-%m-%Y')
@@ -1296,6 +1945,11 @@ def generer_excel_operations(request):
     ajouter_operations(operations_entrer, "Entrée")
     ajouter_operations(operations_sortir, "Sortie", avec_beneficiaire=True)
 
+    # Feuille de cumul par niveau de catégorie (optionnelle)
+    niveau = get_niveau(request.POST.get('niveau'))
+    if niveau is not None:
+        ajouter_feuille_cumul(workbook, niveau, ("Entrée", operations_entrer), ("Sortie", operations_sortir))
+
     # Nom du fichier avec la date et l'heure actuelles
     now = datetime.now().strftime('%d-%m-%Y_%H-%M')
     filename = f"rapport_operations_{now}.xlsx"
@@ -1312,12 +1966,23 @@ def generer_excel_operations(request):
 )
     return response
 
+@limiter('export')
 def generer_excel_operations_entrees(request):
     if request.POST.get("export_all"):
         operations_entrer = OperationEntrer.objects.all()
     else:
         selected_ids = request.POST.getlist("selected_operations")
         operations_entrer = OperationEntrer.objects.filter(id__in=selected_ids)
+    operations_entrer = operations_entrer.select_related('categorie')
+
+    # Filtre par étiquette
+    tag_id = request.POST.get('tag')
+    if tag_id and tag_id.isdigit():
+        operations_entrer = operations_entrer.filter(tags=tag_id)
+    # Filtre par caisse
+    caisse_id = get_caisse_id(request.POST.get('caisse'))
+    if caisse_id:
+        operations_entrer = operations_entrer.filter(caisse_id=caisse_id)
 
     workbook = Workbook()
     sheet = workbook.active
@@ -1342,6 +2007,11 @@ def generer_excel_operations_entrees(request):
         row = [operation.description, operation.categorie.name, operation.date_transaction, operation.montant]
         sheet.append(row)
 
+    # Feuille de cumul par niveau de catégorie (optionnelle)
+    niveau = get_niveau(request.POST.get('niveau'))
+    if niveau is not None:
+        ajouter_feuille_cumul(workbook, niveau, ("Entrée", operations_entrer))
+
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     filename = f"entrees_{datetime.now().strftime('%d-%m-%Y_%H-%M')}.xlsx"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
@@ -1355,6 +2025,7 @@ def generer_excel_operations_entrees(request):
 
     return response
 
+@limiter('export')
 def generer_excel_operations_sorties(request):
     # Vérifier si l'utilisateur souhaite exporter toutes les opérations ou seulement celles sélectionnées
     if request.POST.get("export_all"):
@@ -1362,6 +2033,16 @@ def generer_excel_operations_sorties(request):
     else:
         selected_ids = request.POST.getlist("selected_operations")
         operations_sortie = OperationSortir.objects.filter(id__in=selected_ids)
+    operations_sortie = operations_sortie.select_related('categorie', 'beneficiaire', 'fournisseur')
+
+    # Filtre par étiquette
+    tag_id = request.POST.get('tag')
+    if tag_id and tag_id.isdigit():
+        operations_sortie = operations_sortie.filter(tags=tag_id)
+    # Filtre par caisse
+    caisse_id = get_caisse_id(request.POST.get('caisse'))
+    if caisse_id:
+        operations_sortie = operations_sortie.filter(caisse_id=caisse_id)
 
     # Créer un nouveau classeur Excel
     workbook = Workbook()
@@ -1384,7 +2065,7 @@ def generer_excel_operations_sorties(request):
         row = [
             operation.description,
             operation.categorie.name,
-            f"{operation.beneficiaire.personnel} {operation.beneficiaire.name}",
+            operation.beneficiaire.nom_affiche,
             operation.fournisseur.name,
             operation.date_de_sortie.strftime('%d-%m-%Y'),
             operation.quantite,
@@ -1397,6 +2078,11 @@ def generer_excel_operations_sorties(request):
     for i, width in enumerate(column_widths, 1):
         sheet.column_dimensions[get_column_letter(i)].width = width
 
+    # Feuille de cumul par niveau de catégorie (optionnelle)
+    niveau = get_niveau(request.POST.get('niveau'))
+    if niveau is not None:
+        ajouter_feuille_cumul(workbook, niveau, ("Sortie", operations_sortie))
+
     # Créer la réponse HTTP pour le fichier Excel
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     filename = f"sorties_{datetime.now().strftime('%d-%m-%Y_%H-%M')}.xlsx"
@@ -1427,17 +2113,8 @@ def beneficiaires(request):
     """
     Affiche la liste des bénéficiaires.
     """
-    beneficiaires = Beneficiaire.objects.all()
-    personnels = Personnel.objects.all()
-    
-    beneficiaires_json = json.loads(serialize('json', beneficiaires))
-    personnels_json = json.loads(serialize('json', personnels))
-    
-    context = {
-        'beneficiaires': json.dumps([{**item['fields'], 'id': item['pk']} for item in beneficiaires_json]),
-        'personnels': json.dumps([{**item['fields'], 'id': item['pk']} for item in personnels_json]),
-    }
-    return render(request, "caisse/acteurs/beneficiaires.html", context)
+    # Les listes sont chargées par la page, page par page, depuis liste_json
+    return render(request, "caisse/acteurs/beneficiaires.html")
 
 @login_required
 @require_POST
@@ -1468,7 +2145,8 @@ def creer_beneficiaire(request):
             'beneficiaire': {
                 'id': beneficiaire.id,
                 'personnel_id': personnel_id,
-                'name': name if not personnel else f"{personnel.first_name} {personnel.last_name}"
+                'name': name if not personnel else f"{personnel.first_name} {personnel.last_name}",
+                'nom_affiche': beneficiaire.nom_affiche,
             }
         })
     except Exception as e:
@@ -1503,7 +2181,8 @@ def modifier_beneficiaire(request, pk):
             'beneficiaire': {
                 'id': beneficiaire.id,
                 'personnel_id': personnel_id,
-                'name': beneficiaire.name or f"{beneficiaire.personnel.first_name} {beneficiaire.personnel.last_name}"
+                'name': beneficiaire.name or f"{beneficiaire.personnel.first_name} {beneficiaire.personnel.last_name}",
+                'nom_affiche': beneficiaire.nom_affiche,
             }
         })
     except Exception as e:
@@ -1529,11 +2208,9 @@ def supprimer_beneficiaire(request, pk):
 @login_required
 def editer_beneficiaire(request, pk):
     beneficiaire = get_object_or_404(Beneficiaire, pk=pk)
-    personnels = Personnel.objects.all()
-    
     context = {
         'beneficiaire': beneficiaire,
-        'personnels': personnels,
+        'personnels': referentiel()['personnels'],
     }
     return render(request, 'caisse/acteurs/editer_beneficiaire.html', context)
 
@@ -1604,7 +2281,7 @@ def details_sorties(request):
         sortie['operations'] = OperationSortir.objects.filter(
             date_de_sortie__month=sortie['mois'].month,
             date_de_sortie__year=sortie['mois'].year
-        ).order_by('-date_de_sortie')
+        ).select_related('beneficiaire', 'categorie', 'fournisseur').order_by('-date_de_sortie')
         sortie['mois_format'] = format_date(sortie['mois'], format='MMMM yyyy', locale='fr_FR')
 
     context = {
@@ -1756,6 +2433,33 @@ def ajouter_element(request):
     
     return redirect('caisse:index')
 
+# Champ du formulaire d'opérations -> (clé de la réponse, modèle) pour la vérification groupée
+REFERENCES_A_VERIFIER = {
+    'categorie': ('categories', Categorie),
+    'beneficiaire': ('beneficiaires', Beneficiaire),
+    'fournisseur': ('fournisseurs', Fournisseur),
+}
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def verifier_references(request):
+    """
+    Vérifie en une fois l'existence des catégories, bénéficiaires et fournisseurs d'un formulaire
+    (paramètres répétés `categorie`, `beneficiaire`, `fournisseur`) : une requête IN par modèle
+    au lieu d'un appel à verifier_categorie/beneficiaire/fournisseur par identifiant et par ligne.
+
+    Retourne {"categories": {"<id>": true|false}, "beneficiaires": {...}, "fournisseurs": {...}, "valide": bool}.
+    """
+    donnees = request.POST if request.method == 'POST' else request.GET
+    reponse = {'valide': True}
+    for champ, (cle, modele) in REFERENCES_A_VERIFIER.items():
+        identifiants = set(donnees.getlist(champ))
+        valides = [identifiant for identifiant in identifiants if identifiant.isdigit()]
+        existants = {str(pk) for pk in modele.objects.filter(pk__in=valides).values_list('pk', flat=True)} if valides else set()
+        reponse[cle] = {identifiant: identifiant in existants for identifiant in identifiants}
+        reponse['valide'] = reponse['valide'] and existants == identifiants
+    return JsonResponse(reponse)
+
 @login_required
 def verifier_categorie(request, id):
     try:
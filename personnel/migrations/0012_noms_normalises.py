@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:56
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copie figée de normaliser_texte (GPP/normalisation.py) à la date de la migration :
+# la migration ne dépend pas du code des applications, qui peut évoluer
+def normaliser_texte(texte):
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    texte = re.sub(r'[^\w\s]', ' ', texte)
+    return ' '.join(texte.split())
+
+
+def remplir_noms_normalises(apps, schema_editor):
+    Employee = apps.get_model('personnel', 'Employee')
+    employes = list(Employee.objects.only('nom', 'prenom'))
+    for employe in employes:
+        employe.nom_normalise = normaliser_texte(f"{employe.nom} {employe.prenom or ''}")[:201]
+    Employee.objects.bulk_update(employes, ['nom_normalise'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0011_alter_employee_salaire_base_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='nom_normalise',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=201),
+        ),
+        migrations.RunPython(remplir_noms_normalises, migrations.RunPython.noop),
+    ]
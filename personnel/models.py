@@ -8,6 +8,8 @@ from django.contrib.auth.models import AbstractUser, Group
 from django.core.exceptions import ValidationError
 import re
 
+from GPP.normalisation import NomNormaliseMixin
+
 class Departement(models.Model): #Model Departement
     nom = models.CharField(max_length=100)
     def __str__(self):
@@ -24,7 +26,7 @@ class Competence(models.Model): #Model Compétence
     def __str__(self):
         return f"{self.nom}"
 
-class Employee(models.Model): #Model employée
+class Employee(NomNormaliseMixin, models.Model): #Model employée
     SEXE_CHOICES = [
         ('Masculin', 'Masculin'),
         ('Féminin', 'Féminin'),
@@ -106,6 +108,7 @@ class Employee(models.Model): #Model employée
     jours_conge_exceptionnel = models.PositiveIntegerField(default=10)  # Jours de congé exceptionel
     jours_conge_obligatoire = models.PositiveIntegerField(default=15)  # Jours de congé obligatoire
     salaire_base = models.IntegerField(default=0, blank=True)
+    nom_normalise = models.CharField(max_length=201, db_index=True, editable=False, default='')  # Recherche par préfixe (autocomplétion)
 
     def clean(self):
         # Validation du numéro de téléphone
@@ -125,6 +128,9 @@ class Employee(models.Model): #Model employée
     def __str__(self):
         return f"{self.nom} {self.prenom}"
 
+    def nom_a_normaliser(self):
+        return f"{self.nom} {self.prenom or ''}"
+
  #Model Congé
 class Conge(models.Model):
     TYPE_CHOICES = [
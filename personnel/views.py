@@ -30,6 +30,8 @@ from .services import create_notification, create_global_notification
 from rest_framework.decorators import action
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import View
+from django.utils.decorators import method_decorator
+from GPP.throttling import limiter
 from django.template.response import TemplateResponse
 from rest_framework.pagination import PageNumberPagination
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -45,6 +47,7 @@ CustomUser = get_user_model()
 
 class DashboardAPIView(APIView):
     permission_classes = [IsAuthenticated]  # Exige que l'utilisateur soit authentifié
+    throttle_scope = 'lourd'
 
     def get(self, request, *args, **kwargs):
         # Récupération des statistiques des employés
@@ -2376,6 +2379,7 @@ class DupliquerFicheDePaieAPIView(APIView):
 #             return Response({'error': f"Une erreur est survenue lors de la génération du PDF : {str(e)}"},
 #                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@method_decorator(limiter('export'), name='post')
 class ExportDatabaseView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         # Récupérer le nom de la table depuis la requête POST